@@ -0,0 +1,101 @@
+"""End-of-day reports computed column-wise with NumPy/pandas.
+
+Rows are read with SQLAlchemy Core in ``yield_per`` chunks and turned into
+one array per column, so no ORM objects are built and the aggregation runs
+in vectorized pandas code instead of a Python loop. pandas is imported on
+first use to keep worker boot time down.
+"""
+from sqlalchemy import func, select
+
+from archive import archive
+from availability import CANCELED
+from models import db, MenuItem, Order, Reservation
+
+# Reservation status for guests who never arrived
+NO_SHOW = 'no_show'
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def load_frame(statement, chunk_size=50000):
+    """Run a Core ``select`` and return its rows as a DataFrame, chunk by chunk."""
+    import pandas as pd
+
+    result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+    columns = list(result.keys())
+    chunks = [pd.DataFrame.from_records(partition, columns=columns) for partition in result.partitions()]
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def top_items(start=None, end=None, limit=10):
+    """Best-selling menu items by quantity, with revenue and order count."""
+    orders = archive.history(Order, start, end)
+    price = func.coalesce(orders.c.unit_price, MenuItem.price, 0)
+    frame = load_frame(
+        select(orders.c.item_id, orders.c.item_name, orders.c.quantity, price.label('unit_price'))
+        .outerjoin(MenuItem, MenuItem.id == orders.c.item_id))
+    if frame.empty:
+        return []
+    frame['revenue'] = frame['quantity'] * frame['unit_price']
+    totals = (frame.groupby('item_id', sort=False)
+              .agg(item_name=('item_name', 'last'), quantity=('quantity', 'sum'),
+                   revenue=('revenue', 'sum'), orders=('quantity', 'size'))
+              .sort_values(['quantity', 'revenue'], ascending=False)
+              .head(limit))
+    return [
+        {"item_id": int(item_id), "name": row.item_name, "quantity": int(row.quantity),
+         "revenue": round(float(row.revenue), 2), "orders": int(row.orders)}
+        for item_id, row in zip(totals.index, totals.itertuples(index=False))
+    ]
+
+
+def _reservations(start, end):
+    import pandas as pd
+
+    reservations = archive.history(Reservation, start, end)
+    frame = load_frame(select(reservations.c.datetime, reservations.c.status, reservations.c.party_size))
+    frame['datetime'] = pd.to_datetime(frame['datetime'])
+    return frame[frame['status'] != CANCELED]
+
+
+def hourly_covers(start=None, end=None):
+    """Covers booked per hour of the day, excluding canceled reservations."""
+    frame = _reservations(start, end)
+    if frame.empty:
+        return []
+    covers = frame.groupby(frame['datetime'].dt.hour)['party_size'].agg(['sum', 'size'])
+    return [
+        {"hour": int(hour), "covers": int(row['sum']), "reservations": int(row['size'])}
+        for hour, row in covers.iterrows()
+    ]
+
+
+def weekday_load(start=None, end=None):
+    """Average covers per service day and average party size for each weekday."""
+    frame = _reservations(start, end)
+    if frame.empty:
+        return []
+    frame = frame.assign(day=frame['datetime'].dt.normalize(), weekday=frame['datetime'].dt.weekday)
+    daily = frame.groupby(['weekday', 'day'])['party_size'].sum()
+    per_weekday = daily.groupby(level='weekday').agg(['mean', 'size'])
+    party = frame.groupby('weekday')['party_size'].mean()
+    return [
+        {"weekday": WEEKDAYS[weekday], "avg_covers": round(float(row['mean']), 2),
+         "avg_party_size": round(float(party[weekday]), 2), "days": int(row['size'])}
+        for weekday, row in per_weekday.iterrows()
+    ]
+
+
+def no_show_rates(start=None, end=None):
+    """Share of non-canceled reservations marked as no-shows, per calendar day."""
+    frame = _reservations(start, end)
+    if frame.empty:
+        return []
+    no_show = (frame['status'] == NO_SHOW).groupby(frame['datetime'].dt.date).agg(['sum', 'size'])
+    return [
+        {"date": str(day), "reservations": int(row['size']), "no_shows": int(row['sum']),
+         "rate": round(float(row['sum'] / row['size']), 4)}
+        for day, row in no_show.iterrows()
+    ]
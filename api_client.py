@@ -0,0 +1,146 @@
+import functools
+import time
+import uuid
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds; Render cold starts can take a while to answer
+TIMEOUT = (5, 30)
+
+# Seconds read endpoints are served from the Streamlit cache
+MENU_TTL = 300
+DETAILS_TTL = 300
+ORDERS_TTL = 10
+
+# POSTs the API deduplicates by Idempotency-Key, so they are safe to resend
+IDEMPOTENT_POSTS = ('/order', '/order/batch', '/reservations', '/customers/order', '/customers/reservations')
+RETRY_STATUSES = (429, 502, 503, 504)
+POST_ATTEMPTS = 4
+
+
+@st.cache_resource
+def get_session():
+    """One pooled, keep-alive session shared by every rerun and browser tab."""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'PUT', 'DELETE'}),  # POSTs are retried in post() only when keyed
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def call(method, base_url, path, **kwargs):
+    """Send a request; returns ``(status_code, json_body)`` or ``(None, None)`` on a network error."""
+    kwargs.setdefault('timeout', TIMEOUT)
+    try:
+        response = get_session().request(method, f"{base_url}{path}", **kwargs)
+    except requests.RequestException:
+        return None, None
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    return response.status_code, body
+
+
+class _NotCached(Exception):
+    # Carries a failed response out of a cached read; st.cache_data does not keep exceptions
+    def __init__(self, status, body):
+        super().__init__(status)
+        self.status = status
+        self.body = body
+
+
+def cached(ttl):
+    """``st.cache_data`` for a read that keeps only 200 responses.
+
+    Network errors and error statuses are returned to the caller but not
+    cached, so one cold-start timeout does not stick for the whole TTL.
+    """
+    def decorate(fetch):
+        @st.cache_data(ttl=ttl, show_spinner=False)
+        @functools.wraps(fetch)
+        def fetch_ok(*args):
+            status, body = fetch(*args)
+            if status != 200:
+                raise _NotCached(status, body)
+            return status, body
+
+        @functools.wraps(fetch)
+        def read(*args):
+            try:
+                return fetch_ok(*args)
+            except _NotCached as e:
+                return e.status, e.body
+        read.clear = fetch_ok.clear
+        return read
+    return decorate
+
+
+@cached(ttl=MENU_TTL)
+def fetch_menu(base_url):
+    return call('GET', base_url, '/menu')
+
+
+@cached(ttl=MENU_TTL)
+def search_menu(base_url, q):
+    return call('GET', base_url, '/menu/search', params={"q": q})
+
+
+@cached(ttl=DETAILS_TTL)
+def fetch_restaurant_details(base_url):
+    return call('GET', base_url, '/restaurant_details')
+
+
+@cached(ttl=ORDERS_TTL)
+def fetch_orders(base_url):
+    return call('GET', base_url, '/order/view')
+
+
+# Cached reads that a write to a path starting with the key makes stale
+INVALIDATES = {
+    '/menu': (fetch_menu, search_menu),
+    '/restaurant_details': (fetch_restaurant_details,),
+    '/order': (fetch_orders,),
+}
+
+
+def write(method, base_url, path, **kwargs):
+    status, body = call(method, base_url, path, **kwargs)
+    if status is not None and status < 400:
+        for prefix, cached in INVALIDATES.items():
+            if path.startswith(prefix):
+                for fetch in cached:
+                    fetch.clear()
+    return status, body
+
+
+def post(base_url, path, json=None):
+    if path not in IDEMPOTENT_POSTS:
+        return write('POST', base_url, path, json=json)
+    # Every attempt carries the same key, so a resend after a lost response replays it instead of writing twice
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    for attempt in range(POST_ATTEMPTS):
+        if attempt:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+        status, body = write('POST', base_url, path, json=json, headers=headers)
+        if status is not None and status not in RETRY_STATUSES:
+            break
+    return status, body
+
+
+def put(base_url, path, json=None):
+    return write('PUT', base_url, path, json=json)
+
+
+def delete(base_url, path):
+    return write('DELETE', base_url, path)
@@ -0,0 +1,231 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Index, MetaData, column, delete, event, exists, func, null, or_, select, table, text, union_all
+
+from models import db, Order, Payment, Reservation
+from payments import SETTLED
+from tenancy import current_tenant, shards
+
+SCHEMA = 'archive'
+
+# Column whose year picks the partition; also the one reports filter on
+PARTITION_COLUMN = {Order: 'created_at', Reservation: 'datetime'}
+
+
+class ArchiveUnavailable(Exception):
+    pass
+
+
+def default_path(database):
+    """``restaurant.db`` is archived to ``restaurant-archive.db`` next to it."""
+    if not database or database == ':memory:':
+        return ':memory:'
+    return f"{os.path.splitext(database)[0]}-archive.db"
+
+
+def _partition_name(model, year):
+    return f"{model.__table__.name}_{year}"
+
+
+class Archive:
+    """Moves old orders and reservations out of the hot tables.
+
+    Archived rows live in a second SQLite file, attached to every connection
+    as the ``archive`` schema, in one table per year (``archive.order_2024``,
+    ``archive.reservation_2024``). The hot file keeps only recent rows, so
+    its indexes stay in the page cache and VACUUM stays quick. Reports read
+    through ``history``, which adds the partitions overlapping a date range.
+
+    ``run`` moves closed orders (paid, or with a settled payment) older than
+    ``ARCHIVE_ORDERS_AFTER_DAYS`` and reservations older than
+    ``ARCHIVE_RESERVATIONS_AFTER_DAYS``. Each batch is copied and committed
+    before it is deleted from the hot table. A crash in between leaves rows
+    in both places, and the next run just finishes the delete. The newest
+    row of each table always stays hot, so SQLite never hands out an
+    archived id again. On other databases there is nothing to attach and
+    ``history`` is the hot table alone.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.order_days = 90
+        self.reservation_days = 30
+        self.batch_size = 5000
+
+    def init_app(self, app):
+        self.order_days = app.config['ARCHIVE_ORDERS_AFTER_DAYS']
+        self.reservation_days = app.config['ARCHIVE_RESERVATIONS_AFTER_DAYS']
+        self.batch_size = app.config['ARCHIVE_BATCH']
+        with app.app_context():
+            engine = db.engine
+        self.path = None
+        shards.engine_hooks.pop('archive', None)
+        if engine.dialect.name == 'sqlite':
+            self.path = app.config['ARCHIVE_DATABASE'] or default_path(engine.url.database)
+            event.listen(engine, 'connect', self._attacher(self.path))
+            # Each tenant database gets an archive file of its own next to it
+            shards.engine_hooks['archive'] = lambda tenant_engine: event.listen(
+                tenant_engine, 'connect', self._attacher(default_path(tenant_engine.url.database)))
+        app.extensions['archive'] = self
+
+    @staticmethod
+    def _attacher(path):
+        def attach(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+                cursor.execute(f"PRAGMA {SCHEMA}.journal_mode=WAL")
+            finally:
+                cursor.close()
+        return attach
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _path(self):
+        if current_tenant() is None:
+            return self.path
+        return default_path(db.session.get_bind().url.database)
+
+    def _table(self, model, year):
+        # Same columns as the hot table, indexed only on the partition column
+        hot = model.__table__
+        name = _partition_name(model, year)
+        partition = hot.to_metadata(MetaData(), schema=SCHEMA, name=name)
+        partition.indexes.clear()
+        Index(f"ix_{name}_{PARTITION_COLUMN[model]}", partition.c[PARTITION_COLUMN[model]])
+        return partition
+
+    def partitions(self, model):
+        """Years archived for ``model``, oldest first."""
+        if not self.enabled:
+            return []
+        prefix = model.__table__.name
+        rows = db.session.execute(
+            text(f"SELECT name FROM {SCHEMA}.sqlite_master WHERE type = 'table' AND name GLOB :pattern"),
+            {"pattern": f"{prefix}_[0-9][0-9][0-9][0-9]"})
+        return sorted(int(name[len(prefix) + 1:]) for name, in rows)
+
+    def _columns(self, connection, name):
+        return {row[1] for row in connection.execute(text(f'PRAGMA {SCHEMA}.table_info("{name}")'))}
+
+    def history(self, model, start=None, end=None):
+        """Rows of ``model`` in ``[start, end)`` from the hot table and the archive.
+
+        Returns a subquery with the hot table's columns. Only the partitions
+        whose year overlaps the range are read. A column added to the hot
+        table after a partition was created reads as NULL there.
+        """
+        hot = model.__table__
+        when = PARTITION_COLUMN[model]
+
+        def in_range(statement, column):
+            if start is not None:
+                statement = statement.where(column >= start)
+            if end is not None:
+                statement = statement.where(column < end)
+            return statement
+
+        parts = [in_range(select(*hot.columns), hot.c[when])]
+        for year in self.partitions(model):
+            if (start is not None and year < start.year) or (end is not None and datetime(year, 1, 1) >= end):
+                continue
+            name = _partition_name(model, year)
+            present = self._columns(db.session, name)
+            partition = table(name, *(column(c.name) for c in hot.columns if c.name in present), schema=SCHEMA)
+            parts.append(in_range(
+                select(*(partition.c[c.name] if c.name in present else null().label(c.name) for c in hot.columns)),
+                partition.c[when]))
+        return (parts[0] if len(parts) == 1 else union_all(*parts)).subquery(hot.name)
+
+    def _eligible(self, model, now):
+        if model is Order:
+            settled = exists().where(Payment.order_id == Order.id, Payment.status == SETTLED)
+            return [Order.created_at < now - timedelta(days=self.order_days), or_(Order.status == 'paid', settled)]
+        return [Reservation.datetime < now - timedelta(days=self.reservation_days)]
+
+    def _ensure_partition(self, connection, model, year):
+        partition = self._table(model, year)
+        partition.create(connection, checkfirst=True)
+        # Columns added to the hot table since the partition was created
+        present = self._columns(connection, partition.name)
+        for c in model.__table__.columns:
+            if c.name not in present:
+                connection.exec_driver_sql(f'ALTER TABLE {SCHEMA}."{partition.name}" ADD COLUMN "{c.name}" '
+                                           f'{c.type.compile(connection.dialect)}')
+        return partition
+
+    def _move(self, connection, model, now):
+        hot = model.__table__
+        when = hot.c[PARTITION_COLUMN[model]]
+        newest = connection.scalar(select(func.max(hot.c.id)))
+        moved = 0
+        while newest is not None:
+            rows = connection.execute(
+                select(hot.c.id, when).where(*self._eligible(model, now), hot.c.id < newest)
+                .order_by(hot.c.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                break
+            by_year = defaultdict(list)
+            for row_id, timestamp in rows:
+                by_year[timestamp.year].append(row_id)
+            for year, ids in by_year.items():
+                partition = self._ensure_partition(connection, model, year)
+                names = [c.name for c in hot.columns]
+                connection.execute(partition.insert().prefix_with('OR IGNORE')
+                                   .from_select(names, select(*hot.columns).where(hot.c.id.in_(ids))))
+            connection.commit()
+            connection.execute(delete(hot).where(hot.c.id.in_([row_id for row_id, _ in rows])))
+            connection.commit()
+            moved += len(rows)
+        return moved
+
+    def run(self, now=None):
+        """Archive everything due as of ``now``; returns the rows moved per table."""
+        if not self.enabled:
+            raise ArchiveUnavailable("Archival needs a SQLite database")
+        now = now or datetime.now()
+        # A connection of its own, so batches commit independently of the request session
+        with db.session.get_bind().connect() as connection:
+            return {"orders": self._move(connection, Order, now),
+                    "reservations": self._move(connection, Reservation, now)}
+
+    def vacuum(self):
+        """Rebuild the hot database file so the space freed by archival is returned."""
+        with db.session.get_bind().connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql("VACUUM main")
+
+    def status(self, now=None):
+        """Row counts per table and partition, what the next run would move and the file sizes."""
+        if not self.enabled:
+            raise ArchiveUnavailable("Archival needs a SQLite database")
+        now = now or datetime.now()
+        path = self._path()
+        body = {"archive_path": path}
+        for key, model in (("orders", Order), ("reservations", Reservation)):
+            hot = model.__table__
+            newest = db.session.scalar(select(func.max(hot.c.id)))
+            due = select(func.count()).select_from(hot).where(*self._eligible(model, now), hot.c.id < newest)
+            body[key] = {
+                "hot": db.session.scalar(select(func.count()).select_from(hot)),
+                "due": db.session.scalar(due) if newest is not None else 0,
+                "archived": {str(year): db.session.scalar(
+                    select(func.count()).select_from(table(_partition_name(model, year), schema=SCHEMA)))
+                    for year in self.partitions(model)},
+            }
+        # Whether the hot file still fits in the page cache
+        pragma = lambda name: db.session.execute(text(f"PRAGMA main.{name}")).scalar()
+        page_size = pragma('page_size')
+        cache_size = pragma('cache_size')
+        body["hot_bytes"] = page_size * pragma('page_count')
+        body["hot_free_bytes"] = page_size * pragma('freelist_count')
+        body["page_cache_bytes"] = -cache_size * 1024 if cache_size < 0 else cache_size * page_size
+        body["archive_bytes"] = os.path.getsize(path) if os.path.exists(path) else 0
+        return body
+
+
+archive = Archive()
@@ -0,0 +1,323 @@
+"""Optional ASGI serving mode.
+
+Serves the busiest endpoints from coroutines on one event loop, backed by an
+async SQLAlchemy engine (aiosqlite or asyncpg):
+
+- ``GET /menu``
+- ``POST /order`` and ``GET /order/view``
+- ``GET /reservations`` and ``POST /reservations``
+- ``GET /restaurant_details``
+- ``GET /kitchen/orders`` and ``GET /kitchen/stream``
+
+While a request waits on a database lock, a long-poll or an SSE stream it
+holds no thread.
+Everything else, including keyed (``Idempotency-Key``) POSTs and CSV/NDJSON
+exports, is handed to the regular Flask app on a thread pool, so the API is
+the same in both modes. The async routes skip Flask's request hooks, so
+``/metrics`` does not see them.
+
+    uvicorn --factory asgi:create_asgi_app --workers 2
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse as BaseJSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import create_app
+from availability import (OutsideServiceHours, SlotFull, availability, check_booking, parse_party_size,
+                          parse_reservation_datetime)
+from cache import menu_cache
+from database import apply_sqlite_pragmas
+from journal import order_journal
+from kitchen import kitchen_feed
+from models import MenuItem, Order, Reservation
+from orders import check_order
+from pagination import PaginationError, keyset_query, split_page
+from routes.api import filter_orders, filter_reservations
+from sales import rollup_rows, upsert_statement
+from serializers import MENU_ITEM, ORDER, RESERVATION, RESTAURANT, orjson
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(url):
+    scheme, sep, rest = url.partition('://')
+    return ASYNC_DRIVERS.get(scheme.split('+')[0], scheme) + sep + rest
+
+
+class JSONResponse(BaseJSONResponse):
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+        return json.dumps(content, sort_keys=True, separators=(',', ':')).encode()
+
+
+def _error(message, status, key='error'):
+    return JSONResponse({key: message}, status_code=status)
+
+
+def _etag_matches(header, etag):
+    tags = (tag.strip().removeprefix('W/').strip('"') for tag in header.split(','))
+    return any(tag in (etag, '*') for tag in tags)
+
+
+async def _json(request):
+    """The request body parsed as JSON; raises ValueError when it is not JSON."""
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("Request body must be valid JSON") from None
+
+
+async def _in_flask(request, fn, *args):
+    """Run blocking code that needs the Flask app context on the thread pool."""
+    flask_app = request.app.state.flask
+
+    def call():
+        with flask_app.app_context():
+            return fn(*args)
+    return await run_in_threadpool(call)
+
+
+async def get_menu(request):
+    sessions = request.app.state.sessions
+
+    async def load_menu():
+        async with sessions() as session:
+            rows = (await session.execute(select(*MENU_ITEM.columns).order_by(MenuItem.id))).all()
+        return JSONResponse(MENU_ITEM.many(rows)).body
+
+    etag, body = await menu_cache.get_async(load_menu)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get('if-none-match', ''), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def create_order(request):
+    try:
+        data = await _json(request)
+    except ValueError as e:
+        return _error(str(e), 400)
+    line, error = check_order(data)
+    if error:
+        return _error(error, 400)
+    async with request.app.state.sessions() as session:
+        menu_item = await session.get(MenuItem, line['item_id'])
+        if not menu_item:
+            return _error("Menu item not found", 404)
+        order = Order(user_id=line['user_id'], item_id=line['item_id'],
+                      item_name=data.get('item_name') or menu_item.name, quantity=line['quantity'],
+                      unit_price=menu_item.price, created_at=datetime.now())
+        session.add(order)
+        await session.execute(upsert_statement(session.bind.dialect.name), rollup_rows([
+            {"item_id": order.item_id, "quantity": order.quantity, "unit_price": order.unit_price,
+             "created_at": order.created_at}]))
+        await session.commit()
+    await _in_flask(request, kitchen_feed.notify)
+    return JSONResponse({"message": "Order created successfully"}, status_code=201)
+
+
+async def _page(request, serializer, id_column, filters):
+    try:
+        query = filters(select(*serializer.columns), request.query_params)
+        query, limit = keyset_query(query, id_column, request.query_params)
+    except PaginationError as e:
+        return _error(str(e), 400)
+    async with request.app.state.sessions() as session:
+        rows = (await session.execute(query)).all()
+    rows, next_cursor = split_page(rows, limit)
+    return JSONResponse({"items": serializer.many(rows), "next_cursor": next_cursor})
+
+
+async def view_orders(request):
+    return await _page(request, ORDER, Order.id, filter_orders)
+
+
+async def list_reservations(request):
+    return await _page(request, RESERVATION, Reservation.id, filter_reservations)
+
+
+async def create_reservation(request):
+    try:
+        data = await _json(request)
+    except ValueError as e:
+        return _error(str(e), 400)
+    error = check_booking(data)
+    if error:
+        return _error(error, 400)
+    try:
+        party_size = parse_party_size(data.get('party_size', 2))
+    except ValueError as e:
+        return _error(str(e), 400)
+    try:
+        when = parse_reservation_datetime(data['datetime'])
+        availability.slot_for(when)
+        async with request.app.state.sessions() as session:
+            lock = availability.slot_lock(session.bind.dialect.name, when)
+            if lock is not None:
+                await session.execute(lock)
+            reservation_id = (await session.execute(
+                availability.booking_statement(data['user_id'], when, party_size))).scalar()
+            if reservation_id is None:
+                raise SlotFull()
+            await session.commit()
+        availability.record_booking(when, party_size)
+    except OutsideServiceHours as e:
+        return _error(str(e), 400)
+    except SlotFull:
+        return _error("No availability left in that time slot", 409)
+    except ValueError:
+        return _error("Invalid date format, please use YYYY-MM-DD", 400)
+    return JSONResponse({"message": "Reservation created successfully", "reservation_id": reservation_id},
+                        status_code=201)
+
+
+async def restaurant_details(request):
+    async with request.app.state.sessions() as session:
+        row = (await session.execute(select(*RESTAURANT.columns).limit(1))).first()
+    if not row:
+        return _error("Restaurant details not found", 404, key='message')
+    return JSONResponse(RESTAURANT.one(row))
+
+
+async def poll_kitchen(request):
+    config = request.app.state.flask.config
+    try:
+        since = int(request.headers.get('last-event-id') or request.query_params.get('since', 0))
+        timeout = min(float(request.query_params.get('timeout', config['KITCHEN_LONGPOLL_TIMEOUT'])),
+                      config['KITCHEN_LONGPOLL_TIMEOUT'])
+    except ValueError:
+        return _error("since and timeout must be numbers", 400)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(timeout, 0)
+    # The wait is a sleep on the event loop, not a parked thread
+    while True:
+        events = await _in_flask(request, kitchen_feed.poll, since)
+        remaining = deadline - loop.time()
+        if events or remaining <= 0:
+            break
+        await asyncio.sleep(min(remaining, kitchen_feed.poll_interval))
+    return JSONResponse({"events": events, "last_seq": events[-1]["seq"] if events else since})
+
+
+async def stream_kitchen(request):
+    config = request.app.state.flask.config
+    try:
+        since = int(request.headers.get('last-event-id') or request.query_params.get('since', 0))
+    except ValueError:
+        return _error("since must be a number", 400)
+    state = request.app.state
+    if state.kitchen_streams >= config['KITCHEN_MAX_ASYNC_STREAMS']:
+        return JSONResponse({"error": "Too many kitchen screens connected; use /kitchen/orders"},
+                            status_code=503, headers={"Retry-After": "5"})
+    state.kitchen_streams += 1
+
+    async def release():
+        state.kitchen_streams -= 1
+
+    async def generate(seq):
+        # Same stream as the Flask view, but waiting is a sleep on the event loop
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config['KITCHEN_STREAM_DURATION']
+        beat = loop.time() + config['KITCHEN_HEARTBEAT']
+        yield "retry: 2000\n\n"
+        while loop.time() < deadline:
+            events = await _in_flask(request, kitchen_feed.poll, seq)
+            for event in events:
+                seq = event["seq"]
+                yield f"id: {seq}\nevent: order\ndata: {json.dumps(event['order'])}\n\n"
+            if events:
+                beat = loop.time() + config['KITCHEN_HEARTBEAT']
+            elif loop.time() >= beat:
+                yield ": keep-alive\n\n"
+                beat = loop.time() + config['KITCHEN_HEARTBEAT']
+            await asyncio.sleep(min(kitchen_feed.poll_interval, max(deadline - loop.time(), 0)))
+
+    # The background task runs once the stream ends or the client disconnects
+    return StreamingResponse(generate(since), media_type='text/event-stream', background=BackgroundTask(release),
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+class FlaskFallback:
+    """Send requests that only the Flask views implement straight to Flask.
+
+    Idempotency keys, file exports and tenant databases live in the Flask
+    views, so keyed POSTs, ``?format=`` requests and requests naming a tenant
+    skip the async routes even where the path matches. ``/t/<tenant>`` paths
+    match no async route and reach Flask anyway.
+    """
+
+    def __init__(self, app, wsgi, tenant_header='X-Tenant'):
+        self.app = app
+        self.wsgi = wsgi
+        self.tenant_header = tenant_header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        await (self.wsgi if self._needs_flask(scope) else self.app)(scope, receive, send)
+
+    def _needs_flask(self, scope):
+        if scope['type'] != 'http':
+            return False
+        names = {name for name, _ in scope['headers']}
+        if self.tenant_header in names:
+            return True
+        if scope['method'] == 'POST' and b'idempotency-key' in names:
+            return True
+        return 'format' in parse_qs(scope['query_string'].decode())
+
+
+def create_asgi_app(config=None):
+    """Build the ASGI app around ``create_app(config)``; both share one configuration."""
+    flask_app = create_app(config)
+    url = async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if 'pool_size' in options:
+        # aiosqlite defaults to NullPool for files, which takes no pool sizing
+        options.setdefault('poolclass', AsyncAdaptedQueuePool)
+    engine = create_async_engine(url, **options)
+    apply_sqlite_pragmas(engine.sync_engine, flask_app.config.get('SQLITE_PRAGMAS'))
+    wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    routes = [
+        Route('/menu', get_menu, methods=['GET']),
+        Route('/order', create_order, methods=['POST']),
+        Route('/order/view', view_orders, methods=['GET']),
+        Route('/reservations', list_reservations, methods=['GET']),
+        Route('/reservations', create_reservation, methods=['POST']),
+        Route('/restaurant_details', restaurant_details, methods=['GET']),
+        Route('/kitchen/orders', poll_kitchen, methods=['GET']),
+        Route('/kitchen/stream', stream_kitchen, methods=['GET']),
+    ]
+    if order_journal.enabled:
+        # Journaled orders are acknowledged by the Flask view
+        routes = [route for route in routes if route.path != '/order']
+    if engine.dialect.name != 'sqlite':
+        # The kitchen feed is SQLite-only; the Flask views answer 501
+        routes = [route for route in routes if not route.path.startswith('/kitchen/')]
+    fallback = Middleware(FlaskFallback, wsgi=wsgi, tenant_header=flask_app.config['TENANT_HEADER'])
+    app = Starlette(routes=[*routes, Mount('/', app=wsgi)], middleware=[fallback], lifespan=lifespan)
+    app.state.flask = flask_app
+    app.state.kitchen_streams = 0
+    app.state.sessions = async_sessionmaker(engine, expire_on_commit=False)
+    return app
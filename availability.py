@@ -0,0 +1,275 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, literal, select, update
+
+from models import db, Reservation
+from tenancy import PerTenant
+
+# Reservations in this status no longer hold covers
+CANCELED = 'canceled'
+
+
+class SlotFull(Exception):
+    pass
+
+
+class OutsideServiceHours(ValueError):
+    pass
+
+
+def parse_reservation_datetime(value):
+    """Accept ``YYYY-MM-DD`` or ``YYYY-MM-DD HH:MM``."""
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    raise ValueError(f"Invalid reservation datetime: {value!r}")
+
+
+def parse_party_size(value):
+    """Covers for a booking: a whole number of at least 1 (JSON int or digit string)."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("party_size must be an integer")
+    try:
+        party_size = int(value)
+    except ValueError:
+        raise ValueError("party_size must be an integer") from None
+    if party_size < 1:
+        raise ValueError("party_size must be at least 1")
+    return party_size
+
+
+def check_booking(data):
+    """Error message for a booking body missing what every booking needs, or None."""
+    if not isinstance(data, dict):
+        return "Request body must be a JSON object"
+    if 'user_id' not in data or 'datetime' not in data:
+        return "user_id and datetime are required"
+    return None
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class AvailabilityIndex:
+    """Booked covers per time slot, kept in memory so availability is O(slots).
+
+    The index is built from the reservation table on first use and updated
+    after every booking, change and cancellation made through this module.
+    Each worker process holds its own copy and rebuilds it every
+    ``RESERVATION_INDEX_REFRESH`` seconds to pick up other workers' bookings.
+    Capacity itself is always enforced by the database, so a stale index can
+    misreport availability for a moment but can never overbook a slot.
+    """
+
+    def __init__(self):
+        self.slot_minutes = 1440
+        self.opening = 0
+        self.closing = 1440
+        self.capacity = 100
+        self.refresh_interval = 60
+        self._booked = None
+        self._loaded_at = 0
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.slot_minutes = app.config['RESERVATION_SLOT_MINUTES']
+        self.opening = _minutes(app.config['RESERVATION_OPENING'])
+        self.closing = _minutes(app.config['RESERVATION_CLOSING'])
+        self.capacity = app.config['RESERVATION_SLOT_CAPACITY']
+        self.refresh_interval = app.config['RESERVATION_INDEX_REFRESH']
+        self.reset()
+        app.extensions['availability'] = self
+
+    def reset(self):
+        with self._lock:
+            self._booked = None
+
+    def slot_for(self, when):
+        minute = when.hour * 60 + when.minute
+        if minute < self.opening or minute >= self.closing:
+            raise OutsideServiceHours("Reservation time is outside service hours")
+        start = self.opening + (minute - self.opening) // self.slot_minutes * self.slot_minutes
+        return datetime.combine(when.date(), datetime.min.time()) + timedelta(minutes=start)
+
+    def _slot_bounds(self, when):
+        start = self.slot_for(when)
+        return start, start + timedelta(minutes=self.slot_minutes)
+
+    def _ensure_loaded(self):
+        stale = self.refresh_interval and time.monotonic() - self._loaded_at > self.refresh_interval
+        if self._booked is not None and not stale:
+            return
+        booked = defaultdict(int)
+        rows = db.session.execute(
+            select(Reservation.datetime, func.sum(Reservation.party_size))
+            .where(Reservation.status != CANCELED)
+            .group_by(Reservation.datetime)
+        )
+        for when, covers in rows:
+            try:
+                booked[self.slot_for(when)] += covers
+            except OutsideServiceHours:
+                continue
+        self._booked = booked
+        self._loaded_at = time.monotonic()
+
+    def _apply(self, when, covers, status):
+        if self._booked is None or status == CANCELED:
+            return
+        try:
+            slot = self.slot_for(when)
+        except OutsideServiceHours:
+            # Rows from before the service hours were set; _ensure_loaded never counted them
+            return
+        self._booked[slot] += covers
+        if self._booked[slot] <= 0:
+            del self._booked[slot]
+
+    def _booked_in_slot(self, when, exclude_id=None):
+        start, end = self._slot_bounds(when)
+        query = select(func.coalesce(func.sum(Reservation.party_size), 0)).where(
+            Reservation.datetime >= start,
+            Reservation.datetime < end,
+            Reservation.status != CANCELED,
+        )
+        if exclude_id is not None:
+            query = query.where(Reservation.id != exclude_id)
+        return query.scalar_subquery()
+
+    def slot_lock(self, dialect_name, when):
+        """Statement that serializes writes to ``when``'s slot, or None where none is needed.
+
+        SQLite has one writer at a time, so the guarded INSERT always sees
+        every committed booking. Under READ COMMITTED on PostgreSQL two of them
+        could both pass the check. A transaction-scoped advisory lock keyed on
+        the slot makes the second wait for the first to commit, and its
+        statement then sees the first booking.
+        """
+        if dialect_name != 'postgresql':
+            return None
+        return select(func.pg_advisory_xact_lock(int(self.slot_for(when).timestamp())))
+
+    def _lock_slot(self, when):
+        statement = self.slot_lock(db.session.get_bind().dialect.name, when)
+        if statement is not None:
+            db.session.execute(statement)
+
+    def booking_statement(self, user_id, when, party_size, status='confirmed'):
+        """``INSERT ... SELECT ... WHERE`` that adds the booking only if the slot has room.
+
+        It returns the new id, or no row when the slot is full.
+        """
+        table = Reservation.__table__
+        guarded = select(
+            literal(user_id, table.c.user_id.type),
+            literal(when, table.c.datetime.type),
+            literal(status, table.c.status.type),
+            literal(party_size, table.c.party_size.type),
+        ).where(self._booked_in_slot(when) + party_size <= self.capacity)
+        return (insert(table)
+                .from_select(['user_id', 'datetime', 'status', 'party_size'], guarded)
+                .returning(table.c.id))
+
+    def record_booking(self, when, party_size, status='confirmed'):
+        """Count a booking committed outside ``book()``, e.g. by the async app."""
+        with self._lock:
+            self._apply(when, party_size, status)
+
+    def _load(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._loaded_at
+
+    def _record(self, loaded_at, *changes):
+        # The lock covers only the in-memory index, never a commit. A rebuild
+        # since loaded_at may already have read this write, so leave it to that.
+        with self._lock:
+            if self._loaded_at == loaded_at:
+                for change in changes:
+                    self._apply(*change)
+
+    def _in_service(self, when):
+        try:
+            self.slot_for(when)
+        except OutsideServiceHours:
+            return False
+        return True
+
+    def book(self, user_id, when, party_size, status='confirmed'):
+        """Insert a reservation only if its slot has room; return the new id.
+
+        The capacity check and the insert are one ``INSERT ... SELECT ...
+        WHERE`` statement, so two concurrent bookings cannot both take the
+        last table even when they come from different worker processes. That
+        holds on SQLite as is and on PostgreSQL through ``slot_lock``.
+        """
+        self.slot_for(when)
+        loaded_at = self._load()
+        self._lock_slot(when)
+        reservation_id = db.session.execute(
+            self.booking_statement(user_id, when, party_size, status)).scalar()
+        if reservation_id is None:
+            db.session.rollback()
+            raise SlotFull()
+        db.session.commit()
+        self._record(loaded_at, (when, party_size, status))
+        return reservation_id
+
+    def change(self, reservation, when=None, party_size=None, status=None):
+        """Move, resize or re-status a reservation, checking capacity where it lands.
+
+        Capacity is only checked when the reservation takes more covers in a
+        slot: it moves, grows or stops being canceled. Rows outside service
+        hours can have their status or size edited in place.
+        """
+        old = (reservation.datetime, reservation.party_size, reservation.status)
+        new = (when or old[0], party_size or old[1], status or old[2])
+        if new[0] != old[0]:
+            self.slot_for(new[0])
+        takes_covers = new[2] != CANCELED and (new[0] != old[0] or new[1] > old[1] or old[2] == CANCELED)
+        loaded_at = self._load()
+        table = Reservation.__table__
+        statement = update(table).where(table.c.id == reservation.id).values(
+            datetime=new[0], party_size=new[1], status=new[2])
+        if takes_covers and self._in_service(new[0]):
+            self._lock_slot(new[0])
+            statement = statement.where(
+                self._booked_in_slot(new[0], exclude_id=reservation.id) + new[1] <= self.capacity)
+        if db.session.execute(statement).rowcount == 0:
+            db.session.rollback()
+            raise SlotFull()
+        db.session.commit()
+        self._record(loaded_at, (old[0], -old[1], old[2]), new)
+
+    def cancel(self, reservation):
+        """Delete a reservation and hand its covers back to the slot."""
+        loaded_at = self._load()
+        old = (reservation.datetime, reservation.party_size, reservation.status)
+        db.session.delete(reservation)
+        db.session.commit()
+        self._record(loaded_at, (old[0], -old[1], old[2]))
+
+    def for_date(self, day):
+        with self._lock:
+            self._ensure_loaded()
+            start = datetime.combine(day, datetime.min.time())
+            slots = []
+            for minute in range(self.opening, self.closing, self.slot_minutes):
+                slot = start + timedelta(minutes=minute)
+                booked = self._booked.get(slot, 0)
+                slots.append({
+                    "start": str(slot),
+                    "booked": booked,
+                    "available": max(self.capacity - booked, 0),
+                })
+            return slots
+
+
+availability = PerTenant(lambda tenant: AvailabilityIndex())
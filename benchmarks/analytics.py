@@ -0,0 +1,105 @@
+"""Vectorized reports versus a per-row ORM loop.
+
+Seeds a scratch database with N orders and N/10 reservations, then times the
+top-items and hourly-covers reports computed by ``analytics`` (Core chunks
+into pandas) and by the naive approach of loading ORM objects and summing
+them in Python. Prints wall time and peak traced memory for each.
+
+    python -m benchmarks.analytics --orders 1000000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('APP_ENV', 'production')
+
+from sqlalchemy import insert  # noqa: E402
+
+import analytics  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, MenuItem, Order, Reservation  # noqa: E402
+
+app = create_app()
+
+
+def seed(orders, items=50, chunk=50000):
+    rng = random.Random(42)
+    db.create_all()
+    db.session.execute(insert(MenuItem), [
+        {"id": i, "name": f"Item {i}", "price": round(rng.uniform(50, 500), 2)} for i in range(1, items + 1)])
+    start = datetime.now() - timedelta(days=90)
+    for offset in range(0, orders, chunk):
+        rows = []
+        for _ in range(min(chunk, orders - offset)):
+            item_id = rng.randint(1, items)
+            rows.append({"user_id": rng.randint(1, 5000), "item_id": item_id, "item_name": f"Item {item_id}",
+                         "quantity": rng.randint(1, 4), "unit_price": 100.0,
+                         "created_at": start + timedelta(seconds=rng.randint(0, 90 * 86400))})
+        db.session.execute(insert(Order), rows)
+    db.session.execute(insert(Reservation), [
+        {"user_id": rng.randint(1, 5000), "party_size": rng.randint(1, 8),
+         "status": rng.choice(('confirmed', 'confirmed', 'canceled', 'no_show')),
+         "datetime": start + timedelta(minutes=15 * rng.randint(0, 90 * 96))}
+        for _ in range(orders // 10)])
+    db.session.commit()
+
+
+def naive_top_items(limit=10):
+    totals = defaultdict(lambda: [0, 0.0])
+    for order in Order.query.all():
+        totals[order.item_id][0] += order.quantity
+        totals[order.item_id][1] += order.quantity * (order.unit_price or 0)
+    return sorted(totals.items(), key=lambda kv: kv[1][0], reverse=True)[:limit]
+
+
+def naive_hourly_covers():
+    covers = defaultdict(int)
+    for reservation in Reservation.query.all():
+        if reservation.status != 'canceled':
+            covers[reservation.datetime.hour] += reservation.party_size
+    return dict(covers)
+
+
+def measure(name, fn):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    # Second, traced run for memory so tracing overhead stays out of the timing
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"report": name, "seconds": round(elapsed, 3), "peak_mb": round(peak / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed(args.orders)
+        seeded = round(time.perf_counter() - start, 1)
+        import pandas  # noqa: F401  keep the one-off import out of the timings
+        results = [
+            measure('top_items/orm', naive_top_items),
+            measure('top_items/vectorized', analytics.top_items),
+            measure('hourly_covers/orm', naive_hourly_covers),
+            measure('hourly_covers/vectorized', analytics.hourly_covers),
+        ]
+    print(json.dumps({"orders": args.orders, "seed_seconds": seeded, "results": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
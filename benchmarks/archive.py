@@ -0,0 +1,119 @@
+"""Hot-table size and query times before and after archival.
+
+Seeds a scratch database with ``--days`` of history: ``--orders-per-day``
+paid orders and ``--reservations-per-day`` reservations a day. It times a set
+of queries and maintenance steps, runs the archival, and times them again:
+- the reports over the last week, which read the hot table only;
+- the same reports over the whole history, which also read the archive;
+- one user's recent orders, with the ``/order/view`` filter;
+- a full-table integrity check and VACUUM of the hot file.
+
+It also reports the file sizes and how long the archival took.
+
+    python -m benchmarks.archive --days 730 --orders-per-day 500
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from benchmarks.load import DATABASE_URL, app
+from archive import archive
+from models import db, MenuItem, Order, Reservation
+
+client = app.test_client()
+
+
+def seed(days, orders_per_day, reservations_per_day, seed=11):
+    rng = random.Random(seed)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(MenuItem), [{"id": i, "name": f"Dish {i}", "price": 100.0 + i} for i in range(1, 61)])
+        for day in range(days, -1, -1):
+            start = today - timedelta(days=day)
+            orders = []
+            for _ in range(orders_per_day):
+                item = rng.randint(1, 60)
+                orders.append({"user_id": rng.randint(1, 5000), "item_id": item, "item_name": f"Dish {item}",
+                               "quantity": rng.randint(1, 3), "unit_price": 100.0 + item, "status": "paid",
+                               "created_at": start + timedelta(minutes=rng.randint(660, 1380))})
+            db.session.execute(insert(Order), sorted(orders, key=lambda o: o['created_at']))
+            db.session.execute(insert(Reservation), [
+                {"user_id": rng.randint(1, 5000), "status": "confirmed", "party_size": rng.randint(1, 8),
+                 "datetime": start + timedelta(minutes=rng.randint(660, 1380))}
+                for _ in range(reservations_per_day)])
+        db.session.commit()
+    return today
+
+
+def median_ms(action, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def get(path):
+    def action():
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    return action
+
+
+def sql(statement):
+    def action():
+        with app.app_context():
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql(statement).all()
+    return action
+
+
+def measure(today, repeat):
+    week = f"from={(today - timedelta(days=6)).date()}&to={today.date()}"
+    everything = f"from={(today - timedelta(days=3650)).date()}&to={today.date()}"
+    timings = {
+        "top_items_week_ms": median_ms(get(f'/reports/top-items?{week}'), repeat),
+        "hourly_covers_week_ms": median_ms(get(f'/reports/hourly-covers?{week}'), repeat),
+        "top_items_all_ms": median_ms(get(f'/reports/top-items?{everything}'), repeat),
+        "hourly_covers_all_ms": median_ms(get(f'/reports/hourly-covers?{everything}'), repeat),
+        "user_orders_ms": median_ms(get('/order/view?user_id=42&limit=20'), repeat),
+        "integrity_check_ms": median_ms(sql("PRAGMA main.quick_check"), 1),
+    }
+    with app.app_context():
+        timings["vacuum_ms"] = median_ms(archive.vacuum, 1)
+        status = archive.status()
+    timings.update(hot_orders=status['orders']['hot'], hot_reservations=status['reservations']['hot'],
+                   hot_bytes=status['hot_bytes'], archive_bytes=status['archive_bytes'],
+                   page_cache_bytes=status['page_cache_bytes'])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--orders-per-day', type=int, default=500)
+    parser.add_argument('--reservations-per-day', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    today = seed(args.days, args.orders_per_day, args.reservations_per_day)
+    before = measure(today, args.repeat)
+    with app.app_context():
+        start = time.perf_counter()
+        moved = archive.run()
+        archive_seconds = round(time.perf_counter() - start, 2)
+    after = measure(today, args.repeat)
+    print(json.dumps({"database": DATABASE_URL, "moved": moved, "archive_seconds": archive_seconds,
+                      "before": before, "after": after}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Concurrent long-poll capacity and memory per connection, WSGI versus ASGI.
+
+Starts the app under gunicorn (the Procfile's threaded WSGI setup) and under
+uvicorn (``asgi:create_asgi_app``) on a seeded scratch database. It opens N
+kitchen long-polls at once, each held open for ``--hold`` seconds because
+no new order arrives. Meanwhile it probes ``GET /menu``. For each mode it
+prints how many polls were served concurrently, the total wall time, the
+probe latency and the server's extra RSS per open connection.
+
+    python -m benchmarks.asgi --connections 64 --hold 1 --workers 1 --threads 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TMP = tempfile.mkdtemp()
+DATABASE_URL = os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('APP_ENV', 'production')
+
+from app import create_app  # noqa: E402
+from models import db, MenuItem, Order  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([MenuItem(name=f"Dish {i}", price=100.0 + i) for i in range(40)])
+        db.session.add(Order(user_id=1, item_id=1, item_name='Dish 0', quantity=1, unit_price=100.0))
+        db.session.commit()
+        return db.session.query(db.func.max(Order.id)).scalar()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(mode, port, workers, threads):
+    if mode == 'wsgi':
+        command = ['-m', 'gunicorn', 'app:create_app()', '--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    else:
+        command = ['-m', 'uvicorn', '--factory', 'asgi:create_asgi_app', '--workers', str(workers),
+                   '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+    env = dict(os.environ, DATABASE_URL=DATABASE_URL, APP_ENV='production')
+    return subprocess.Popen([sys.executable, *command], cwd=ROOT, env=env)
+
+
+def rss_kb(pid):
+    """Resident memory of ``pid`` and all of its descendants."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending += [int(child) for child in f.read().split()]
+        except (FileNotFoundError, StopIteration):
+            continue
+    return total
+
+
+async def get(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await get(port, '/menu') == 200:
+                return
+        except (OSError, IndexError, ValueError):
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+async def measure(mode, args, last_seq):
+    port = free_port()
+    process = serve(mode, port, args.workers, args.threads)
+    try:
+        await wait_ready(port)
+        # Warm every worker so boot-time allocations are in the idle figure
+        await asyncio.gather(*(get(port, '/menu') for _ in range(args.workers * 4)))
+        idle_kb = rss_kb(process.pid)
+
+        async def long_poll():
+            start = time.perf_counter()
+            status = await get(port, f"/kitchen/orders?since={last_seq}&timeout={args.hold}")
+            return status, time.perf_counter() - start
+
+        probes = []
+
+        async def probe(stop):
+            while not stop.is_set():
+                start = time.perf_counter()
+                await get(port, '/menu')
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.05)
+
+        stop = asyncio.Event()
+        prober = asyncio.ensure_future(probe(stop))
+        start = time.perf_counter()
+        polls = [asyncio.ensure_future(long_poll()) for _ in range(args.connections)]
+        await asyncio.sleep(args.hold / 2)
+        loaded_kb = rss_kb(process.pid)
+        results = await asyncio.gather(*polls)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+
+        # A poll that did not queue behind others returns after about --hold seconds
+        served_at_once = sum(1 for _, duration in results if duration < args.hold * 1.5)
+        return {
+            "mode": mode,
+            "connections": args.connections,
+            "ok": sum(1 for status, _ in results if status == 200),
+            "served_without_queueing": served_at_once,
+            "wall_seconds": round(elapsed, 2),
+            "effective_concurrency": round(args.connections * args.hold / elapsed, 1),
+            "menu_probe_p50_ms": round(statistics.median(probes), 1) if probes else None,
+            "menu_probe_max_ms": round(max(probes), 1) if probes else None,
+            "idle_rss_mb": round(idle_kb / 1024, 1),
+            "rss_per_connection_kb": round((loaded_kb - idle_kb) / args.connections, 1),
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--hold', type=float, default=1.0, help="seconds each long-poll stays open")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    args = parser.parse_args()
+
+    last_seq = seed()
+    results = [asyncio.run(measure(mode, args, last_seq)) for mode in ('wsgi', 'asgi')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
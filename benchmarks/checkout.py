@@ -0,0 +1,112 @@
+"""Concurrent checkout throughput with a slow payment gateway.
+
+Seeds users with unpaid orders and starts gunicorn with the fake gateway set
+to ``--gateway-latency`` seconds per charge. Clients check out distinct users
+concurrently. The run happens twice:
+- with the gateway called inline on the request thread
+  (PAYMENT_SETTLE_WORKERS=0);
+- with the settlement pool.
+
+For each mode it reports checkouts/sec, latency percentiles and how long it
+took until every payment was settled.
+
+    python -m benchmarks.checkout --clients 32 --checkouts 20 --gateway-latency 0.2
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import insert
+
+from benchmarks.load import GunicornTarget, app, percentile
+from models import db, MenuItem, Order, Payment
+
+
+def seed(users, orders_per_user=3):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(MenuItem), [{"id": i, "name": f"Dish {i}", "price": 100.0 + i} for i in range(1, 31)])
+        db.session.execute(insert(Order), [
+            {"user_id": user, "item_id": 1 + (user + n) % 30, "item_name": "Dish", "quantity": 1 + n % 3,
+             "unit_price": 100.0 + (user + n) % 30}
+            for user in range(1, users + 1) for n in range(orders_per_user)])
+        db.session.commit()
+
+
+def pending_payments():
+    with app.app_context():
+        count = db.session.query(db.func.count(Payment.id)).filter(Payment.status == 'pending').scalar()
+        db.session.remove()
+        return count
+
+
+def run(settle_workers, args, first_user):
+    os.environ['PAYMENT_SETTLE_WORKERS'] = str(settle_workers)
+    target = GunicornTarget(args.workers, args.threads)
+    try:
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.clients + 1)
+
+        def client(index):
+            send = target.connect()
+            barrier.wait()
+            for n in range(args.checkouts):
+                user_id = first_user + index * args.checkouts + n
+                start = time.perf_counter()
+                try:
+                    status = send('POST', '/checkout', {"user_id": user_id})
+                except (OSError, http.client.HTTPException):
+                    status = 'error'
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        answered = time.perf_counter() - start
+        while pending_payments() and time.perf_counter() - start < answered + 120:
+            time.sleep(0.05)
+        settled = time.perf_counter() - start
+    finally:
+        target.close()
+
+    total = args.clients * args.checkouts
+    return {
+        "settle_workers": settle_workers,
+        "checkouts_per_sec": round(total / answered, 1),
+        "settled_per_sec": round(total / settled, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "statuses": {str(code): n for code, n in sorted(statuses.items(), key=str)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--checkouts', type=int, default=20, help="checkouts per client")
+    parser.add_argument('--gateway-latency', type=float, default=0.2, help="seconds per fake gateway charge")
+    parser.add_argument('--settle-workers', type=int, default=16, help="settlement threads per gunicorn worker")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    args = parser.parse_args()
+
+    os.environ.update(PAYMENT_GATEWAY='payments.FakeGateway', PAYMENT_FAKE_LATENCY=str(args.gateway_latency))
+    per_run = args.clients * args.checkouts
+    seed(users=2 * per_run)
+    results = [run(workers, args, 1 + i * per_run) for i, workers in enumerate((0, args.settle_workers))]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
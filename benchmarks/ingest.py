@@ -0,0 +1,109 @@
+"""Sustained order throughput with and without the order journal.
+
+Runs gunicorn on a scratch database twice, once with ORDER_INGEST_MODE=direct
+and once with ORDER_INGEST_MODE=journal. Each time, ``--clients`` keep-alive
+clients post orders back to back for ``--seconds``. For each mode it reports:
+- acknowledged orders/sec and latency percentiles;
+- how long the journal took to drain after the clients stopped;
+- persisted orders/sec, counted up to the moment the last order reached the table.
+
+    python -m benchmarks.ingest --clients 32 --seconds 10 --workers 2
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import threading
+import time
+
+from benchmarks.load import TMP, GunicornTarget, app, percentile
+from models import db, MenuItem, Order
+
+os.environ.setdefault('ORDER_JOURNAL_DIR', os.path.join(TMP, 'order-journal'))
+
+
+def seed(items=60):
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([MenuItem(name=f"Dish {i}", price=100.0 + i) for i in range(items)])
+        db.session.commit()
+    return items
+
+
+def order_count():
+    with app.app_context():
+        count = db.session.query(db.func.count(Order.id)).scalar()
+        db.session.remove()
+        return count
+
+
+def run(mode, args, items):
+    os.environ['ORDER_INGEST_MODE'] = mode
+    before = order_count()
+    target = GunicornTarget(args.workers, args.threads)
+    try:
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.clients + 1)
+
+        def client(index):
+            rng = random.Random(index)
+            send = target.connect()
+            barrier.wait()
+            deadline = time.perf_counter() + args.seconds
+            while time.perf_counter() < deadline:
+                body = {"user_id": rng.randint(1, 2000), "item_id": rng.randint(1, items), "quantity": 1}
+                start = time.perf_counter()
+                try:
+                    status = send('POST', '/order', body)
+                except (OSError, http.client.HTTPException):
+                    status = 'error'
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        sent = time.perf_counter() - start
+
+        accepted = statuses.get(201, 0) + statuses.get(202, 0)
+        while order_count() - before < accepted and time.perf_counter() - start < sent + 60:
+            time.sleep(0.05)
+        persisted_at = time.perf_counter() - start
+        persisted = order_count() - before
+    finally:
+        target.close()
+
+    return {
+        "mode": mode,
+        "acknowledged_per_sec": round(accepted / sent, 1),
+        "persisted_per_sec": round(persisted / persisted_at, 1),
+        "drain_seconds": round(persisted_at - sent, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "persisted": persisted,
+        "statuses": {str(code): n for code, n in sorted(statuses.items(), key=str)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    args = parser.parse_args()
+
+    items = seed()
+    print(json.dumps([run(mode, args, items) for mode in ('direct', 'journal')], indent=2))
+
+
+if __name__ == '__main__':
+    main()
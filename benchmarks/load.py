@@ -0,0 +1,337 @@
+"""Rush-hour load test with per-endpoint latency percentiles and baselines.
+
+Seeds a scratch database with a realistic history (menu, users, months of
+reservations and orders), then replays a weighted mix of menu reads, orders,
+bookings and reports from many concurrent clients. Each client follows its
+own seeded request sequence, so runs are repeatable. The mix runs against
+the in-process test client, against gunicorn on localhost, or both. The
+result is JSON with throughput and p50/p95/p99 per endpoint.
+
+With ``--baseline`` the result is compared with a stored run. The script
+exits non-zero when an endpoint's p95 grows, or its throughput drops, by
+more than ``--tolerance``, or when it returns more 5xx responses. ``--save-baseline`` records the current run.
+Baselines only compare like with like: record them on the machine that
+checks them.
+
+    python -m benchmarks.load --clients 16 --requests 200 --target inprocess
+    python -m benchmarks.load --target gunicorn --workers 2 --baseline benchmarks/baselines/gunicorn.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+DATABASE_URL = os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('APP_ENV', 'production')
+
+import bcrypt  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, MenuItem, Order, Reservation, RestaurantDetail, User  # noqa: E402
+from sales import rebuild_rollup  # noqa: E402
+
+app = create_app()
+
+ENDPOINTS = {}
+
+
+def endpoint(name, weight):
+    def register(build):
+        ENDPOINTS[name] = (weight, build)
+        return build
+    return register
+
+
+# Each builder returns (method, path, json body) for one request of that kind
+
+@endpoint('GET /menu', 30)
+def menu(rng, dataset):
+    return 'GET', '/menu', None
+
+
+@endpoint('POST /order', 20)
+def order(rng, dataset):
+    return 'POST', '/order', {"user_id": rng.randint(1, dataset['users']),
+                              "item_id": rng.randint(1, dataset['items']), "quantity": rng.randint(1, 3)}
+
+
+@endpoint('POST /order/batch', 5)
+def order_batch(rng, dataset):
+    return 'POST', '/order/batch', {"user_id": rng.randint(1, dataset['users']), "items": [
+        {"item_id": rng.randint(1, dataset['items']), "quantity": rng.randint(1, 3)}
+        for _ in range(rng.randint(2, 6))]}
+
+
+@endpoint('GET /order/view', 10)
+def order_view(rng, dataset):
+    return 'GET', f"/order/view?user_id={rng.randint(1, dataset['users'])}&limit=50", None
+
+
+@endpoint('GET /reservations', 10)
+def reservations(rng, dataset):
+    day = dataset['today'] + timedelta(days=rng.randint(-30, 0))
+    return 'GET', f"/reservations?from={day:%Y-%m-%d}&to={day:%Y-%m-%d}", None
+
+
+@endpoint('POST /reservations', 10)
+def book(rng, dataset):
+    day = dataset['today'] + timedelta(days=rng.randint(1, 60))
+    return 'POST', '/reservations', {"user_id": rng.randint(1, dataset['users']),
+                                     "datetime": f"{day:%Y-%m-%d} {rng.choice(('12', '13', '19', '20'))}:00",
+                                     "party_size": rng.randint(1, 6)}
+
+
+@endpoint('GET /reservations/availability', 10)
+def availability(rng, dataset):
+    day = dataset['today'] + timedelta(days=rng.randint(0, 60))
+    return 'GET', f"/reservations/availability?date={day:%Y-%m-%d}", None
+
+
+@endpoint('GET /reports/sales', 5)
+def sales(rng, dataset):
+    return 'GET', f"/reports/sales?granularity={rng.choice(('hour', 'day'))}", None
+
+
+def seed(users=2000, items=60, months=3, orders_per_day=400, reservations_per_day=60):
+    """Fill the database with ``months`` of history ending today."""
+    rng = random.Random(1234)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start = today - timedelta(days=30 * months)
+    db.create_all()
+    # One real hash shared by every seeded account; hashing each would dominate seeding
+    password_hash = bcrypt.hashpw(b'correct horse', bcrypt.gensalt(4)).decode()
+    db.session.execute(insert(User), [{"username": f"user{i}", "password_hash": password_hash}
+                                      for i in range(1, users + 1)])
+    menu_items = [{"id": i, "name": f"Dish {i}", "price": round(rng.uniform(60, 600), 2)}
+                  for i in range(1, items + 1)]
+    db.session.execute(insert(MenuItem), menu_items)
+    db.session.add(RestaurantDetail(name='Bench Bistro', location='Localhost', contact='000'))
+
+    days = (today - start).days
+    for day in range(days):
+        date = start + timedelta(days=day)
+        orders = []
+        for _ in range(orders_per_day):
+            item = rng.choice(menu_items)
+            orders.append({"user_id": rng.randint(1, users), "item_id": item['id'], "item_name": item['name'],
+                           "quantity": rng.randint(1, 3), "unit_price": item['price'],
+                           "created_at": date + timedelta(hours=rng.choice((12, 13, 19, 20, 21)),
+                                                          minutes=rng.randint(0, 59))})
+        db.session.execute(insert(Order), orders)
+        db.session.execute(insert(Reservation), [
+            {"user_id": rng.randint(1, users), "party_size": rng.randint(1, 6),
+             "status": rng.choice(('confirmed', 'confirmed', 'confirmed', 'canceled', 'no_show')),
+             "datetime": date + timedelta(hours=rng.choice((12, 13, 19, 20)))}
+            for _ in range(reservations_per_day)])
+    db.session.commit()
+    rebuild_rollup()
+    return {"users": users, "items": items, "today": today,
+            "orders": days * orders_per_day, "reservations": days * reservations_per_day}
+
+
+def plan(client, requests, dataset):
+    """The request sequence of one client, fixed by its index."""
+    rng = random.Random(client)
+    names = list(ENDPOINTS)
+    weights = [ENDPOINTS[name][0] for name in names]
+    return [(name, *ENDPOINTS[name][1](rng, dataset)) for name in rng.choices(names, weights, k=requests)]
+
+
+class InProcessTarget:
+    name = 'inprocess'
+
+    def connect(self):
+        client = app.test_client()
+
+        def send(method, path, body):
+            return client.open(path, method=method, json=body).status_code
+        return send
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    name = 'gunicorn'
+
+    def __init__(self, workers, threads):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        env = dict(os.environ, DATABASE_URL=DATABASE_URL, APP_ENV='production')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning'],
+            env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            # The master listens before its workers have imported the app, so wait for an answer
+            try:
+                self.connect()('GET', '/restaurant_details', None)
+                return
+            except (OSError, http.client.HTTPException):
+                time.sleep(0.1)
+        raise RuntimeError("gunicorn did not start listening in time")
+
+    def connect(self):
+        # One keep-alive connection per client, as a browser or the Streamlit session would hold
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+
+        def send(method, path, body):
+            payload = json.dumps(body) if body is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        return send
+
+    def close(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=30)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(target, clients, requests, dataset):
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def client(index):
+        send = target.connect()
+        sequence = plan(index, requests, dataset)
+        # Untimed warm-up so the worker behind this connection has booted and connected
+        send('GET', '/menu', None)
+        barrier.wait()
+        for name, method, path, body in sequence:
+            start = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies[name].append(elapsed)
+                statuses[name][status] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        samples = latencies.get(name)
+        if not samples:
+            continue
+        codes = statuses[name]
+        endpoints[name] = {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "errors": sum(n for code, n in codes.items() if code == 'error' or code >= 500),
+            "statuses": {str(code): n for code, n in sorted(codes.items(), key=str)},
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"target": target.name, "clients": clients, "seconds": round(elapsed, 2),
+            "throughput_rps": round(total / elapsed, 1), "endpoints": endpoints}
+
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Regressions of ``result`` against ``baseline``, as readable strings."""
+    regressions = []
+    for name, base in baseline["endpoints"].items():
+        current = result["endpoints"].get(name)
+        if current is None:
+            continue
+        if (current["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+                and current["p95_ms"] - base["p95_ms"] > min_delta_ms):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['throughput_rps']} req/s vs baseline {base['throughput_rps']}")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {base['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=('inprocess', 'gunicorn', 'both'), default='inprocess')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help="requests per client")
+    parser.add_argument('--months', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument('--output', help="write the JSON report here as well as to stdout")
+    parser.add_argument('--baseline', help="compare with this stored report")
+    parser.add_argument('--save-baseline', help="store this run's report as a baseline")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="relative change that counts as a regression; p95 is noisy on small machines")
+    parser.add_argument('--min-delta-ms', type=float, default=5,
+                        help="ignore p95 changes smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    with app.app_context():
+        dataset = seed(months=args.months)
+    runs = []
+    for name in (('inprocess', 'gunicorn') if args.target == 'both' else (args.target,)):
+        target = InProcessTarget() if name == 'inprocess' else GunicornTarget(args.workers, args.threads)
+        try:
+            runs.append(run(target, args.clients, args.requests, dataset))
+        finally:
+            target.close()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "machine": {"python": platform.python_version(), "cpus": os.cpu_count(), "platform": platform.platform()},
+        "dataset": {k: v for k, v in dataset.items() if k != 'today'},
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {run["target"]: run for run in json.load(f)["runs"]}
+        regressions = [f"[{r['target']}] {line}" for r in runs if r["target"] in baseline
+                       for line in compare(r, baseline[r["target"]], args.tolerance, args.min_delta_ms)]
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Order status transitions from many terminals contending for the same orders.
+
+Seeds a batch of placed orders and starts gunicorn. ``--clients`` terminals
+then advance random unfinished orders one step at a time until every order
+is paid. Each request sends the version from a shared board, which holds the
+latest state any terminal has been told. A 409 therefore means another
+terminal changed the order while the request was in flight. The board is
+updated from the 409 body and the terminal goes on. The run happens twice:
+- ``hot``: a handful of orders, so most terminals collide;
+- ``spread``: many orders per terminal, which rarely collide.
+
+For each run it reports transitions/sec, the share of attempts that hit a
+conflict and latency percentiles. It also checks the final table. Every
+order must be paid at version 5, after exactly four accepted transitions.
+Anything else would be a lost or doubled update.
+
+    python -m benchmarks.order_status --clients 32 --hot-orders 8 --spread-orders 2000
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+
+from sqlalchemy import func, insert, select
+
+from benchmarks.load import GunicornTarget, app, percentile
+from models import db, MenuItem, Order
+from orders import ORDER_FLOW
+
+NEXT_STATUS = dict(zip(ORDER_FLOW, ORDER_FLOW[1:]))
+
+
+def seed_menu():
+    with app.app_context():
+        db.create_all()
+        db.session.add(MenuItem(id=1, name="Dish", price=100.0))
+        db.session.commit()
+
+
+def seed_orders(count):
+    with app.app_context():
+        ids = db.session.scalars(insert(Order).returning(Order.id), [
+            {"user_id": n, "item_id": 1, "item_name": "Dish", "quantity": 1, "unit_price": 100.0}
+            for n in range(count)]).all()
+        db.session.commit()
+        return ids
+
+
+def final_state(order_ids):
+    with app.app_context():
+        rows = db.session.execute(
+            select(Order.status, Order.version, func.count(Order.id))
+            .where(Order.id.in_(order_ids)).group_by(Order.status, Order.version)
+        ).all()
+        db.session.remove()
+    return {f"{status}@{version}": n for status, version, n in rows}
+
+
+def connect(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def send(path, body):
+        conn.request('POST', path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    return send
+
+
+def run(name, orders, args, target):
+    order_ids = seed_orders(orders)
+    unfinished = set(order_ids)
+    board = dict.fromkeys(order_ids, ('placed', 1))  # order id -> latest (status, version) any terminal saw
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients + 1)
+
+    def terminal(index):
+        rng = random.Random(index)
+        send = connect(target.port)
+        barrier.wait()
+        while True:
+            with lock:
+                if not unfinished:
+                    return
+                order_id = rng.choice(tuple(unfinished))
+                status, version = board[order_id]
+            start = time.perf_counter()
+            try:
+                code, body = send(f'/order/{order_id}/transition', {"status": NEXT_STATUS[status], "version": version})
+            except (OSError, http.client.HTTPException, ValueError):
+                code, body = 'error', None
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[code] = statuses.get(code, 0) + 1
+                if code in (200, 409) and body['version'] > board[order_id][1]:
+                    board[order_id] = (body['status'], body['version'])
+                    if body['status'] == 'paid':
+                        unfinished.discard(order_id)
+
+    threads = [threading.Thread(target=terminal, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    accepted = statuses.get(200, 0)
+    attempts = sum(statuses.values())
+    final = final_state(order_ids)
+    return {
+        "run": name,
+        "orders": orders,
+        "transitions_per_sec": round(accepted / elapsed, 1),
+        "conflict_rate": round(statuses.get(409, 0) / attempts, 3),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "statuses": {str(code): n for code, n in sorted(statuses.items(), key=str)},
+        "final": final,
+        "consistent": final == {f"paid@{len(ORDER_FLOW)}": orders} and accepted == orders * (len(ORDER_FLOW) - 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--hot-orders', type=int, default=8)
+    parser.add_argument('--spread-orders', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    args = parser.parse_args()
+
+    seed_menu()
+    target = GunicornTarget(args.workers, args.threads)
+    try:
+        results = [run('hot', args.hot_orders, args, target), run('spread', args.spread_orders, args, target)]
+    finally:
+        target.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Signup-burst load test for the password hashing pool.
+
+Serves the app from a threaded WSGI server, fires a burst of POST /users from
+many clients and meanwhile probes GET /menu, once with inline hashing and once
+with the bounded process pool. Prints the probe's latency percentiles and the
+signup outcomes for both modes.
+
+    python -m benchmarks.password_hashing --clients 16 --signups 4
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('APP_ENV', 'production')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import create_app  # noqa: E402
+from hashing import password_hasher  # noqa: E402
+from models import db  # noqa: E402
+
+app = create_app()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def request(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run(mode, base_url, clients, signups):
+    app.config['PASSWORD_HASH_WORKERS'] = 0 if mode == 'inline' else 2
+    password_hasher.shutdown()
+    password_hasher.init_app(app)
+
+    statuses = []
+    latencies = []
+    done = threading.Event()
+
+    def signup(client):
+        for n in range(signups):
+            statuses.append(request(f"{base_url}/users",
+                                    {"username": f"{mode}-{client}-{n}", "password": "correct horse"}))
+
+    def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            request(f"{base_url}/menu")
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.02)
+
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    burst = [threading.Thread(target=signup, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in burst:
+        t.start()
+    for t in burst:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    probe_thread.join()
+
+    return {
+        "mode": mode,
+        "signups_created": statuses.count(201),
+        "signups_rejected_429": statuses.count(429),
+        "burst_seconds": round(elapsed, 2),
+        "menu_p50_ms": round(percentile(latencies, 50), 1),
+        "menu_p99_ms": round(percentile(latencies, 99), 1),
+        "menu_samples": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--signups', type=int, default=4)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    with app.app_context():
+        db.create_all()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        results = [run(mode, base_url, args.clients, args.signups) for mode in ('inline', 'pool')]
+    finally:
+        server.shutdown()
+        password_hasher.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Menu search latency: the FTS5 index versus a ``LIKE '%q%'`` scan.
+
+Seeds a scratch database with ``--items`` generated dishes, each with a
+name, description and tags. A mix of queries then runs ``--repeat`` times
+each, through ``search_menu`` and through a plain scan that needs every word
+inside the name, description or tags. The mix covers whole words, prefixes,
+misspellings and words that match nothing. For each query it reports
+median milliseconds and hits for:
+- ``search_menu``, which ranks every match;
+- the scan stopped at ``--limit`` hits, unranked;
+- the full scan, which is what ranking the matches would need.
+
+    python -m benchmarks.search --items 20000 --repeat 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from sqlalchemy import insert
+
+from benchmarks.load import app
+from models import db, MenuItem
+from search import _like_search, query_words, search_menu
+
+STYLES = ["Chicken", "Paneer", "Mutton", "Prawn", "Veg", "Egg", "Fish", "Mushroom", "Aloo", "Dal"]
+DISHES = ["Biryani", "Tikka", "Masala", "Korma", "Curry", "Kebab", "Pulao", "Makhani", "Vindaloo", "Dosa"]
+REGIONS = ["Hyderabadi", "Lucknowi", "Kerala", "Punjabi", "Goan", "Chettinad", "Bengali", "Kashmiri"]
+WORDS = ["slow", "cooked", "with", "fresh", "spices", "served", "rice", "naan", "gravy", "tomato",
+         "cream", "coconut", "onion", "garlic", "ginger", "smoky", "tandoor", "charred", "herbs", "yoghurt"]
+TAGS = ["spicy", "mild", "vegetarian", "vegan", "gluten-free", "chef-special", "new", "kids"]
+
+QUERIES = ["biryani", "chick", "paneer tikka", "hyderabadi mutton biryani", "coconut",
+           "spicy prawn", "biriyani", "panner tika", "xylophone"]
+
+
+def seed(items, seed=7):
+    rng = random.Random(seed)
+    rows = [{
+        "name": f"{rng.choice(REGIONS)} {rng.choice(STYLES)} {rng.choice(DISHES)} No. {i}",
+        "price": round(rng.uniform(80, 600), 2),
+        "description": " ".join(rng.choices(WORDS, k=12)),
+        "tags": ",".join(rng.sample(TAGS, 2)),
+    } for i in range(items)]
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(MenuItem), rows)
+        db.session.commit()
+
+
+def median_ms(search, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = search()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2), len(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.items)
+    results = []
+    with app.app_context():
+        for q in QUERIES:
+            fts_ms, fts_hits = median_ms(lambda: search_menu(q, args.limit), args.repeat)
+            first_ms, _ = median_ms(lambda: _like_search(query_words(q), args.limit), args.repeat)
+            like_ms, like_hits = median_ms(lambda: _like_search(query_words(q), None), args.repeat)
+            results.append({"query": q, "fts_ms": fts_ms, "fts_hits": fts_hits,
+                            "like_first_ms": first_ms, "like_all_ms": like_ms, "like_hits": like_hits})
+    print(json.dumps({"items": args.items, "limit": args.limit, "queries": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
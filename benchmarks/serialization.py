@@ -0,0 +1,124 @@
+"""Rows/sec of the list endpoints: ORM hydration versus column rows.
+
+Seeds a scratch database, then pages through ``/reservations``,
+``/order/view`` and ``/menu`` with the test client. The "orm" run serves the
+same payloads the old way, building dicts from full ORM instances and
+encoding them with the stdlib JSON provider. The "column" run uses the real
+handlers: column-only selects, the precompiled serializers and orjson.
+
+    python -m benchmarks.serialization --rows 50000 --repeat 3
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ.setdefault('APP_ENV', 'production')
+
+from flask import current_app, jsonify, request  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from cache import menu_cache  # noqa: E402
+from models import db, MenuItem, Order, Reservation  # noqa: E402
+from pagination import keyset_page  # noqa: E402
+from serializers import OrjsonProvider  # noqa: E402
+
+app = create_app()
+
+
+@app.route('/bench/orm/reservations')
+def orm_reservations():
+    reservations, next_cursor = keyset_page(Reservation.query, Reservation.id, request.args)
+    return jsonify({"items": [{
+        "id": r.id, "user_id": r.user_id, "datetime": str(r.datetime), "status": r.status,
+        "party_size": r.party_size
+    } for r in reservations], "next_cursor": next_cursor})
+
+
+@app.route('/bench/orm/order/view')
+def orm_orders():
+    orders, next_cursor = keyset_page(Order.query, Order.id, request.args)
+    return jsonify({"items": [{
+        "id": o.id, "user_id": o.user_id, "item_id": o.item_id, "item_name": o.item_name,
+        "quantity": o.quantity, "unit_price": o.unit_price, "created_at": str(o.created_at)
+    } for o in orders], "next_cursor": next_cursor})
+
+
+@app.route('/bench/orm/menu')
+def orm_menu():
+    return current_app.json.dumps([{"id": m.id, "name": m.name, "price": m.price}
+                                   for m in MenuItem.query.all()])
+
+
+def seed(rows):
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    db.create_all()
+    db.session.execute(insert(MenuItem), [{"name": f"Item {i}", "price": 10.0 + i} for i in range(rows // 10)])
+    db.session.execute(insert(Reservation), [
+        {"user_id": rng.randint(1, 1000), "datetime": start + timedelta(minutes=15 * i),
+         "status": "confirmed", "party_size": rng.randint(1, 8)} for i in range(rows)])
+    db.session.execute(insert(Order), [
+        {"user_id": rng.randint(1, 1000), "item_id": rng.randint(1, 100), "item_name": "Item",
+         "quantity": rng.randint(1, 4), "unit_price": 12.5, "created_at": start + timedelta(seconds=i)}
+        for i in range(rows)])
+    db.session.commit()
+
+
+def page_through(client, path):
+    count = 0
+    cursor = None
+    while True:
+        url = f"{path}?limit=1000" + (f"&after={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        count += len(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return count
+
+
+def menu(client, path):
+    menu_cache.invalidate()
+    return len(json.loads(client.get(path).data))
+
+
+def rows_per_sec(fn, client, path, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn(client, path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(count / best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.rows)
+    client = app.test_client()
+    cases = [('/reservations', page_through), ('/order/view', page_through), ('/menu', menu)]
+    results = []
+    for path, fn in cases:
+        app.json = DefaultJSONProvider(app)
+        before = rows_per_sec(fn, client, f"/bench/orm{path}", args.repeat)
+        app.json = OrjsonProvider(app)
+        after = rows_per_sec(fn, client, path, args.repeat)
+        results.append({"endpoint": path, "orm_rows_per_sec": before, "column_rows_per_sec": after,
+                        "speedup": round(after / before, 2)})
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
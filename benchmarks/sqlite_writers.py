@@ -0,0 +1,91 @@
+"""Concurrent-writer benchmark for the SQLite engine profile.
+
+Runs several processes that each commit single-order transactions against a
+scratch database, first with SQLite defaults and then with the tuned profile
+from config.py, and prints commits/sec and lock errors for both.
+
+    python -m benchmarks.sqlite_writers --writers 8 --commits 300
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+
+from config import Config, engine_options
+from database import apply_sqlite_pragmas
+from models import db, Order
+
+
+def make_engine(path, tuned):
+    url = f"sqlite:///{path}"
+    if tuned:
+        engine = create_engine(url, **engine_options(url))
+        apply_sqlite_pragmas(engine, Config.SQLITE_PRAGMAS)
+    else:
+        engine = create_engine(url)
+    return engine
+
+
+def writer(path, tuned, commits, barrier, results):
+    engine = make_engine(path, tuned)
+    errors = 0
+    barrier.wait()
+    start = time.perf_counter()
+    for i in range(commits):
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(Order), {"user_id": os.getpid(), "item_id": i % 20 + 1,
+                                             "item_name": "Bench", "quantity": 1})
+        except OperationalError:
+            errors += 1
+    results.put((time.perf_counter() - start, errors))
+    engine.dispose()
+
+
+def run(tuned, writers, commits):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        engine = make_engine(path, tuned)
+        db.metadata.create_all(engine)
+        engine.dispose()
+
+        barrier = multiprocessing.Barrier(writers)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=writer, args=(path, tuned, commits, barrier, results))
+                 for _ in range(writers)]
+        for p in procs:
+            p.start()
+        outcomes = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    elapsed = max(t for t, _ in outcomes)
+    errors = sum(e for _, e in outcomes)
+    committed = writers * commits - errors
+    return {
+        "profile": "tuned" if tuned else "default",
+        "writers": writers,
+        "commits": committed,
+        "lock_errors": errors,
+        "seconds": round(elapsed, 3),
+        "commits_per_sec": round(committed / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--commits', type=int, default=300)
+    args = parser.parse_args()
+
+    results = [run(False, args.writers, args.commits), run(True, args.writers, args.commits)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
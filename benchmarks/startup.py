@@ -0,0 +1,61 @@
+"""Import and boot-time budget for the API.
+
+Measures, in fresh interpreters, how long ``import app`` and ``create_app()``
+take and exits non-zero when the median of either exceeds its budget, so CI
+catches changes that make worker boots slower.
+
+    python -m benchmarks.startup --runs 7 --import-budget-ms 800 --boot-budget-ms 150
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+booted = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "boot_ms": (booted - imported) * 1000}))
+"""
+
+
+def measure(runs):
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # create_app() opens nothing, but keep the probe away from the bundled database regardless
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', PROBE], check=True,
+                                    capture_output=True, text=True, env=env).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "boot_ms": round(statistics.median(s["boot_ms"] for s in samples), 1),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--import-budget-ms', type=float, default=800)
+    parser.add_argument('--boot-budget-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    result["import_budget_ms"] = args.import_budget_ms
+    result["boot_budget_ms"] = args.boot_budget_ms
+    result["within_budget"] = (result["import_ms"] <= args.import_budget_ms
+                               and result["boot_ms"] <= args.boot_budget_ms)
+    print(json.dumps(result, indent=2))
+    return 0 if result["within_budget"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Order writes with one shared database against one database per outlet.
+
+Seeds ``--tenants`` outlets and starts gunicorn. ``--clients`` clients each
+place ``--requests`` orders, spread evenly over the outlets, in two runs:
+- ``shared``: every outlet writes to the default database, so each commit
+  waits for the single SQLite write lock;
+- ``sharded``: each outlet writes to its own file through ``/t/<outlet>``.
+
+For each run it reports orders/sec, latency percentiles and the statuses
+seen. It then times the cross-tenant sales report over ``--days`` of
+history, once fanned out over the shards in parallel and once querying them
+one after the other.
+
+    python -m benchmarks.tenants --tenants 8 --clients 32 --requests 100
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def _tenants_arg(argv):
+    # config.py reads TENANTS at import, before argparse runs
+    for i, arg in enumerate(argv):
+        if arg == '--tenants' and i + 1 < len(argv):
+            return int(argv[i + 1])
+        if arg.startswith('--tenants='):
+            return int(arg.split('=', 1)[1])
+    return 8
+
+
+os.environ.setdefault('TENANTS', ','.join(f"outlet{n}" for n in range(_tenants_arg(sys.argv))))
+os.environ.setdefault('TENANT_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), '{tenant}.db')}")
+
+from sqlalchemy import insert  # noqa: E402
+
+from benchmarks.load import DATABASE_URL, GunicornTarget, app, percentile  # noqa: E402
+from models import db, MenuItem, Order  # noqa: E402
+from sales import rebuild_rollup, sales_report  # noqa: E402
+from tenancy import shards, use  # noqa: E402
+
+MENU = [{"id": i, "name": f"Dish {i}", "price": 100.0 + i} for i in range(1, 31)]
+
+
+def seed(days, orders_per_day):
+    rng = random.Random(7)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(MenuItem), MENU)
+        db.session.commit()
+        for tenant in shards.tenants:
+            db.metadata.create_all(shards.engine(tenant))
+            with use(tenant):
+                db.session.execute(insert(MenuItem), MENU)
+                for day in range(days, 0, -1):
+                    start = today - timedelta(days=day)
+                    orders = []
+                    for _ in range(orders_per_day):
+                        item = rng.choice(MENU)
+                        orders.append({"user_id": rng.randint(1, 500), "item_id": item['id'],
+                                       "item_name": item['name'], "quantity": rng.randint(1, 3),
+                                       "unit_price": item['price'], "status": "paid",
+                                       "created_at": start + timedelta(minutes=rng.randint(660, 1380))})
+                    db.session.execute(insert(Order), orders)
+                db.session.commit()
+                rebuild_rollup()
+                db.session.remove()
+    return today
+
+
+def run(name, args, target):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients + 1)
+
+    def client(index):
+        rng = random.Random(index)
+        send = target.connect()
+        prefix = '' if name == 'shared' else f"/t/{shards.tenants[index % len(shards.tenants)]}"
+        barrier.wait()
+        for _ in range(args.requests):
+            body = {"user_id": rng.randint(1, 500), "item_id": rng.choice(MENU)['id'], "quantity": 1}
+            start = time.perf_counter()
+            try:
+                code = send('POST', f'{prefix}/order', body)
+            except OSError:
+                code = 'error'
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[code] = statuses.get(code, 0) + 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "run": name,
+        "orders_per_sec": round(statuses.get(201, 0) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "statuses": {str(code): n for code, n in sorted(statuses.items(), key=str)},
+    }
+
+
+def time_report(today, days, repeat):
+    start, end = today - timedelta(days=days), today + timedelta(days=1)
+
+    def one_by_one():
+        results = {}
+        for tenant in shards.tenants:
+            with use(tenant):
+                results[tenant] = sales_report(start, end, 'hour')
+                db.session.remove()
+        return results
+
+    def median_ms(action):
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            action()
+            timings.append((time.perf_counter() - began) * 1000)
+        return round(statistics.median(timings), 2)
+
+    with app.app_context():
+        parallel, _ = shards.fan_out(lambda: sales_report(start, end, 'hour'))
+        assert parallel == one_by_one()
+        return {"fan_out_ms": median_ms(lambda: shards.fan_out(lambda: sales_report(start, end, 'hour'))),
+                "sequential_ms": median_ms(one_by_one)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=100, help="orders per client")
+    parser.add_argument('--days', type=int, default=90, help="history per outlet for the report")
+    parser.add_argument('--orders-per-day', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    args = parser.parse_args()
+
+    today = seed(args.days, args.orders_per_day)
+    target = GunicornTarget(args.workers, args.threads)
+    try:
+        writes = [run('shared', args, target), run('sharded', args, target)]
+    finally:
+        target.close()
+    print(json.dumps({"database": DATABASE_URL, "tenants": len(shards.tenants), "writes": writes,
+                      "report": time_report(today, args.days, args.repeat)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
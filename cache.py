@@ -0,0 +1,205 @@
+import hashlib
+import itertools
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import MenuItem
+from tenancy import PerTenant
+
+
+class LocalBackend:
+    """In-process stand-in for the shared backend.
+
+    Implements the small subset of the redis client API the cache relies on, so
+    the shared code path can run without a redis server.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and time.monotonic() >= expires:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data.get(key, (0, None))[0]) + 1
+            self._data[key] = (value, None)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class MenuCache:
+    """Serialized ``GET /menu`` body and its ETag, rebuilt only after a MenuItem write.
+
+    Without a shared backend each worker keeps its own copy, refreshed at least
+    every ``MENU_CACHE_TTL`` seconds so workers that did not see a write catch
+    up. With ``MENU_CACHE_URL`` set, all workers share one copy and an
+    invalidation in any of them is seen by all.
+
+    Every invalidation bumps a generation counter (kept in the backend when
+    there is one). A rebuild only stores its body if the generation it
+    started from is still current, so a loader that read the rows before a
+    write committed cannot put the old menu back.
+    """
+
+    key = 'restaurant:menu'
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self._entry = None
+        self._expires = 0
+        self._generations = itertools.count(1)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('MENU_CACHE_TTL', self.ttl)
+        url = app.config.get('MENU_CACHE_URL')
+        if url:
+            import redis
+            self.backend = redis.Redis.from_url(url)
+        app.extensions['menu_cache'] = self
+
+    def get(self, loader):
+        """Return ``(etag, body)``, calling ``loader()`` for the body on a miss."""
+        if self.backend is not None:
+            shared = self._shared()
+            if shared is not None:
+                return shared
+            generation = self._current_generation()
+            return self._share(self._build(loader()), generation)
+
+        entry = self._entry
+        if entry is not None and time.monotonic() < self._expires:
+            return entry
+        with self._lock:
+            # Another thread may have rebuilt it while we waited
+            if self._entry is not None and time.monotonic() < self._expires:
+                return self._entry
+            generation = self._generation
+            entry = self._build(loader())
+            self._keep(entry, generation)
+            return entry
+
+    async def get_async(self, loader):
+        """``get`` for a coroutine ``loader``.
+
+        The lock is not held across the await, so concurrent misses may each
+        rebuild the body; they all store the same value.
+        """
+        if self.backend is not None:
+            shared = self._shared()
+            if shared is not None:
+                return shared
+            generation = self._current_generation()
+            return self._share(self._build(await loader()), generation)
+
+        entry = self._entry
+        if entry is not None and time.monotonic() < self._expires:
+            return entry
+        generation = self._generation
+        entry = self._build(await loader())
+        with self._lock:
+            self._keep(entry, generation)
+        return entry
+
+    @property
+    def generation_key(self):
+        return f"{self.key}:generation"
+
+    def invalidate(self):
+        # Bump first: a rebuild that checks the generation after this point will not store
+        self._generation = next(self._generations)
+        self._entry = None
+        if self.backend is not None:
+            self.backend.incr(self.generation_key)
+            self.backend.delete(self.key)
+
+    def _current_generation(self):
+        return int(self.backend.get(self.generation_key) or 0)
+
+    def _shared(self):
+        stored = self.backend.get(self.key)
+        if stored is not None:
+            etag, _, body = stored.partition(b"\n")
+            return etag.decode(), body
+        return None
+
+    def _share(self, entry, generation):
+        if self._current_generation() == generation:
+            # The expiry bounds how long a copy stored in a race can outlive its invalidation
+            self.backend.set(self.key, entry[0].encode() + b"\n" + entry[1], ex=self.ttl)
+            # An invalidation between the check and the set would otherwise be lost
+            if self._current_generation() != generation:
+                self.backend.delete(self.key)
+        return entry
+
+    def _keep(self, entry, generation):
+        self._entry = entry
+        self._expires = time.monotonic() + self.ttl
+        # Drop it again if invalidate() ran since the load started
+        if self._generation != generation:
+            self._entry = None
+
+    @staticmethod
+    def _build(body):
+        if isinstance(body, str):
+            body = body.encode()
+        return hashlib.sha1(body).hexdigest(), body
+
+
+def _menu_cache(tenant):
+    cache = MenuCache()
+    if tenant is not None:
+        cache.key = f"restaurant:{tenant}:menu"
+    return cache
+
+
+menu_cache = PerTenant(_menu_cache)
+
+
+def mark_menu_changed(session):
+    """Invalidate the menu when ``session`` commits.
+
+    For Core INSERT/UPDATE statements, which bypass the flush hook below.
+    """
+    session.info['menu_changed'] = True
+
+
+# Invalidate once the transaction that wrote a MenuItem commits, so a concurrent
+# reader can never cache rows that are about to be rolled back.
+@event.listens_for(Session, 'after_flush')
+def _track_menu_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, MenuItem):
+            session.info['menu_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_menu(session):
+    if session.info.pop('menu_changed', False):
+        menu_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_menu_writes(session, previous_transaction):
+    session.info.pop('menu_changed', None)
@@ -0,0 +1,135 @@
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def database_url():
+    # DATABASE_URL points the app at a server database; SQLite in the instance folder otherwise
+    url = os.environ.get('DATABASE_URL', 'sqlite:///restaurant.db')
+    if url.startswith('postgres://'):  # Render and Heroku still hand out the old scheme
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    if url.startswith('sqlite'):
+        return {
+            # Seconds pysqlite waits on a locked database; kept in step with busy_timeout below
+            'connect_args': {'timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000},
+            'pool_size': env_int('DB_POOL_SIZE', 5),
+            'max_overflow': env_int('DB_MAX_OVERFLOW', 5),
+            'pool_timeout': 10,
+        }
+    return {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': 10,
+        'pool_recycle': 1800,  # Drop connections before managed databases close them
+        'pool_pre_ping': True,
+    }
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable modification tracking for performance
+
+    # Applied to every new SQLite connection, ignored for other databases
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # Readers no longer block the writer and vice versa
+        'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints instead of every commit
+        'busy_timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'cache_size': -env_int('SQLITE_CACHE_SIZE_KB', 65536),  # Negative values are KiB
+        'mmap_size': env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'temp_store': 'MEMORY',
+    }
+
+    BCRYPT_LOG_ROUNDS = env_int('BCRYPT_LOG_ROUNDS', 12)  # Each extra round doubles the cost of a hash
+    PASSWORD_HASH_WORKERS = env_int('PASSWORD_HASH_WORKERS', 2)  # 0 hashes inline on the request thread
+    PASSWORD_HASH_QUEUE_LIMIT = env_int('PASSWORD_HASH_QUEUE_LIMIT', 8)  # Waiting hashes before answering 429
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Reservation slots; the defaults give one slot per day holding 100 covers
+    RESERVATION_SLOT_MINUTES = env_int('RESERVATION_SLOT_MINUTES', 1440)
+    RESERVATION_OPENING = os.environ.get('RESERVATION_OPENING', '00:00')
+    RESERVATION_CLOSING = os.environ.get('RESERVATION_CLOSING', '24:00')
+    RESERVATION_SLOT_CAPACITY = env_int('RESERVATION_SLOT_CAPACITY', 100)  # Covers per slot
+    RESERVATION_INDEX_REFRESH = 60  # Seconds before a worker rebuilds its availability index
+
+    KITCHEN_LOG_SIZE = 1000  # Recent orders each worker keeps for kitchen screens
+    KITCHEN_POLL_INTERVAL = 0.5  # Seconds between checks for orders placed by other workers
+    KITCHEN_LONGPOLL_TIMEOUT = 25  # Longest a long-poll request is held open
+    KITCHEN_HEARTBEAT = 15  # Seconds between SSE keep-alive comments
+    KITCHEN_MAX_STREAMS = env_int('KITCHEN_MAX_STREAMS', 2)  # SSE streams and waiting long-polls per worker; each holds a gunicorn thread
+    KITCHEN_MAX_ASYNC_STREAMS = env_int('KITCHEN_MAX_ASYNC_STREAMS', 200)  # Same in ASGI mode, where a screen is an event-loop task
+    KITCHEN_STREAM_DURATION = 300  # Seconds before a stream ends and the screen reconnects with Last-Event-ID
+
+    MENU_CACHE_TTL = 60  # Seconds a worker may serve its cached menu without a shared backend
+    MENU_CACHE_URL = os.environ.get('MENU_CACHE_URL')  # e.g. redis://localhost:6379/0 to share it between workers
+
+    ORDER_INGEST_MODE = os.environ.get('ORDER_INGEST_MODE', 'direct')  # 'journal' acknowledges orders before they are written
+    ORDER_JOURNAL_DIR = os.environ.get('ORDER_JOURNAL_DIR')  # Defaults to <instance>/order-journal
+    ORDER_JOURNAL_FSYNC = os.environ.get('ORDER_JOURNAL_FSYNC', '0') == '1'  # fsync every append, not just flush
+    ORDER_JOURNAL_BATCH = 500  # Most journaled orders written per commit
+
+    PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY')  # Import path of a payments.PaymentGateway subclass
+    PAYMENT_SETTLE_WORKERS = env_int('PAYMENT_SETTLE_WORKERS', 4)  # Gateway calls in flight per worker; 0 settles inline
+    PAYMENT_FAKE_LATENCY = float(os.environ.get('PAYMENT_FAKE_LATENCY', 0))  # Seconds each FakeGateway charge takes
+    PAYMENT_FAKE_DECLINE_OVER = None  # FakeGateway declines larger amounts
+
+    ARCHIVE_DATABASE = os.environ.get('ARCHIVE_DATABASE')  # SQLite file for archived rows; defaults to <database>-archive.db
+    ARCHIVE_ORDERS_AFTER_DAYS = env_int('ARCHIVE_ORDERS_AFTER_DAYS', 90)  # Age at which paid orders leave the hot table
+    ARCHIVE_RESERVATIONS_AFTER_DAYS = env_int('ARCHIVE_RESERVATIONS_AFTER_DAYS', 30)  # Same for past reservations
+    ARCHIVE_BATCH = 5000  # Rows moved per commit
+
+    # Outlets with a database each, picked by a /t/<tenant> URL prefix or the X-Tenant header
+    TENANTS = [t for t in os.environ.get('TENANTS', '').split(',') if t]
+    TENANT_DATABASE_URL = os.environ.get('TENANT_DATABASE_URL', 'sqlite:///tenants/{tenant}.db')  # Relative paths are under the instance folder
+    TENANT_ENGINE_LIMIT = env_int('TENANT_ENGINE_LIMIT', 16)  # Open tenant engines per worker; the least recently used is closed
+    TENANT_HEADER = 'X-Tenant'
+    TENANT_FANOUT_WORKERS = env_int('TENANT_FANOUT_WORKERS', 8)  # Tenants queried at once by cross-tenant reports
+
+    IDEMPOTENCY_TTL = env_int('IDEMPOTENCY_TTL', 86400)  # Seconds a stored response is replayed to retries
+    IDEMPOTENCY_CLAIM_TIMEOUT = 120  # Seconds before a key whose request never answered is taken over; above any request's run time
+    IDEMPOTENCY_PURGE_INTERVAL = 300  # Seconds between sweeps of expired keys in each worker
+
+    ASGI_WSGI_THREADS = env_int('ASGI_WSGI_THREADS', 10)  # Threads running Flask views in ASGI mode
+
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson')  # 'stdlib' to use Flask's default encoder
+
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'  # Request/SQL metrics served at /metrics
+    METRICS_SQL_SAMPLE_RATE = float(os.environ.get('METRICS_SQL_SAMPLE_RATE', 0.05))  # Share of requests with per-statement timing
+    METRICS_N_PLUS_ONE_THRESHOLD = 10  # Repeats of one statement in a request that flag an N+1
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY', 'payments.FakeGateway')
+    BCRYPT_LOG_ROUNDS = env_int('BCRYPT_LOG_ROUNDS', 10)
+
+
+class ProductionConfig(Config):
+    # /metrics is unauthenticated and names SQL statements; serve it only where it is kept private
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    BCRYPT_LOG_ROUNDS = 4  # The bcrypt minimum, keeps account tests fast
+    PAYMENT_GATEWAY = 'payments.FakeGateway'
+    PAYMENT_SETTLE_WORKERS = 0
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    return config_by_name[name or os.environ.get('APP_ENV', 'development')]
@@ -1,5 +1,5 @@
 import streamlit as st
-import requests
+import api_client
 from datetime import datetime
 
 # Backend API URL
@@ -51,11 +51,10 @@ if menu == "Reservations":
                     "user_id": int(user_id),
                     "datetime": reservation_datetime_obj  # Pass the string
                 }
-                response = requests.post(f"{BASE_URL}/reservations", json=reservation_data)
-                if response.status_code == 201:
-                    # Parse the JSON response to get the reservation ID
-                    response_json = response.json()
-                    reservation_id = response_json.get("reservation_id")  # Get the reservation ID from the response
+                status, body = api_client.post(BASE_URL, "/reservations", json=reservation_data)
+                if status == 201:
+                    # Get the reservation ID from the parsed JSON response
+                    reservation_id = body.get("reservation_id")
                     
                     # Display the success message and reservation ID
                     st.success(f"Reservation created successfully! Reservation ID: {reservation_id}")
@@ -88,9 +87,9 @@ if menu == "Reservations":
                     }
                     
                     # Send the PUT request to modify the reservation
-                    response = requests.put(f"{BASE_URL}/reservations/{reservation_id}", json=data)
+                    status, body = api_client.put(BASE_URL, f"/reservations/{reservation_id}", json=data)
                     
-                    if response.status_code == 200:
+                    if status == 200:
                         st.success("Reservation modified successfully!")
                     else:
                         st.error("Failed to modify reservation")
@@ -106,8 +105,8 @@ if menu == "Reservations":
         cancel_reservation_submit = st.button("Cancel Reservation")
         
         if cancel_reservation_submit:
-            response = requests.delete(f"{BASE_URL}/reservations/{cancel_reservation_id}")
-            if response.status_code == 200:
+            status, body = api_client.delete(BASE_URL, f"/reservations/{cancel_reservation_id}")
+            if status == 200:
                 st.success("Reservation canceled successfully!")
             else:
                 st.error("Failed to cancel reservation")
@@ -117,9 +116,9 @@ elif menu == "Order":
     # View Menu (Only in Order Section)
     st.header("Menu")
     if st.button("View Menu"):
-        response = requests.get(f"{BASE_URL}/menu")
-        if response.status_code == 200:
-            menu = response.json()
+        status, body = api_client.fetch_menu(BASE_URL)
+        if status == 200:
+            menu = body
             if menu:
                 for item in menu:
                     st.write(f"{item['id']}. **{item['name']}** - {item['price']}")
@@ -127,6 +126,19 @@ elif menu == "Order":
                 st.error("Menu is empty.")
         else:
             st.error("Failed to fetch menu")
+
+    # Search the menu by dish name, description or tag
+    query = st.text_input("Search the menu", placeholder="e.g. biryani, spicy, paneer")
+    if query.strip():
+        status, body = api_client.search_menu(BASE_URL, query.strip())
+        if status == 200:
+            if body['items']:
+                for item in body['items']:
+                    st.write(f"{item['id']}. **{item['name']}** - {item['price']}")
+            else:
+                st.info("No dishes match your search.")
+        else:
+            st.error("Failed to search the menu")
     
     # Order Section
     st.header("Place Order")
@@ -144,17 +156,20 @@ elif menu == "Order":
                 "item_name": str(item_name),
                 "quantity": int(quantity)
             }
-            response = requests.post(f"{BASE_URL}/order", json=order_data)
-            if response.status_code == 201:
+            status, body = api_client.post(BASE_URL, "/order", json=order_data)
+            if status == 201:
                 st.success("Order placed successfully!")
+            elif status == 202:
+                # Journal mode: accepted now, written to the database moments later
+                st.success("Order accepted!")
             else:
                 st.error("Failed to place order")
 
     st.header("View Order")
     if st.button("View Order"):
-        response = requests.get(f"{BASE_URL}/order/view")
-        if response.status_code == 200:
-            order = response.json()
+        status, body = api_client.fetch_orders(BASE_URL)
+        if status == 200:
+            order = body["items"]
             if order:
                 for item in order:
                     st.write(f"{item['user_id']}: {item['item_id']}. **{item['item_name']}** - {item['quantity']}")
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+from pagination import PaginationError, filter_after
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Rows fetched from the cursor per round trip while streaming
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _plain(value):
+    # Match the str() rendering the JSON endpoints use for datetimes
+    return str(value) if isinstance(value, datetime) else value
+
+
+def _ndjson_chunks(fields, rows):
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(dict(zip(fields, map(_plain, row)))))
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield "\n".join(buffer) + "\n"
+            buffer = []
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+def _csv_chunks(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    count = 0
+    for row in rows:
+        writer.writerow(map(_plain, row))
+        count += 1
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def requested_format(args):
+    fmt = args.get('format', 'json')
+    if fmt != 'json' and fmt not in EXPORT_FORMATS:
+        raise PaginationError("format must be one of json, ndjson, csv")
+    return fmt
+
+
+def stream_export(query, columns, args, filename):
+    """Stream ``query`` as NDJSON or CSV without materialising the result set.
+
+    ``columns`` must start with the primary key. Only ``columns`` are selected,
+    so rows come back as plain tuples instead of ORM instances, and
+    ``yield_per`` keeps one chunk in memory at a time.
+    """
+    fmt = requested_format(args)
+    fields = [column.key for column in columns]
+    # Exports honour 'after' so an interrupted download can resume from the last id seen
+    query = filter_after(query, columns[0], args).order_by(columns[0])
+    rows = query.with_entities(*columns).yield_per(EXPORT_CHUNK_SIZE)
+    chunks = _csv_chunks(fields, rows) if fmt == 'csv' else _ndjson_chunks(fields, rows)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+    )
@@ -1,5 +1,5 @@
 import streamlit as st
-import requests
+import api_client
 
 # Backend API URL
 BASE_URL = "http://127.0.0.1:5000"
@@ -25,8 +25,8 @@ with st.expander("Create Reservation"):
                         "user_id": int(user_id),
                         "datetime": reservation_datetime
                     }
-                    response = requests.post(f"{BASE_URL}/reservations", json=reservation_data)
-                    if response.status_code == 201:
+                    status, body = api_client.post(BASE_URL, "/reservations", json=reservation_data)
+                    if status == 201:
                         st.success("Reservation created successfully!")
                     else:
                         st.error("Failed to create reservation")
@@ -37,7 +37,7 @@ with st.expander("Create Reservation"):
 with st.expander("Modify Reservation"):
     reservation_id = st.text_input("Reservation ID to Modify")
     new_datetime = st.text_input("New Date & Time (YYYY-MM-DD HH:MM:SS)")
-    new_status = st.selectbox("New Status", ["confirmed", "canceled", "pending"])
+    new_status = st.selectbox("New Status", ["confirmed", "canceled", "pending", "no_show"])
     modify_reservation_submit = st.button("Modify Reservation")
     
     if modify_reservation_submit:
@@ -45,8 +45,8 @@ with st.expander("Modify Reservation"):
             st.error("Please fill out both fields.")
         else:
             data = {"datetime": new_datetime, "status": new_status}
-            response = requests.put(f"{BASE_URL}/reservations/{reservation_id}", json=data)
-            if response.status_code == 200:
+            status, body = api_client.put(BASE_URL, f"/reservations/{reservation_id}", json=data)
+            if status == 200:
                 st.success("Reservation modified successfully!")
             else:
                 st.error("Failed to modify reservation")
@@ -60,8 +60,8 @@ with st.expander("Cancel Reservation"):
         if not cancel_reservation_id:
             st.error("Please provide a Reservation ID.")
         else:
-            response = requests.delete(f"{BASE_URL}/reservations/{cancel_reservation_id}")
-            if response.status_code == 200:
+            status, body = api_client.delete(BASE_URL, f"/reservations/{cancel_reservation_id}")
+            if status == 200:
                 st.success("Reservation canceled successfully!")
             else:
                 st.error("Failed to cancel reservation")
@@ -69,9 +69,9 @@ with st.expander("Cancel Reservation"):
 # Menu Section
 st.header("Menu")
 if st.button("View Menu"):
-    response = requests.get(f"{BASE_URL}/menu")
-    if response.status_code == 200:
-        menu = response.json()
+    status, body = api_client.fetch_menu(BASE_URL)
+    if status == 200:
+        menu = body
         if menu:
             st.write(menu)
         else:
@@ -97,9 +97,12 @@ with st.form("order_form"):
                     "item_id": int(item_id),
                     "quantity": int(quantity)
                 }
-                response = requests.post(f"{BASE_URL}/order", json=order_data)
-                if response.status_code == 201:
+                status, body = api_client.post(BASE_URL, "/order", json=order_data)
+                if status == 201:
                     st.success("Order placed successfully!")
+                elif status == 202:
+                    # Journal mode: accepted now, written to the database moments later
+                    st.success("Order accepted!")
                 else:
                     st.error("Failed to place order")
             except ValueError:
@@ -108,13 +111,14 @@ with st.form("order_form"):
 # Staff Section - Manage Restaurant Details
 st.header("Staff Panel - Manage Restaurant Details")
 with st.expander("View Restaurant Details"):
-    response = requests.get(f"{BASE_URL}/restaurant_details")
-    if response.status_code == 200:
-        details = response.json()
+    status, body = api_client.fetch_restaurant_details(BASE_URL)
+    if status == 200:
+        details = body
         st.write(f"Restaurant Name: {details['name']}")
         st.write(f"Location: {details['location']}")
         st.write(f"Contact: {details['contact']}")
     else:
+        details = {"name": "", "location": "", "contact": ""}
         st.error("Failed to fetch restaurant details")
 
 with st.expander("Edit Restaurant Details"):
@@ -131,8 +135,8 @@ with st.expander("Edit Restaurant Details"):
                 "location": location,
                 "contact": contact
             }
-            response = requests.put(f"{BASE_URL}/restaurant_details", json=data)
-            if response.status_code == 200:
+            status, body = api_client.put(BASE_URL, "/restaurant_details", json=data)
+            if status == 200:
                 st.success("Restaurant details updated successfully!")
             else:
                 st.error("Failed to update restaurant details")
@@ -154,8 +158,8 @@ with st.expander("Create User"):
                 "username": username,
                 "password": password
             }
-            response = requests.post(f"{BASE_URL}/users", json=data)
-            if response.status_code == 201:
+            status, body = api_client.post(BASE_URL, "/users", json=data)
+            if status == 201:
                 st.success("User created successfully!")
             else:
                 st.error("Failed to create user")
@@ -174,8 +178,8 @@ with st.expander("Update User"):
                 "username": new_username,
                 "password": new_password
             }
-            response = requests.put(f"{BASE_URL}/users/{user_id_to_update}", json=data)
-            if response.status_code == 200:
+            status, body = api_client.put(BASE_URL, f"/users/{user_id_to_update}", json=data)
+            if status == 200:
                 st.success("User updated successfully!")
             else:
                 st.error("Failed to update user")
@@ -189,8 +193,8 @@ with st.expander("Delete User"):
         if not user_id_to_delete:
             st.error("Please provide a User ID.")
         else:
-            response = requests.delete(f"{BASE_URL}/users/{user_id_to_delete}")
-            if response.status_code == 200:
+            status, body = api_client.delete(BASE_URL, f"/users/{user_id_to_delete}")
+            if status == 200:
                 st.success("User deleted successfully!")
             else:
                 st.error("Failed to delete user")
@@ -0,0 +1,81 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+class PasswordHasher:
+    """Hash passwords with bcrypt in a bounded pool of worker processes.
+
+    At most ``PASSWORD_HASH_WORKERS`` hashes run at once and at most
+    ``PASSWORD_HASH_QUEUE_LIMIT`` more may wait; beyond that ``hash`` raises
+    ``HasherBusy`` straight away so the caller can answer 429 instead of
+    letting a signup burst eat every core. ``PASSWORD_HASH_WORKERS = 0`` hashes
+    inline on the request thread.
+
+    A slot is held until the hash finishes, not until the caller stops
+    waiting, so hashes that time out still count against the limit. The pool
+    starts its processes from a forkserver: forking a gunicorn worker that
+    already runs the journal, settlement and fan-out threads could copy a
+    held lock into the child.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 2
+        self.queue_limit = 8
+        self.timeout = 10
+        self._slots = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.queue_limit = app.config['PASSWORD_HASH_QUEUE_LIMIT']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit) if self.workers else None
+        app.extensions['password_hasher'] = self
+
+    def _pool(self):
+        # Created on first use so each gunicorn worker gets its own pool after the fork
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context('forkserver'))
+        return self._executor
+
+    def hash(self, password):
+        if self._slots is None:
+            return _hash_password(password, self.rounds)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool().submit(_hash_password, password, self.rounds)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,153 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+
+from flask import Response, jsonify, make_response, request
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+from tenancy import PerTenant
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """Replays the stored response when a client retries a POST with the same key.
+
+    The key row is inserted before the view runs, in the transaction the view
+    commits, so the key and whatever the view wrote land together or not at
+    all. A concurrent retry collides on the primary key instead of writing a
+    second order. After the view returns, its response is saved on the row,
+    and later retries are answered from the table with no insert or commit.
+
+    If the view raises or answers 500 or above, its transaction is rolled
+    back. When that takes the key row with it, nothing was committed and the
+    client can retry. When the row is still there the view had already
+    committed, so the key is kept and retries get a 409 instead of repeating
+    the write. A row left without a response by a worker that died is taken
+    over once it is ``IDEMPOTENCY_CLAIM_TIMEOUT`` seconds old.
+
+    Rows expire after ``IDEMPOTENCY_TTL`` seconds. Each worker deletes
+    expired rows at most every ``IDEMPOTENCY_PURGE_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self.ttl = 86400
+        self.claim_timeout = 120
+        self.purge_interval = 300
+        self._purged_at = 0
+
+    def init_app(self, app):
+        self.ttl = app.config['IDEMPOTENCY_TTL']
+        self.claim_timeout = app.config['IDEMPOTENCY_CLAIM_TIMEOUT']
+        self.purge_interval = app.config['IDEMPOTENCY_PURGE_INTERVAL']
+        app.extensions['idempotency'] = self
+
+    def _cutoff(self):
+        return datetime.now() - timedelta(seconds=self.ttl)
+
+    def _expired(self, row):
+        if row.status_code is None:
+            # Still unanswered this long after the claim; the worker running it died
+            return row.created_at < datetime.now() - timedelta(seconds=self.claim_timeout)
+        return row.created_at < self._cutoff()
+
+    def _claim(self, key, fingerprint):
+        """Insert the key row; return the existing live row instead if there is one."""
+        for _ in range(2):
+            try:
+                db.session.execute(insert(IdempotencyKey).values(
+                    key=key, fingerprint=fingerprint, created_at=datetime.now()))
+                return None
+            except IntegrityError:
+                db.session.rollback()
+            existing = db.session.get(IdempotencyKey, key)
+            if existing is None or not self._expired(existing):
+                return existing
+            # Expired but not purged yet, or abandoned; take the key over
+            db.session.delete(existing)
+            db.session.flush()
+        return db.session.get(IdempotencyKey, key)
+
+    def _purge(self, claimed):
+        if time.monotonic() - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = time.monotonic()
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < self._cutoff(),
+                                                        IdempotencyKey.key != claimed))
+
+    def replay(self, existing, fingerprint):
+        if existing.fingerprint != fingerprint:
+            return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+        if existing.status_code is None:
+            return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409, \
+                {"Retry-After": "1"}
+        return Response(existing.body, status=existing.status_code, mimetype='application/json',
+                        headers={"Idempotent-Replayed": "true"})
+
+    def handle(self, view, args, kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        fingerprint = _fingerprint()
+        existing = self._claim(key, fingerprint)
+        if existing is not None:
+            return self.replay(existing, fingerprint)
+        self._purge(key)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            self._fail(key)
+            raise
+        if response.status_code >= 500:
+            self._fail(key)
+            return response
+        # The view may have rolled back (e.g. a full slot), dropping the claimed row; merge re-adds it
+        db.session.merge(IdempotencyKey(key=key, fingerprint=fingerprint, status_code=response.status_code,
+                                        body=response.get_data(as_text=True), created_at=datetime.now()))
+        db.session.commit()
+        return response
+
+    def _fail(self, key):
+        db.session.rollback()
+        # The claimed row only outlives the rollback if the view committed it along with its writes
+        body = json.dumps({"error": "An earlier request with this Idempotency-Key failed after saving "
+                                    "its changes; check them before sending it again with a new key"})
+        db.session.execute(update(IdempotencyKey).where(IdempotencyKey.key == key,
+                                                        IdempotencyKey.status_code.is_(None))
+                           .values(status_code=409, body=body))
+        db.session.commit()
+
+
+idempotency = PerTenant(lambda tenant: IdempotencyStore())
+
+
+def idempotent(view=None, *, skip=None):
+    """Honour an ``Idempotency-Key`` header on a POST view.
+
+    While ``skip()`` is true the view runs without the key table and must
+    deduplicate the key itself, as journaled orders do through their ticket.
+    """
+    if view is None:
+        return functools.partial(idempotent, skip=skip)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if skip is not None and skip():
+            return view(*args, **kwargs)
+        return idempotency.handle(view, args, kwargs)
+    return wrapper
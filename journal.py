@@ -0,0 +1,237 @@
+import atexit
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from kitchen import kitchen_feed
+from models import db, Order
+from sales import record_sales
+
+logger = logging.getLogger(__name__)
+
+TICKET_LENGTH = 32
+
+
+def ticket_for(key):
+    """Ticket of an order sent with ``Idempotency-Key: key``; every retry gets the same one."""
+    return hashlib.sha256(key.encode()).hexdigest()[:TICKET_LENGTH]
+
+
+def insert_statement(dialect):
+    """Order ``INSERT`` that skips tickets already written and returns the ones it wrote."""
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    return insert(Order).on_conflict_do_nothing(index_elements=['ticket']).returning(Order.ticket)
+
+
+def read_segment(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash was never acknowledged
+            entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+            entries.append(entry)
+    return entries
+
+
+def _segment_number(path):
+    return int(path.rsplit('.', 2)[-2])
+
+
+class OrderJournal:
+    """Write-behind order ingestion (``ORDER_INGEST_MODE = 'journal'``).
+
+    An accepted order is appended to a journal file and acknowledged with a
+    ticket without waiting for the database. One writer thread per worker
+    takes everything that queued up while its previous commit ran and writes
+    it with one executemany INSERT, one sales rollup upsert and one commit, so
+    the SQLite write lock is taken once per batch instead of once per order.
+
+    Each worker appends to its own numbered segment files and holds an flock
+    on its lock file while it lives. The writer starts a new segment before
+    each batch and deletes the old one after the commit. Segments left behind
+    by a worker that died are replayed by the next writer that starts; tickets
+    are unique in the order table, so a segment that was already written
+    inserts nothing the second time.
+
+    A retried request sends the same Idempotency-Key and gets the same
+    ticket, so the retry is dropped by the same unique ticket. No
+    idempotency row is committed per order.
+
+    Appends are flushed to the OS, which survives a worker crash the way
+    SQLite's ``synchronous=NORMAL`` does. ``ORDER_JOURNAL_FSYNC`` also survives
+    power loss, at the cost of an fsync per order.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.fsync = False
+        self.batch_size = 500
+        self.app = None
+        self._pid = None
+        self._token = None
+        self._lock_file = None
+        self._file = None
+        self._segment = 0
+        self._pending = []
+        self._unsaved = 0
+        self._writer = None
+        self._stopping = False
+        self._cond = threading.Condition()
+        atexit.register(self.close)
+
+    def init_app(self, app):
+        self.enabled = app.config['ORDER_INGEST_MODE'] == 'journal'
+        self.directory = app.config['ORDER_JOURNAL_DIR'] or os.path.join(app.instance_path, 'order-journal')
+        self.fsync = app.config['ORDER_JOURNAL_FSYNC']
+        self.batch_size = app.config['ORDER_JOURNAL_BATCH']
+        self.app = app
+        app.extensions['order_journal'] = self
+
+    def _path(self, suffix, token=None):
+        return os.path.join(self.directory, f"{token or self._token}.{suffix}")
+
+    def _start(self):
+        # Started on first use so each gunicorn worker gets its own files and writer after the fork
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._token = uuid.uuid4().hex
+        # Locked under a name recover() ignores, then renamed into place, so no
+        # other worker ever sees this lock file unlocked and takes it for a dead one's
+        self._lock_file = open(self._path('locking'), 'w')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._segment = 0
+        self._file = open(self._path('0.log'), 'a')
+        os.rename(self._lock_file.name, self._path('lock'))
+        self._pending = []
+        self._unsaved = 0
+        self._stopping = False
+        self._pid = os.getpid()
+        self._writer = threading.Thread(target=self._run, name='order-journal', daemon=True)
+        self._writer.start()
+
+    def submit(self, order, ticket=None):
+        """Journal ``order`` (Order column values) and return its ticket, a new one unless given."""
+        entry = dict(order, ticket=ticket or uuid.uuid4().hex, created_at=datetime.now())
+        line = json.dumps(entry, default=str) + "\n"
+        with self._cond:
+            self._start()
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending.append(entry)
+            self._unsaved += 1
+            self._cond.notify_all()
+        return entry['ticket']
+
+    def drain(self, timeout=None):
+        """Wait until everything journaled in this worker is committed; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._unsaved, timeout)
+
+    def close(self, timeout=5):
+        """Write what is queued, then stop the writer; the next ``submit`` starts a new one.
+
+        Anything still unwritten after ``timeout`` stays in the journal for the
+        next writer to replay.
+        """
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            saved = self._cond.wait_for(lambda: not self._unsaved, timeout)
+            self._stopping = True
+            self._cond.notify_all()
+        self._writer.join(timeout)
+        self._file.close()
+        if saved:
+            os.remove(self._file.name)
+            os.remove(self._path('lock'))
+        self._lock_file.close()
+        self._pid = None
+
+    def _run(self):
+        self.recover()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                entries, self._pending = self._pending, []
+                # Orders arriving from now on go to a fresh segment
+                self._file.close()
+                finished = self._path(f'{self._segment}.log')
+                self._segment += 1
+                self._file = open(self._path(f'{self._segment}.log'), 'a')
+            self._write_until_saved(entries)
+            os.remove(finished)
+            with self._cond:
+                self._unsaved -= len(entries)
+                self._cond.notify_all()
+
+    def _write_until_saved(self, entries):
+        delay = 0.1
+        while True:
+            try:
+                return self.write(entries)
+            except Exception:
+                logger.exception("Writing %d journaled orders failed, retrying", len(entries))
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+
+    def write(self, entries):
+        """Insert journaled orders, ``batch_size`` per commit; returns how many were new."""
+        # A retry journaled before the first copy was written shares its ticket; keep the first
+        unique = {}
+        for entry in entries:
+            unique.setdefault(entry['ticket'], entry)
+        entries = list(unique.values())
+        written = 0
+        with self.app.app_context():
+            try:
+                statement = insert_statement(db.session.get_bind().dialect.name)
+                for start in range(0, len(entries), self.batch_size):
+                    batch = entries[start:start + self.batch_size]
+                    tickets = set(db.session.scalars(statement, batch).all())
+                    record_sales([entry for entry in batch if entry['ticket'] in tickets])
+                    db.session.commit()
+                    written += len(tickets)
+            finally:
+                db.session.remove()
+            kitchen_feed.notify()
+        return written
+
+    def recover(self):
+        """Replay the segments of workers that stopped before writing them."""
+        for lock_path in glob.glob(os.path.join(self.directory, '*.lock')):
+            token = os.path.basename(lock_path)[:-len('.lock')]
+            if token == self._token:
+                continue
+            try:
+                with open(lock_path, 'a') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    for path in sorted(glob.glob(self._path('*.log', token)), key=_segment_number):
+                        entries = read_segment(path)
+                        if entries:
+                            logger.warning("Replaying %d journaled orders from %s", len(entries), path)
+                            self._write_until_saved(entries)
+                        os.remove(path)
+                    os.remove(lock_path)
+            except (BlockingIOError, FileNotFoundError):
+                continue  # Its worker is alive, or another worker replayed it first
+
+
+order_journal = OrderJournal()
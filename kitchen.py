@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import select
+
+from models import db, Order
+from tenancy import PerTenant
+
+logger = logging.getLogger(__name__)
+
+ORDER_COLUMNS = (Order.id, Order.user_id, Order.item_id, Order.item_name, Order.quantity)
+
+
+def _event(row):
+    return {"seq": row.id, "order": {
+        "id": row.id, "user_id": row.user_id, "item_id": row.item_id,
+        "item_name": row.item_name, "quantity": row.quantity
+    }}
+
+
+class FeedUnavailable(Exception):
+    pass
+
+
+class OrderEventLog:
+    """Bounded, append-only log of placed orders for kitchen screens.
+
+    The sequence number of an event is the order id, so a screen resumes with
+    ``since=<last seq>`` and never needs the full table. The log is filled by
+    primary-key range reads (``id > last seen``); SQLite hands out ids in
+    commit order, so appending in id order never skips an order. PostgreSQL
+    hands out sequence values before commit, so a screen could move past an
+    order still being committed; the feed refuses other databases with
+    ``FeedUnavailable``. Writers in
+    this process call ``notify()`` after commit and waiting screens wake up at
+    once; orders committed by other worker processes are picked up by a
+    range read at most every ``KITCHEN_POLL_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self.size = 1000
+        self.poll_interval = 0.5
+        self._events = None
+        self._last_seq = 0
+        self._synced_at = 0
+        self._version = 0
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.size = app.config['KITCHEN_LOG_SIZE']
+        self.poll_interval = app.config['KITCHEN_POLL_INTERVAL']
+        self.reset()
+        app.extensions['kitchen_feed'] = self
+
+    def reset(self):
+        with self._cond:
+            self._events = None
+            self._last_seq = 0
+            self._synced_at = 0
+
+    def check(self):
+        if db.session.get_bind().dialect.name != 'sqlite':
+            raise FeedUnavailable("The kitchen feed needs a SQLite database")
+
+    def _load_recent(self):
+        self.check()
+        with db.session.get_bind().connect() as conn:
+            rows = conn.execute(select(*ORDER_COLUMNS).order_by(Order.id.desc()).limit(self.size)).all()
+        self._events = deque((_event(r) for r in reversed(rows)), maxlen=self.size)
+        self._last_seq = rows[0].id if rows else 0
+
+    def sync(self):
+        """Append orders committed since the last read and wake any waiters."""
+        with self._sync_lock:
+            if self._events is None:
+                self._load_recent()
+                added = bool(self._events)
+            else:
+                with db.session.get_bind().connect() as conn:
+                    rows = conn.execute(select(*ORDER_COLUMNS).where(Order.id > self._last_seq)
+                                        .order_by(Order.id).limit(self.size)).all()
+                added = bool(rows)
+                for row in rows:
+                    self._events.append(_event(row))
+                    self._last_seq = row.id
+            self._synced_at = time.monotonic()
+        if added:
+            with self._cond:
+                self._version += 1
+                self._cond.notify_all()
+
+    def notify(self):
+        # Called after a commit that placed orders in this process; free until a screen connects.
+        # The orders are already committed, so a failed read must not fail the request: the
+        # screens pick them up at the next poll instead.
+        if self._events is None:
+            return
+        try:
+            self.sync()
+        except Exception:
+            logger.exception("Reading new orders for kitchen screens failed")
+
+    def since(self, seq):
+        if self._events is None:
+            self.sync()
+        with self._sync_lock:
+            events = list(self._events)
+        if seq > 0 and events and seq < events[0]["seq"] - 1:
+            # The screen fell behind the in-memory window; read the gap by primary key
+            with db.session.get_bind().connect() as conn:
+                rows = conn.execute(select(*ORDER_COLUMNS).where(Order.id > seq)
+                                    .order_by(Order.id).limit(self.size)).all()
+            return [_event(r) for r in rows]
+        return [e for e in events if e["seq"] > seq]
+
+    def poll(self, seq):
+        """Non-blocking ``wait``: events after ``seq``, reading the table if the log may be stale."""
+        if self._events is not None and time.monotonic() - self._synced_at >= self.poll_interval:
+            self.sync()
+        return self.since(seq)
+
+    def wait(self, seq, timeout):
+        """Return events after ``seq``, blocking up to ``timeout`` seconds for new ones."""
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self._version
+            events = self.since(seq)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            with self._cond:
+                if self._version == version:
+                    self._cond.wait(min(remaining, self.poll_interval))
+            if time.monotonic() - self._synced_at >= self.poll_interval:
+                self.sync()
+
+
+kitchen_feed = PerTenant(lambda tenant: OrderEventLog())
+
+
+class StreamSlots:
+    """Caps the SSE streams and waiting long-polls a worker serves at once.
+
+    Each one holds a server thread, so past ``KITCHEN_MAX_STREAMS`` screens
+    would starve every other endpoint. Extra screens get a 503 and retry, or
+    fall back to non-blocking polls (``timeout=0``).
+    """
+
+    def __init__(self):
+        self.limit = 2
+        self._slots = threading.BoundedSemaphore(self.limit)
+
+    def init_app(self, app):
+        self.limit = app.config['KITCHEN_MAX_STREAMS']
+        self._slots = threading.BoundedSemaphore(self.limit)
+        app.extensions['kitchen_streams'] = self
+
+    def acquire(self):
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+kitchen_streams = StreamSlots()
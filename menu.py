@@ -0,0 +1,169 @@
+import csv
+import io
+import math
+
+from sqlalchemy import Numeric, case, cast, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cache import mark_menu_changed
+from models import db, MenuItem
+
+MAX_IMPORT_ROWS = 10000
+NAME_LENGTH = MenuItem.__table__.c.name.type.length
+TAGS_LENGTH = MenuItem.__table__.c.tags.type.length
+
+
+class MenuImportError(ValueError):
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+
+def _check_item(raw):
+    if not isinstance(raw, dict):
+        return None, "Item must be an object"
+    name = raw.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None, "name is required"
+    if len(name.strip()) > NAME_LENGTH:
+        return None, f"name must be at most {NAME_LENGTH} characters"
+    try:
+        price = _number(raw.get('price'))
+    except (TypeError, ValueError):
+        return None, "price must be a number"
+    if price < 0:
+        return None, "price cannot be negative"
+    text = {}
+    for field in ('description', 'tags'):
+        value = raw.get(field)
+        if value not in (None, '') and not isinstance(value, str):
+            return None, f"{field} must be a string"
+        text[field] = (value or '').strip() or None
+    if text['tags'] and len(text['tags']) > TAGS_LENGTH:
+        return None, f"tags must be at most {TAGS_LENGTH} characters"
+    item_id = raw.get('id')
+    if item_id in (None, ''):
+        item_id = None
+    else:
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None, "id must be an integer"
+    return dict(text, id=item_id, name=name.strip(), price=price), None
+
+
+def parse_menu_csv(text):
+    """Rows of a CSV with a ``name,price`` header and optional ``id``, ``description``
+    and ``tags`` columns, i.e. the format ``GET /menu?format=csv`` exports."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {'name', 'price'} <= set(reader.fieldnames):
+        raise MenuImportError("CSV must have a header row with name and price columns")
+    return list(reader)
+
+
+def upsert_statement(dialect):
+    """``INSERT ... ON CONFLICT (id)`` that overwrites the name and price, and the
+    description and tags where the import gives them."""
+    insert_ = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    statement = insert_(MenuItem)
+    return statement.on_conflict_do_update(
+        index_elements=['id'],
+        set_={
+            'name': statement.excluded.name,
+            'price': statement.excluded.price,
+            'description': func.coalesce(statement.excluded.description, MenuItem.description),
+            'tags': func.coalesce(statement.excluded.tags, MenuItem.tags),
+        },
+    )
+
+
+def import_menu(items):
+    """Create or update menu items in one transaction.
+
+    Items carrying an ``id`` update that item; the rest are matched on name,
+    so re-importing a sheet without ids does not duplicate it. Existing items
+    are looked up with one query, then written with one executemany upsert
+    and one executemany insert. Nothing is written if any item is invalid.
+    Returns ``(created, updated)`` counts.
+    """
+    if not isinstance(items, list) or not items:
+        raise MenuImportError("Request body must contain a non-empty list of items")
+    if len(items) > MAX_IMPORT_ROWS:
+        raise MenuImportError(f"An import may contain at most {MAX_IMPORT_ROWS} items")
+
+    rows = []
+    errors = []
+    for index, raw in enumerate(items):
+        row, error = _check_item(raw)
+        if error:
+            errors.append({"index": index, "error": error})
+        rows.append(row)
+    if errors:
+        raise MenuImportError(f"{len(errors)} invalid item(s)", errors)
+
+    ids = {row['id'] for row in rows if row['id'] is not None}
+    names = {row['name'] for row in rows if row['id'] is None}
+    existing_ids = set()
+    id_by_name = {}
+    for item_id, name in db.session.execute(
+            select(MenuItem.id, MenuItem.name)
+            .where(or_(MenuItem.id.in_(ids), MenuItem.name.in_(names)))
+            .order_by(MenuItem.id.desc())):
+        existing_ids.add(item_id)
+        id_by_name[name] = item_id  # Lowest id wins if a name is already duplicated
+
+    # Keyed on the target item, so later rows win over earlier ones for the same item
+    updates = {}
+    inserts = {}
+    for index, row in enumerate(rows):
+        item_id = row['id'] if row['id'] is not None else id_by_name.get(row['name'])
+        if row['id'] is not None and item_id not in existing_ids:
+            errors.append({"index": index, "error": "Menu item not found"})
+        elif item_id is not None:
+            updates[item_id] = dict(row, id=item_id)
+        else:
+            inserts[row['name']] = {key: value for key, value in row.items() if key != 'id'}
+    if errors:
+        raise MenuImportError(f"{len(errors)} invalid item(s)", errors)
+
+    if updates:
+        db.session.execute(upsert_statement(db.session.get_bind().dialect.name), list(updates.values()))
+    if inserts:
+        db.session.execute(insert(MenuItem), list(inserts.values()))
+    mark_menu_changed(db.session)
+    db.session.commit()
+    return len(inserts), len(updates)
+
+
+def reprice(percent=None, amount=None, item_ids=None):
+    """Change prices by ``percent`` or by a fixed ``amount`` in one UPDATE.
+
+    Applies to ``item_ids`` or to the whole menu. New prices are rounded to
+    cents and never drop below zero. Returns the number of items changed.
+    """
+    if (percent is None) == (amount is None):
+        raise ValueError("Give exactly one of percent or amount")
+    if percent is not None:
+        if percent <= -100:
+            raise ValueError("percent must be greater than -100")
+        new_price = MenuItem.price * (1 + percent / 100)
+    else:
+        new_price = MenuItem.price + amount
+    new_price = func.round(cast(new_price, Numeric), 2)
+
+    statement = update(MenuItem).values(price=case((new_price < 0, 0), else_=new_price))
+    if item_ids is not None:
+        statement = statement.where(MenuItem.id.in_(item_ids))
+    result = db.session.execute(statement.execution_options(synchronize_session=False))
+    mark_menu_changed(db.session)
+    db.session.commit()
+    return result.rowcount
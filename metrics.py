@@ -0,0 +1,222 @@
+"""Per-endpoint request latency and SQL counters, rendered for Prometheus.
+
+Every request records its latency in a histogram keyed by Flask endpoint
+and method, and its status in a counter. SQLAlchemy cursor events count the
+statements a request runs and the time spent in them. This runs on every
+request and costs one dict update per statement.
+
+A sampled fraction of requests (``METRICS_SQL_SAMPLE_RATE``) also records
+per-statement time. When one statement runs ``METRICS_N_PLUS_ONE_THRESHOLD``
+or more times in a single request, the request is flagged as a likely N+1.
+Single-row lookups issued in a loop look exactly like that.
+
+The registry lives in process memory, so with several gunicorn workers each
+scrape of ``/metrics`` reports the worker that answered it.
+"""
+import bisect
+import random
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in seconds, as in the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Distinct statements tracked by the sampled capture; the rest are folded into one label
+MAX_STATEMENTS = 200
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class _RequestState:
+    __slots__ = ('start', 'statements', 'sql_seconds', 'counts', 'sampled', 'timings')
+
+    def __init__(self, sampled):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.counts = defaultdict(int)
+        self.sampled = sampled
+        self.timings = defaultdict(float) if sampled else None
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _statement_key(statement):
+    return " ".join(statement.split())[:120]
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.sample_rate = 0.05
+        self.n_plus_one_threshold = 10
+        self.logger = None
+        self._lock = threading.Lock()
+        self._listening = False
+        self.reset()
+
+    def init_app(self, app):
+        self.sample_rate = app.config['METRICS_SQL_SAMPLE_RATE']
+        self.n_plus_one_threshold = app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+        self.logger = app.logger
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._clear)
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor)
+            event.listen(Engine, 'handle_error', self._failed_cursor)
+            self._listening = True
+        app.extensions['metrics'] = self
+
+    def reset(self):
+        with self._lock:
+            self._latency = defaultdict(Histogram)
+            self._responses = defaultdict(int)
+            self._sql = defaultdict(lambda: [0, 0.0])
+            self._statements = defaultdict(lambda: [0, 0.0])
+            self._n_plus_one = defaultdict(int)
+            self._sampled = 0
+
+    # Request hooks
+
+    def _start(self):
+        _current.set(_RequestState(random.random() < self.sample_rate))
+
+    def _finish(self, response):
+        state = _current.get()
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state.start
+        endpoint = request.endpoint or 'unmatched'
+        repeated = [s for s, n in state.counts.items() if n >= self.n_plus_one_threshold]
+        with self._lock:
+            self._latency[(endpoint, request.method)].observe(elapsed)
+            self._responses[(endpoint, request.method, response.status_code)] += 1
+            sql = self._sql[endpoint]
+            sql[0] += state.statements
+            sql[1] += state.sql_seconds
+            if state.sampled:
+                self._sampled += 1
+                for statement, seconds in state.timings.items():
+                    calls = state.counts[statement]
+                    statement = _statement_key(statement)
+                    if statement not in self._statements and len(self._statements) >= MAX_STATEMENTS:
+                        statement = 'other'
+                    totals = self._statements[statement]
+                    totals[0] += calls
+                    totals[1] += seconds
+            for statement in repeated:
+                key = (endpoint, _statement_key(statement))
+                first = key not in self._n_plus_one
+                self._n_plus_one[key] += 1
+                if first and self.logger is not None:
+                    self.logger.warning("Possible N+1 in %s: %r ran %d times in one request",
+                                        endpoint, key[1], state.counts[statement])
+        return response
+
+    def _clear(self, exc=None):
+        _current.set(None)
+
+    # SQLAlchemy cursor events
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        state = _current.get()
+        if state is None or not conn.info.get('metrics_start'):
+            return
+        elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+        state.statements += 1
+        state.sql_seconds += elapsed
+        # Compiled statements are cached, so the raw SQL string is a cheap, stable key
+        state.counts[statement] += 1
+        if state.sampled:
+            state.timings[statement] += elapsed
+
+    def _failed_cursor(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its start time so
+        # pooled connections do not collect stale entries
+        if _current.get() is not None and context.statement is not None and context.connection is not None \
+                and context.connection.info.get('metrics_start'):
+            context.connection.info['metrics_start'].pop()
+
+    # Exposition
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP http_request_duration_seconds Request latency by endpoint.",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for (endpoint, method), histogram in sorted(self._latency.items()):
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"http_request_duration_seconds_bucket"
+                                 f"{_labels(endpoint=endpoint, method=method, le=le)} {count}")
+                labels = _labels(endpoint=endpoint, method=method)
+                lines.append(f"http_request_duration_seconds_sum{labels} {histogram.sum}")
+                lines.append(f"http_request_duration_seconds_count{labels} {sum(histogram.counts)}")
+
+            lines += ["# HELP http_responses_total Responses by endpoint and status code.",
+                      "# TYPE http_responses_total counter"]
+            for (endpoint, method, status), count in sorted(self._responses.items()):
+                lines.append(f"http_responses_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+            lines += ["# HELP sql_statements_total SQL statements executed by endpoint.",
+                      "# TYPE sql_statements_total counter"]
+            lines += [f"sql_statements_total{_labels(endpoint=e)} {n}" for e, (n, _) in sorted(self._sql.items())]
+            lines += ["# HELP sql_seconds_total Time spent executing SQL by endpoint.",
+                      "# TYPE sql_seconds_total counter"]
+            lines += [f"sql_seconds_total{_labels(endpoint=e)} {s}" for e, (_, s) in sorted(self._sql.items())]
+
+            lines += ["# HELP sql_sampled_requests_total Requests whose statements were timed individually.",
+                      "# TYPE sql_sampled_requests_total counter",
+                      f"sql_sampled_requests_total {self._sampled}",
+                      "# HELP sql_statement_calls_total Executions per statement in sampled requests.",
+                      "# TYPE sql_statement_calls_total counter"]
+            lines += [f"sql_statement_calls_total{_labels(statement=s)} {n}"
+                      for s, (n, _) in sorted(self._statements.items())]
+            lines += ["# HELP sql_statement_seconds_total Time per statement in sampled requests.",
+                      "# TYPE sql_statement_seconds_total counter"]
+            lines += [f"sql_statement_seconds_total{_labels(statement=s)} {t}"
+                      for s, (_, t) in sorted(self._statements.items())]
+
+            lines += ["# HELP sql_n_plus_one_total Requests that repeated one statement past the N+1 threshold.",
+                      "# TYPE sql_n_plus_one_total counter"]
+            lines += [f"sql_n_plus_one_total{_labels(endpoint=e, statement=s)} {n}"
+                      for (e, s), n in sorted(self._n_plus_one.items())]
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
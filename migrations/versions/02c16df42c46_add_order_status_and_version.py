@@ -0,0 +1,43 @@
+"""Add status and version columns to orders.
+
+Revision ID: 02c16df42c46
+Revises: 7cc45760e731
+Create Date: 2026-10-18 19:22:26.504819
+
+Databases built by ``flask db upgrade`` still carry the unused order.status
+column from the initial migration; it is reused rather than added twice.
+Existing orders with a settled payment start out paid, the rest placed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '02c16df42c46'
+down_revision = '7cc45760e731'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('order')}
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        if 'status' not in columns:
+            batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    op.execute("""UPDATE "order" SET status = 'paid' WHERE EXISTS (
+                      SELECT 1 FROM payment WHERE payment.order_id = "order".id AND payment.status = 'settled')""")
+    op.execute("""UPDATE "order" SET status = 'placed'
+                  WHERE status IS NULL OR status NOT IN ('placed', 'cooking', 'ready', 'served', 'paid')""")
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=20), server_default='placed', nullable=False)
+        batch_op.create_index('ix_order_status', ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_status')
+        batch_op.drop_column('version')
+        batch_op.drop_column('status')
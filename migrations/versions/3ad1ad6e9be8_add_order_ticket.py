@@ -0,0 +1,28 @@
+"""Add the journal ticket column to orders.
+
+Revision ID: 3ad1ad6e9be8
+Revises: e52c8a1f3b96
+Create Date: 2026-10-18 19:11:02.061304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3ad1ad6e9be8'
+down_revision = 'e52c8a1f3b96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ticket', sa.String(length=32), nullable=True))
+        batch_op.create_index('ix_order_ticket', ['ticket'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_ticket')
+        batch_op.drop_column('ticket')
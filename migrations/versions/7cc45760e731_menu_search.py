@@ -0,0 +1,66 @@
+"""Add menu descriptions and tags with FTS5 search indexes.
+
+Revision ID: 7cc45760e731
+Revises: 95516ca1bad8
+Create Date: 2026-10-18 19:22:40.516902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7cc45760e731'
+down_revision = '95516ca1bad8'
+branch_labels = None
+depends_on = None
+
+# Kept in step with search.FTS_DDL, which creates the same objects for create_all()
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS menu_item_fts USING fts5("
+    "name, description, tags, content='menu_item', content_rowid='id', "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS menu_item_trigram USING fts5("
+    "name, tags, content='menu_item', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_search_insert AFTER INSERT ON menu_item BEGIN
+        INSERT INTO menu_item_fts(rowid, name, description, tags) VALUES (new.id, new.name, new.description, new.tags);
+        INSERT INTO menu_item_trigram(rowid, name, tags) VALUES (new.id, new.name, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_search_delete AFTER DELETE ON menu_item BEGIN
+        INSERT INTO menu_item_fts(menu_item_fts, rowid, name, description, tags)
+            VALUES ('delete', old.id, old.name, old.description, old.tags);
+        INSERT INTO menu_item_trigram(menu_item_trigram, rowid, name, tags) VALUES ('delete', old.id, old.name, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_search_update AFTER UPDATE OF name, description, tags ON menu_item BEGIN
+        INSERT INTO menu_item_fts(menu_item_fts, rowid, name, description, tags)
+            VALUES ('delete', old.id, old.name, old.description, old.tags);
+        INSERT INTO menu_item_trigram(menu_item_trigram, rowid, name, tags) VALUES ('delete', old.id, old.name, old.tags);
+        INSERT INTO menu_item_fts(rowid, name, description, tags) VALUES (new.id, new.name, new.description, new.tags);
+        INSERT INTO menu_item_trigram(rowid, name, tags) VALUES (new.id, new.name, new.tags);
+    END""",
+)
+
+
+def upgrade():
+    with op.batch_alter_table('menu_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('description', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('tags', sa.String(length=255), nullable=True))
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in FTS_DDL:
+            op.execute(statement)
+        # Index the items that already exist
+        op.execute("INSERT INTO menu_item_fts(menu_item_fts) VALUES ('rebuild')")
+        op.execute("INSERT INTO menu_item_trigram(menu_item_trigram) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('menu_item_search_insert', 'menu_item_search_delete', 'menu_item_search_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS menu_item_fts")
+        op.execute("DROP TABLE IF EXISTS menu_item_trigram")
+
+    with op.batch_alter_table('menu_item', schema=None) as batch_op:
+        batch_op.drop_column('tags')
+        batch_op.drop_column('description')
@@ -0,0 +1,36 @@
+"""Add checkout, gateway and timestamp columns to payments.
+
+Revision ID: 95516ca1bad8
+Revises: 3ad1ad6e9be8
+Create Date: 2026-10-18 19:14:22.449661
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '95516ca1bad8'
+down_revision = '3ad1ad6e9be8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('checkout_id', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('gateway_ref', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+        batch_op.add_column(sa.Column('settled_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_payment_checkout_id', ['checkout_id'], unique=False)
+        batch_op.create_index('ix_payment_order_id_active', ['order_id'], unique=True, sqlite_where=sa.text("status != 'failed'"), postgresql_where=sa.text("status != 'failed'"))
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_order_id_active', sqlite_where=sa.text("status != 'failed'"), postgresql_where=sa.text("status != 'failed'"))
+        batch_op.drop_index('ix_payment_checkout_id')
+        batch_op.drop_column('settled_at')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('gateway_ref')
+        batch_op.drop_column('checkout_id')
@@ -0,0 +1,40 @@
+"""Add secondary indexes for hot lookup columns.
+
+Revision ID: a3f1c9d2e7b4
+Revises: 5cad0207792f
+Create Date: 2026-10-18 09:12:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e7b4'
+down_revision = '5cad0207792f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_user_id_datetime', ['user_id', 'datetime'], unique=False)
+        batch_op.create_index('ix_reservation_status_datetime', ['status', 'datetime'], unique=False)
+        batch_op.create_index('ix_reservation_datetime', ['datetime'], unique=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_user_id', ['user_id'], unique=False)
+        batch_op.create_index('ix_order_item_id', ['item_id'], unique=False)
+
+    # user.email is already covered by the index behind its UNIQUE constraint
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_item_id')
+        batch_op.drop_index('ix_order_user_id')
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_datetime')
+        batch_op.drop_index('ix_reservation_status_datetime')
+        batch_op.drop_index('ix_reservation_user_id_datetime')
@@ -0,0 +1,91 @@
+"""Align the migrated schema with models.py.
+
+Revision ID: b7e2d4c1f9a0
+Revises: a3f1c9d2e7b4
+Create Date: 2026-10-18 11:02:17.554310
+
+The initial migration was generated from an older draft of the models, so a
+database built with ``flask db upgrade`` could not serve the API. This brings
+user, restaurant_detail, order and payment in line with models.py. The unused
+order.status column and the foreign keys are left in place.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4c1f9a0'
+down_revision = 'a3f1c9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('username', sa.String(length=80), nullable=True))
+        batch_op.add_column(sa.Column('password_hash', sa.String(length=128), nullable=True))
+    op.execute('UPDATE "user" SET username = name, password_hash = password')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('username', existing_type=sa.String(length=80), nullable=False)
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=128), nullable=False)
+        batch_op.drop_column('role')
+        batch_op.drop_column('password')
+        batch_op.drop_column('email')
+        batch_op.drop_column('name')
+
+    with op.batch_alter_table('restaurant_detail', schema=None) as batch_op:
+        batch_op.alter_column('address', new_column_name='location',
+                              existing_type=sa.String(length=200), type_=sa.String(length=255),
+                              existing_nullable=False)
+        batch_op.alter_column('contact_info', new_column_name='contact',
+                              existing_type=sa.String(length=100), type_=sa.String(length=15),
+                              existing_nullable=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('item_name', sa.String(length=100), nullable=False, server_default=''))
+
+    op.execute("UPDATE payment SET payment_status = 'pending' WHERE payment_status IS NULL")
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.alter_column('payment_status', new_column_name='status',
+                              existing_type=sa.String(length=20), nullable=False)
+
+    op.execute("UPDATE reservation SET status = 'confirmed' WHERE status IS NULL")
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=20), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(length=20), nullable=True)
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.alter_column('status', new_column_name='payment_status',
+                              existing_type=sa.String(length=20), nullable=True)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_column('item_name')
+
+    with op.batch_alter_table('restaurant_detail', schema=None) as batch_op:
+        batch_op.alter_column('contact', new_column_name='contact_info',
+                              existing_type=sa.String(length=15), type_=sa.String(length=100),
+                              existing_nullable=False)
+        batch_op.alter_column('location', new_column_name='address',
+                              existing_type=sa.String(length=255), type_=sa.String(length=200),
+                              existing_nullable=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('email', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('password', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('role', sa.String(length=20), nullable=True))
+    op.execute("UPDATE \"user\" SET name = username, email = username || '@localhost', "
+               "password = password_hash, role = 'customer'")
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('name', existing_type=sa.String(length=100), nullable=False)
+        batch_op.alter_column('email', existing_type=sa.String(length=120), nullable=False)
+        batch_op.alter_column('password', existing_type=sa.String(length=200), nullable=False)
+        batch_op.alter_column('role', existing_type=sa.String(length=20), nullable=False)
+        batch_op.create_unique_constraint('uq_user_email', ['email'])
+        batch_op.drop_column('password_hash')
+        batch_op.drop_column('username')
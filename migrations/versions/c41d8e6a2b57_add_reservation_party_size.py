@@ -0,0 +1,26 @@
+"""Add party_size to reservation.
+
+Revision ID: c41d8e6a2b57
+Revises: b7e2d4c1f9a0
+Create Date: 2026-10-18 13:25:48.907114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8e6a2b57'
+down_revision = 'b7e2d4c1f9a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('party_size', sa.Integer(), server_default='2', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_column('party_size')
@@ -0,0 +1,46 @@
+"""Capture order price and time; add the sales rollup table.
+
+Revision ID: d9a3b5f7c210
+Revises: c41d8e6a2b57
+Create Date: 2026-10-18 15:40:03.221875
+
+Run ``flask reports rebuild-sales`` after upgrading to fill the rollup from
+existing orders.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3b5f7c210'
+down_revision = 'c41d8e6a2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sales_rollup',
+    sa.Column('granularity', sa.String(length=5), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('granularity', 'bucket', 'item_id')
+    )
+    # SQLite cannot ADD COLUMN with a non-constant default, so rebuild the table
+    with op.batch_alter_table('order', schema=None, recreate='always') as batch_op:
+        batch_op.add_column(sa.Column('unit_price', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+
+    # Best available price for orders placed before prices were captured
+    op.execute('UPDATE "order" SET unit_price = (SELECT price FROM menu_item WHERE menu_item.id = "order".item_id)')
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('unit_price')
+
+    op.drop_table('sales_rollup')
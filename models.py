@@ -1,7 +1,10 @@
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 
-# Initialize db here
-db = SQLAlchemy()
+from tenancy import RoutingSession
+
+# Initialize db here; the session switches to the request's tenant database when there is one
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,11 +16,20 @@ class Reservation(db.Model):
     user_id = db.Column(db.Integer, nullable=False)
     datetime = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), nullable=False)
+    party_size = db.Column(db.Integer, nullable=False, default=2, server_default='2')
+
+    __table_args__ = (
+        db.Index('ix_reservation_user_id_datetime', 'user_id', 'datetime'),
+        db.Index('ix_reservation_status_datetime', 'status', 'datetime'),
+        db.Index('ix_reservation_datetime', 'datetime'),
+    )
 
 class MenuItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
+    description = db.Column(db.Text)
+    tags = db.Column(db.String(255))  # Comma-separated, e.g. "vegetarian,spicy"
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,12 +37,57 @@ class Order(db.Model):
     item_id = db.Column(db.Integer, nullable=False)
     item_name = db.Column(db.String(100), nullable = False)
     quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float)  # Menu price when the order was placed; NULL for older orders
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.current_timestamp())
+    ticket = db.Column(db.String(32))  # Set on orders accepted through the order journal
+    # placed -> cooking -> ready -> served -> paid; version goes up with every transition
+    status = db.Column(db.String(20), nullable=False, default='placed', server_default='placed')
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        db.Index('ix_order_user_id', 'user_id'),
+        db.Index('ix_order_item_id', 'item_id'),
+        db.Index('ix_order_ticket', 'ticket', unique=True),
+        db.Index('ix_order_status', 'status'),
+    )
+
+class SalesRollup(db.Model):
+    # Sales per menu item per hour or day, maintained in the same transaction as each order
+    granularity = db.Column(db.String(5), primary_key=True)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    # Response to a POST sent with an Idempotency-Key header, replayed to retries until it expires
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of method, path and body
+    status_code = db.Column(db.Integer)  # NULL while the original request is still running
+    body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+    )
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, nullable=False)
     amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), nullable=False)
+    checkout_id = db.Column(db.String(32))  # Payments of one checkout are charged together
+    gateway_ref = db.Column(db.String(64))  # The gateway's transaction id once settled
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.current_timestamp())
+    settled_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_payment_checkout_id', 'checkout_id'),
+        # An order is billed once unless its payment failed
+        db.Index('ix_payment_order_id_active', 'order_id', unique=True,
+                 sqlite_where=db.text("status != 'failed'"), postgresql_where=db.text("status != 'failed'")),
+    )
 
 class RestaurantDetail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
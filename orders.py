@@ -0,0 +1,157 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from models import db, MenuItem, Order
+from kitchen import kitchen_feed
+from journal import order_journal
+from sales import record_sales
+
+MAX_BATCH_LINES = 500
+
+# An order only ever moves one step along this list
+ORDER_FLOW = ('placed', 'cooking', 'ready', 'served', 'paid')
+PREVIOUS_STATUS = dict(zip(ORDER_FLOW[1:], ORDER_FLOW))
+
+
+class OrderBatchError(ValueError):
+    pass
+
+
+class OrderConflict(Exception):
+    """The order has moved on from the state the transition expected."""
+
+    def __init__(self, message, status, version):
+        super().__init__(message)
+        self.status = status
+        self.version = version
+
+
+def place_order(user_id, item_id, quantity, item_name=None):
+    """Insert one order at the current menu price; returns None if the item does not exist."""
+    menu_item = db.session.get(MenuItem, item_id)
+    if not menu_item:
+        return None
+    order = Order(user_id=user_id, item_id=item_id, item_name=item_name or menu_item.name,
+                  quantity=quantity, unit_price=menu_item.price, created_at=datetime.now())
+    db.session.add(order)
+    record_sales([{"item_id": item_id, "quantity": quantity, "unit_price": menu_item.price,
+                   "created_at": order.created_at}])
+    db.session.commit()
+    kitchen_feed.notify()
+    return order
+
+
+def journal_order(user_id, item_id, quantity, item_name=None, ticket=None):
+    """Validate an order and hand it to the order journal; returns its ticket, or None
+    if the item does not exist. The order is written later by the journal's writer."""
+    menu_item = db.session.get(MenuItem, item_id)
+    if not menu_item:
+        return None
+    return order_journal.submit({"user_id": user_id, "item_id": item_id, "item_name": item_name or menu_item.name,
+                                 "quantity": quantity, "unit_price": menu_item.price}, ticket=ticket)
+
+
+def transition_order(order_id, status, version=None):
+    """Move an order to ``status`` with one compare-and-swap UPDATE.
+
+    The UPDATE only matches while the order is in the status just before
+    ``status`` and, when ``version`` is given, still at that version. It bumps
+    the version. Nothing is locked between a terminal's read and its write,
+    so terminals never wait on each other. A terminal acting on a stale read
+    gets ``OrderConflict`` with the current state instead of overwriting a
+    newer change. Returns ``(status, version)``, or None if there is no such
+    order.
+    """
+    if status not in PREVIOUS_STATUS:
+        raise ValueError(f"status must be one of: {', '.join(ORDER_FLOW[1:])}")
+    conditions = [Order.id == order_id, Order.status == PREVIOUS_STATUS[status]]
+    if version is not None:
+        conditions.append(Order.version == version)
+    row = db.session.execute(
+        update(Order).where(*conditions).values(status=status, version=Order.version + 1)
+        .returning(Order.status, Order.version)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.session.commit()
+    if row:
+        return row.status, row.version
+
+    # Lost the race or asked for a step the order cannot take; report where it is now
+    current = db.session.execute(select(Order.status, Order.version).where(Order.id == order_id)).first()
+    if current is None:
+        return None
+    if version is not None and current.version != version:
+        raise OrderConflict(f"Order was changed to {current.status} by someone else", *current)
+    raise OrderConflict(f"Cannot move an order from {current.status} to {status}", *current)
+
+
+def _check_line(line, default_user_id):
+    if not isinstance(line, dict):
+        return None, "Line item must be an object"
+    user_id = line.get('user_id', default_user_id)
+    item_id = line.get('item_id')
+    quantity = line.get('quantity', 1)
+    for name, value in (('user_id', user_id), ('item_id', item_id), ('quantity', quantity)):
+        if not isinstance(value, int) or isinstance(value, bool):
+            return None, f"{name} must be an integer"
+    if quantity < 1:
+        return None, "quantity must be at least 1"
+    return {"user_id": user_id, "item_id": item_id, "quantity": quantity}, None
+
+
+def check_order(data):
+    """Validate a single-order body with the batch line rules; returns ``(line, error)``."""
+    if not isinstance(data, dict):
+        return None, "Request body must be a JSON object"
+    return _check_line(data, None)
+
+
+def place_order_batch(data):
+    """Validate and insert every line of a batch order in one transaction.
+
+    Returns one result per input line, in order. Menu items are checked with a
+    single ``IN`` query and valid lines are written with one executemany
+    insert, one rollup upsert and a single commit.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list) or not data['items']:
+        raise OrderBatchError("Request body must contain a non-empty 'items' list")
+    if len(data['items']) > MAX_BATCH_LINES:
+        raise OrderBatchError(f"A batch may contain at most {MAX_BATCH_LINES} items")
+
+    results = []
+    lines = []
+    for index, raw in enumerate(data['items']):
+        line, error = _check_line(raw, data.get('user_id'))
+        results.append({"index": index, "status": "rejected", "error": error} if error else None)
+        lines.append(line)
+
+    item_ids = {line['item_id'] for line in lines if line}
+    menu = {row.id: row for row in
+            db.session.query(MenuItem.id, MenuItem.name, MenuItem.price).filter(MenuItem.id.in_(item_ids))}
+    created_at = datetime.now()
+
+    rows = []
+    row_indexes = []
+    for index, line in enumerate(lines):
+        if line is None:
+            continue
+        if line['item_id'] not in menu:
+            results[index] = {"index": index, "status": "rejected", "error": "Menu item not found"}
+            continue
+        item = menu[line['item_id']]
+        rows.append(dict(line, item_name=item.name, unit_price=item.price, created_at=created_at))
+        row_indexes.append(index)
+
+    if rows:
+        # sort_by_parameter_order would make SQLite fall back to one INSERT per
+        # row (it has no sentinel for autoincrement keys). One multi-row INSERT
+        # hands out ids in row order, so sorting the returned ids lines them up.
+        order_ids = sorted(db.session.scalars(insert(Order).returning(Order.id), rows).all())
+        record_sales(rows)
+        db.session.commit()
+        kitchen_feed.notify()
+        for index, order_id in zip(row_indexes, order_ids):
+            results[index] = {"index": index, "status": "created", "order_id": order_id}
+
+    return results
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_int(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise PaginationError(f"{name} must be an integer")
+
+
+def parse_date(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise PaginationError(f"Invalid {name} date, please use YYYY-MM-DD")
+
+
+def filter_date_range(query, column, args):
+    # 'from' and 'to' are both inclusive calendar days
+    start = parse_date(args, 'from')
+    end = parse_date(args, 'to')
+    if start:
+        query = query.filter(column >= start)
+    if end:
+        query = query.filter(column < end + timedelta(days=1))
+    return query
+
+
+def filter_after(query, id_column, args):
+    after = parse_int(args, 'after')
+    if after is not None:
+        query = query.filter(id_column > after)
+    return query
+
+
+def keyset_query(query, id_column, args):
+    """Narrow ``query`` (ORM ``Query`` or Core ``select``) to one page; returns it with the page size."""
+    limit = parse_limit(args)
+    query = filter_after(query, id_column, args)
+    # Fetch one extra row to know whether another page exists
+    return query.order_by(id_column).limit(limit + 1), limit
+
+
+def split_page(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows, next_cursor
+
+
+def keyset_page(query, id_column, args):
+    """Return one page of ``query`` ordered by ``id_column`` and the cursor for the next page.
+
+    The cursor is the last id of the page, so the database seeks straight to
+    ``id > after`` through the primary key instead of counting past an offset.
+    """
+    query, limit = keyset_query(query, id_column, args)
+    return split_page(query.all(), limit)
@@ -0,0 +1,230 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import DateTime, exists, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import import_string
+
+from models import db, MenuItem, Order, Payment
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SETTLED = 'settled'
+FAILED = 'failed'
+
+
+class GatewayError(Exception):
+    """The gateway declined the charge."""
+
+
+class NothingToPay(Exception):
+    pass
+
+
+class AlreadyBilled(Exception):
+    pass
+
+
+class PaymentGateway:
+    """Interface a payment provider implements; built from the app config.
+
+    ``charge`` may block on the network. It is only called from the
+    settlement pool, never from a request thread or with a transaction open.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def charge(self, reference, amount):
+        """Charge ``amount`` and return the provider's transaction id.
+
+        ``reference`` is the checkout id. It stays the same when a charge is
+        retried, so providers should send it as their idempotency key. Raise
+        ``GatewayError`` when the charge is declined.
+        """
+        raise NotImplementedError
+
+
+class FakeGateway(PaymentGateway):
+    """Local gateway for development, tests and benchmarks.
+
+    Waits ``PAYMENT_FAKE_LATENCY`` seconds and approves the charge, unless the
+    amount is above ``PAYMENT_FAKE_DECLINE_OVER``. Retries with the same
+    reference get the first transaction id back.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.latency = config.get('PAYMENT_FAKE_LATENCY', 0)
+        self.decline_over = config.get('PAYMENT_FAKE_DECLINE_OVER')
+        self.charges = {}
+
+    def charge(self, reference, amount):
+        time.sleep(self.latency)
+        if self.decline_over is not None and amount > self.decline_over:
+            raise GatewayError("Card declined")
+        return self.charges.setdefault(reference, f"fake_{uuid.uuid4().hex[:24]}")
+
+
+def _unpaid(user_id, order_ids=None):
+    # Orders with a pending or settled payment are billed already; failed ones can be billed again
+    billed = exists().where(Payment.order_id == Order.id, Payment.status != FAILED)
+    conditions = [Order.user_id == user_id, ~billed]
+    if order_ids is not None:
+        conditions.append(Order.id.in_(order_ids))
+    return conditions
+
+
+def _price():
+    return func.coalesce(Order.unit_price, MenuItem.price, 0)
+
+
+def bill(user_id, order_ids=None):
+    """Unpaid orders of ``user_id`` (or just ``order_ids``) totalled per item in one query."""
+    price = _price()
+    rows = db.session.execute(
+        select(Order.item_id, Order.item_name, price.label('unit_price'),
+               func.sum(Order.quantity).label('quantity'), func.count(Order.id).label('orders'),
+               func.sum(Order.quantity * price).label('amount'))
+        .outerjoin(MenuItem, MenuItem.id == Order.item_id)
+        .where(*_unpaid(user_id, order_ids))
+        .group_by(Order.item_id, Order.item_name, price)
+        .order_by(Order.item_id)
+    ).all()
+    return {
+        "user_id": user_id,
+        "lines": [{"item_id": r.item_id, "item_name": r.item_name, "unit_price": r.unit_price,
+                   "quantity": r.quantity, "amount": round(r.amount, 2)} for r in rows],
+        "orders": sum(r.orders for r in rows),
+        "total": round(sum(r.amount for r in rows), 2),
+    }
+
+
+def open_checkout(user_id, order_ids=None):
+    """Record a pending payment for each unpaid order and return ``(checkout_id, amount, orders)``.
+
+    The rows are written with one ``INSERT ... SELECT`` and committed before
+    the gateway is involved. The partial unique index on ``payment.order_id``
+    makes a concurrent checkout of the same orders fail with ``AlreadyBilled``
+    instead of charging twice.
+    """
+    checkout_id = uuid.uuid4().hex
+    statement = insert(Payment).from_select(
+        ['order_id', 'amount', 'status', 'checkout_id', 'created_at'],
+        select(Order.id, Order.quantity * _price(), literal(PENDING), literal(checkout_id),
+               literal(datetime.now(), DateTime))
+        .outerjoin(MenuItem, MenuItem.id == Order.item_id)
+        .where(*_unpaid(user_id, order_ids))
+    ).returning(Payment.amount)
+    try:
+        amounts = db.session.scalars(statement).all()
+        if not amounts:
+            raise NothingToPay()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise AlreadyBilled()
+    except NothingToPay:
+        db.session.rollback()
+        raise
+    return checkout_id, round(sum(amounts), 2), len(amounts)
+
+
+def checkout_status(checkout_id):
+    row = db.session.execute(
+        select(func.min(Payment.status).label('status'), func.count(Payment.id).label('orders'),
+               func.sum(Payment.amount).label('amount'), func.max(Payment.gateway_ref).label('gateway_ref'),
+               func.max(Payment.settled_at).label('settled_at'))
+        .where(Payment.checkout_id == checkout_id)
+    ).one()
+    if not row.orders:
+        return None
+    return {"checkout_id": checkout_id, "status": row.status, "orders": row.orders,
+            "amount": round(row.amount, 2), "gateway_ref": row.gateway_ref,
+            "settled_at": str(row.settled_at) if row.settled_at else None}
+
+
+class PaymentSettlement:
+    """Charges checkouts through the configured gateway, off the request thread.
+
+    ``submit`` hands a checkout to a bounded thread pool and returns at once.
+    A pool thread calls the gateway with no database transaction open, then
+    records the outcome with one UPDATE of the checkout's pending rows. If
+    the gateway call errors, the rows stay pending for ``flask payments
+    settle-pending`` to retry. ``PAYMENT_SETTLE_WORKERS = 0`` settles inline,
+    which only tests should use.
+    """
+
+    def __init__(self):
+        self.workers = 4
+        self.gateway = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config['PAYMENT_SETTLE_WORKERS']
+        path = app.config['PAYMENT_GATEWAY']
+        self.gateway = import_string(path)(app.config) if path else None
+        app.extensions['payment_settlement'] = self
+
+    def _pool(self):
+        # Created on first use so each gunicorn worker gets its own threads after the fork
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='settle')
+        return self._executor
+
+    def submit(self, checkout_id, amount):
+        """Settle a checkout in the background; returns its status as of now."""
+        app = current_app._get_current_object()
+        if not self.workers:
+            return self.settle(app, checkout_id, amount)
+        # Copy the context so the settling thread writes to the same tenant's database
+        self._pool().submit(contextvars.copy_context().run, self.settle, app, checkout_id, amount)
+        return PENDING
+
+    def settle(self, app, checkout_id, amount):
+        try:
+            reference, status = self.gateway.charge(checkout_id, amount), SETTLED
+        except GatewayError as e:
+            logger.info("Checkout %s declined: %s", checkout_id, e)
+            reference, status = None, FAILED
+        except Exception:
+            logger.exception("Charging checkout %s failed; it stays pending", checkout_id)
+            return PENDING
+        with app.app_context():
+            try:
+                db.session.execute(
+                    update(Payment)
+                    .where(Payment.checkout_id == checkout_id, Payment.status == PENDING)
+                    .values(status=status, gateway_ref=reference, settled_at=datetime.now())
+                    .execution_options(synchronize_session=False))
+                db.session.commit()
+            finally:
+                db.session.remove()
+        return status
+
+    def settle_pending(self, older_than):
+        """Retry checkouts still pending after ``older_than`` seconds; returns how many."""
+        cutoff = datetime.now() - timedelta(seconds=older_than)
+        rows = db.session.execute(
+            select(Payment.checkout_id, func.sum(Payment.amount))
+            .where(Payment.status == PENDING, Payment.created_at < cutoff)
+            .group_by(Payment.checkout_id)
+        ).all()
+        db.session.rollback()
+        app = current_app._get_current_object()
+        for checkout_id, amount in rows:
+            self.settle(app, checkout_id, round(amount, 2))
+        return len(rows)
+
+
+settlement = PaymentSettlement()
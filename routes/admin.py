@@ -1,8 +1,16 @@
+import os
+import subprocess
+import sys
+import time
+
+import click
 from flask import Blueprint, request, jsonify
 from models import db, User
-from flask_bcrypt import generate_password_hash, check_password_hash
+from hashing import HasherBusy, password_hasher
+from archive import ArchiveUnavailable, archive
+from tenancy import shards
 
-bp = Blueprint('admin', __name__)
+bp = Blueprint('admin', __name__, cli_group='admin')
 
 # List all users
 @bp.route('/users', methods=['GET'])
@@ -23,7 +31,10 @@ def add_user():
         return jsonify({"error": "User with this email already exists"}), 400
 
     # Hash password before saving it
-    hashed_password = generate_password_hash(data['password']).decode('utf-8')
+    try:
+        hashed_password = password_hasher.hash(data['password'])
+    except HasherBusy:
+        return jsonify({"error": "Too many password operations in progress, please retry"}), 429, {"Retry-After": "1"}
     
     new_user = User(
         name=data['name'],
@@ -67,7 +78,64 @@ def update_user(user_id):
     if 'role' in data:
         user.role = data['role']
     if 'password' in data:
-        user.password = generate_password_hash(data['password']).decode('utf-8')
+        try:
+            user.password = password_hasher.hash(data['password'])
+        except HasherBusy:
+            return jsonify({"error": "Too many password operations in progress, please retry"}), 429, {"Retry-After": "1"}
     
     db.session.commit()
     return jsonify({"message": "User updated successfully"}), 200
+
+# Hot and archived row counts, rows due for archival and file sizes
+@bp.route('/archive', methods=['GET'])
+def archive_status():
+    try:
+        return jsonify(archive.status()), 200
+    except ArchiveUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+
+# Move everything due into the archive now
+@bp.route('/archive', methods=['POST'])
+def run_archive():
+    try:
+        moved = archive.run()
+    except ArchiveUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+    return jsonify({"moved": moved, "status": archive.status()}), 200
+
+
+@bp.cli.command('archive')
+@click.option('--every', type=int, help="Keep running, archiving every this many seconds.")
+@click.option('--vacuum', is_flag=True, help="VACUUM the hot database after archiving.")
+def archive_command(every, vacuum):
+    """Move closed orders and past reservations into the archive database."""
+    while True:
+        moved = archive.run()
+        if vacuum:
+            archive.vacuum()
+        click.echo(f"Archived {moved['orders']} orders and {moved['reservations']} reservations.")
+        if not every:
+            return
+        time.sleep(every)
+
+
+@bp.cli.command('archive-status')
+def archive_status_command():
+    """Show hot and archived row counts and file sizes."""
+    status = archive.status()
+    for key in ('orders', 'reservations'):
+        archived = ", ".join(f"{year}: {count}" for year, count in status[key]['archived'].items()) or "none"
+        click.echo(f"{key}: {status[key]['hot']} hot, {status[key]['due']} due, archived {archived}")
+    click.echo(f"hot database {status['hot_bytes']} bytes ({status['hot_free_bytes']} free), "
+               f"page cache {status['page_cache_bytes']} bytes, archive {status['archive_bytes']} bytes")
+
+
+@bp.cli.command('upgrade-tenants')
+def upgrade_tenants_command():
+    """Run ``flask db upgrade`` against every tenant database."""
+    for tenant in shards.tenants:
+        url = shards.url(tenant).render_as_string(hide_password=False)
+        click.echo(f"Upgrading {tenant}")
+        # A fresh process, since config.py reads DATABASE_URL once at import
+        subprocess.run([sys.executable, '-m', 'flask', 'db', 'upgrade'], env={**os.environ, 'DATABASE_URL': url},
+                       check=True)
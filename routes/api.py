@@ -0,0 +1,340 @@
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+from models import db, User, Reservation, MenuItem, Order, Payment, RestaurantDetail
+from pagination import PaginationError, filter_date_range, keyset_page, parse_int, parse_limit
+from export import requested_format, stream_export
+from cache import menu_cache
+from hashing import HasherBusy, password_hasher
+from orders import (OrderBatchError, OrderConflict, check_order, journal_order, place_order, place_order_batch,
+                    transition_order)
+from journal import TICKET_LENGTH, order_journal, ticket_for
+from menu import MenuImportError, import_menu, parse_menu_csv, reprice
+from search import search_menu
+from availability import (OutsideServiceHours, SlotFull, availability, check_booking, parse_party_size,
+                          parse_reservation_datetime)
+from idempotency import HEADER, MAX_KEY_LENGTH, idempotent
+from tenancy import current_tenant
+from serializers import MENU_ITEM, ORDER, RESERVATION, RESTAURANT
+from datetime import datetime
+
+bp = Blueprint('api', __name__)
+
+def filter_reservations(query, args):
+    # Works on an ORM query or a Core select, so the async app shares it
+    user_id = parse_int(args, 'user_id')
+    if user_id is not None:
+        query = query.filter(Reservation.user_id == user_id)
+    if args.get('status'):
+        query = query.filter(Reservation.status == args['status'])
+    return filter_date_range(query, Reservation.datetime, args)
+
+def filter_orders(query, args):
+    user_id = parse_int(args, 'user_id')
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    item_id = parse_int(args, 'item_id')
+    if item_id is not None:
+        query = query.filter(Order.item_id == item_id)
+    if args.get('status'):
+        query = query.filter(Order.status == args['status'])
+    return query
+
+# General Routes for API
+@bp.route('/reservations', methods=['GET'])
+def get_reservations():
+    try:
+        query = filter_reservations(Reservation.query, request.args)
+        if requested_format(request.args) != 'json':
+            return stream_export(query, RESERVATION.columns, request.args, 'reservations')
+        rows, next_cursor = keyset_page(query.with_entities(*RESERVATION.columns), Reservation.id, request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": RESERVATION.many(rows), "next_cursor": next_cursor})
+
+@bp.route('/menu', methods=['GET'])
+def get_menu():
+    try:
+        if requested_format(request.args) != 'json':
+            return stream_export(MenuItem.query, MENU_ITEM.columns, request.args, 'menu')
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    etag, body = menu_cache.get(load_menu)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def load_menu():
+    rows = db.session.execute(db.select(*MENU_ITEM.columns).order_by(MenuItem.id))
+    return current_app.json.dumps(MENU_ITEM.many(rows))
+
+@bp.route('/menu/search', methods=['GET'])
+def search_menu_items():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = parse_limit(request.args) if 'limit' in request.args else 20
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"query": q, "items": search_menu(q, limit)})
+
+@bp.route('/menu/bulk', methods=['POST'])
+def bulk_import_menu():
+    # JSON list (or {"items": [...]}) or a CSV upload with name,price[,id] columns
+    try:
+        if request.mimetype == 'text/csv':
+            items = parse_menu_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            items = data.get('items') if isinstance(data, dict) else data
+        created, updated = import_menu(items)
+    except MenuImportError as e:
+        body = {"error": str(e)}
+        if e.errors:
+            body["items"] = e.errors
+        return jsonify(body), 400
+    return jsonify({"created": created, "updated": updated}), 200
+
+@bp.route('/menu/prices', methods=['PATCH'])
+def bulk_reprice_menu():
+    data = request.get_json(silent=True) or {}
+    item_ids = data.get('item_ids')
+    if item_ids is not None and (not isinstance(item_ids, list)
+                                 or not all(isinstance(i, int) and not isinstance(i, bool) for i in item_ids)):
+        return jsonify({"error": "item_ids must be a list of integers"}), 400
+    for name in ('percent', 'amount'):
+        if data.get(name) is not None and (not isinstance(data[name], (int, float)) or isinstance(data[name], bool)):
+            return jsonify({"error": f"{name} must be a number"}), 400
+    try:
+        updated = reprice(data.get('percent'), data.get('amount'), item_ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"updated": updated})
+
+def journaling():
+    # The journal writes to the default database; tenant orders are placed directly
+    return order_journal.enabled and current_tenant() is None
+
+@bp.route('/order', methods=['POST'])
+@idempotent(skip=journaling)
+def create_order():
+    data = request.json
+    line, error = check_order(data)
+    if error:
+        return jsonify({"error": error}), 400
+    if journaling():
+        return accept_order(line['user_id'], line['item_id'], line['quantity'], data.get('item_name'))
+    new_order = place_order(line['user_id'], line['item_id'], line['quantity'], data.get('item_name'))
+    if not new_order:
+        return jsonify({"error": "Menu item not found"}), 404
+    return jsonify({"message": "Order created successfully"}), 201
+
+def accept_order(*order):
+    # Journal mode: acknowledge now, the order is written in the next group commit.
+    # A keyed retry gets the ticket of the first attempt, and the writer skips tickets
+    # already in the table, so no idempotency row is committed per order.
+    key = request.headers.get(HEADER)
+    if key and len(key) > MAX_KEY_LENGTH:
+        return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+    ticket = journal_order(*order, ticket=ticket_for(key) if key else None)
+    if not ticket:
+        return jsonify({"error": "Menu item not found"}), 404
+    return jsonify({"message": "Order accepted", "ticket": ticket}), 202, \
+        {"Location": url_for('api.order_status', ticket=ticket)}
+
+@bp.route('/order/status/<ticket>', methods=['GET'])
+def order_status(ticket):
+    # Only the table is consulted, so any worker can answer for any ticket;
+    # a ticket this server never issued also reads as pending
+    if len(ticket) != TICKET_LENGTH:
+        return jsonify({"error": "Unknown ticket"}), 404
+    order_id = db.session.scalar(db.select(Order.id).where(Order.ticket == ticket))
+    if order_id is None:
+        return jsonify({"ticket": ticket, "status": "pending"})
+    return jsonify({"ticket": ticket, "status": "persisted", "order_id": order_id})
+
+# Advance an order one step (placed -> cooking -> ready -> served -> paid).
+# Send the version you last saw; a 409 carries the current status and version.
+@bp.route('/order/<int:id>/transition', methods=['POST'])
+def transition(id):
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        return jsonify({"error": "version must be an integer"}), 400
+    try:
+        result = transition_order(id, data.get('status'), version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except OrderConflict as e:
+        return jsonify({"error": str(e), "status": e.status, "version": e.version}), 409
+    if result is None:
+        return jsonify({"error": "Order not found"}), 404
+    status, version = result
+    return jsonify({"id": id, "status": status, "version": version})
+
+@bp.route('/order/batch', methods=['POST'])
+@idempotent
+def create_order_batch():
+    try:
+        results = place_order_batch(request.json)
+    except OrderBatchError as e:
+        return jsonify({"error": str(e)}), 400
+    created = sum(1 for r in results if r['status'] == 'created')
+    return jsonify({"created": created, "results": results}), 201 if created else 400
+
+@bp.route('/order/view', methods=['GET'])
+def view_order():
+    try:
+        query = filter_orders(Order.query, request.args)
+        if requested_format(request.args) != 'json':
+            return stream_export(query, ORDER.columns, request.args, 'orders')
+        rows, next_cursor = keyset_page(query.with_entities(*ORDER.columns), Order.id, request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": ORDER.many(rows), "next_cursor": next_cursor})
+
+@bp.route('/reservations', methods=['POST'])
+@idempotent
+def create_reservation():
+    data = request.json
+    error = check_booking(data)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        party_size = parse_party_size(data.get('party_size', 2))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        # Parse the datetime string into a datetime object
+        reservation_datetime = parse_reservation_datetime(data['datetime'])
+
+        reservation_id = availability.book(data['user_id'], reservation_datetime, party_size)
+
+        # Return the ID of the created reservation along with the success message
+        return jsonify({"message": "Reservation created successfully", "reservation_id": reservation_id}), 201
+    except OutsideServiceHours as e:
+        return jsonify({"error": str(e)}), 400
+    except SlotFull:
+        return jsonify({"error": "No availability left in that time slot"}), 409
+    except ValueError:
+        return jsonify({"error": "Invalid date format, please use YYYY-MM-DD"}), 400
+
+
+@bp.route('/reservations/availability', methods=['GET'])
+def reservation_availability():
+    try:
+        day = datetime.strptime(request.args.get('date', ''), "%Y-%m-%d").date()
+    except ValueError:
+        return jsonify({"error": "Invalid date format, please use YYYY-MM-DD"}), 400
+    return jsonify({
+        "date": str(day),
+        "slot_minutes": availability.slot_minutes,
+        "capacity": availability.capacity,
+        "slots": availability.for_date(day)
+    })
+
+
+@bp.route('/reservations/<int:id>', methods=['PUT'])
+def modify_reservation(id):
+    data = request.json
+    reservation = db.session.get(Reservation, id)
+
+    # If reservation is not found, return an error
+    if not reservation:
+        return jsonify({"message": "Reservation not found"}), 404
+
+    # Check if 'datetime' is provided in the request
+    new_datetime = None
+    if 'datetime' in data:
+        try:
+            new_datetime = parse_reservation_datetime(data['datetime'])  # Same formats as in create
+        except ValueError:
+            return jsonify({"message": "Invalid datetime format. Please use YYYY-MM-DD"}), 400
+
+    party_size = None
+    if data.get('party_size') is not None:
+        try:
+            party_size = parse_party_size(data['party_size'])
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+    # Move the reservation and update status/party size, re-checking capacity
+    try:
+        availability.change(reservation, when=new_datetime,
+                            party_size=party_size, status=data.get('status'))
+    except OutsideServiceHours as e:
+        return jsonify({"message": str(e)}), 400
+    except SlotFull:
+        return jsonify({"message": "No availability left in that time slot"}), 409
+
+    # Return a success message
+    return jsonify({"message": "Reservation updated successfully"})
+
+
+@bp.route('/reservations/<int:id>', methods=['DELETE'])
+def cancel_reservation(id):
+    reservation = db.session.get(Reservation, id)
+    if not reservation:
+        return jsonify({"message": "Reservation not found"}), 404
+    availability.cancel(reservation)
+    return jsonify({"message": "Reservation canceled successfully"})
+
+@bp.route('/restaurant_details', methods=['GET', 'PUT'])
+def manage_restaurant_details():
+    if request.method == 'GET':
+        row = db.session.execute(db.select(*RESTAURANT.columns).limit(1)).first()
+        if row:
+            return jsonify(RESTAURANT.one(row))
+        else:
+            return jsonify({"message": "Restaurant details not found"}), 404
+    restaurant = RestaurantDetail.query.first()
+    if request.method == 'PUT':
+        data = request.json
+        if restaurant:
+            restaurant.name = data.get('name', restaurant.name)
+            restaurant.location = data.get('location', restaurant.location)
+            restaurant.contact = data.get('contact', restaurant.contact)
+            db.session.commit()
+            return jsonify({"message": "Restaurant details updated successfully"})
+        else:
+            return jsonify({"message": "Restaurant details not found"}), 404
+
+@bp.route('/users', methods=['POST'])
+def create_user():
+    data = request.json
+    try:
+        password_hash = password_hasher.hash(data['password'])
+    except HasherBusy:
+        return jsonify({"error": "Too many password operations in progress, please retry"}), 429, {"Retry-After": "1"}
+    new_user = User(username=data['username'], password_hash=password_hash)
+    db.session.add(new_user)
+    db.session.commit()
+    return jsonify({"message": "User created successfully"}), 201
+
+@bp.route('/users/<int:id>', methods=['PUT'])
+def update_user(id):
+    data = request.json
+    user = User.query.get(id)
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+    user.username = data.get('username', user.username)
+    if 'password' in data:
+        try:
+            user.password_hash = password_hasher.hash(data['password'])
+        except HasherBusy:
+            return jsonify({"error": "Too many password operations in progress, please retry"}), 429, {"Retry-After": "1"}
+    db.session.commit()
+    return jsonify({"message": "User updated successfully"})
+
+@bp.route('/users/<int:id>', methods=['DELETE'])
+def delete_user(id):
+    user = User.query.get(id)
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+    db.session.delete(user)
+    db.session.commit()
+    return jsonify({"message": "User deleted successfully"})
@@ -1,75 +1,83 @@
 from flask import Blueprint, request, jsonify
-from models import db, Reservation, Order, MenuItem
+from models import db, Reservation
+from orders import check_order, place_order
+from routes.api import accept_order, journaling
+from availability import SlotFull, availability, check_booking, parse_party_size, parse_reservation_datetime
+from serializers import RESERVATION
+from idempotency import idempotent
 
 bp = Blueprint('customers', __name__)
 
 # Create Reservation (POST method)
 @bp.route('/reservations', methods=['POST'])
+@idempotent
 def create_reservation():
     data = request.json
-    new_reservation = Reservation(
-        user_id=data['user_id'],
-        datetime=data['datetime']
-    )
-    db.session.add(new_reservation)
-    db.session.commit()
-    return jsonify({"message": "Reservation created successfully"}), 201
+    error = check_booking(data)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        reservation_id = availability.book(data['user_id'], parse_reservation_datetime(data['datetime']),
+                                           parse_party_size(data.get('party_size', 2)))
+    except SlotFull:
+        return jsonify({"error": "No availability left in that time slot"}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"message": "Reservation created successfully", "reservation_id": reservation_id}), 201
 
 # Modify Reservation (PUT method)
 @bp.route('/reservations/<int:reservation_id>', methods=['PUT'])
 def modify_reservation(reservation_id):
-    reservation = Reservation.query.get(reservation_id)
+    reservation = db.session.get(Reservation, reservation_id)
     if not reservation:
         return jsonify({"error": "Reservation not found"}), 404
 
     data = request.json
     
     # Update reservation datetime
-    if 'datetime' in data:
-        reservation.datetime = data['datetime']
-    
-    db.session.commit()
+    try:
+        if 'datetime' in data:
+            availability.change(reservation, when=parse_reservation_datetime(data['datetime']))
+    except SlotFull:
+        return jsonify({"error": "No availability left in that time slot"}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"message": "Reservation modified successfully"}), 200
 
 # Cancel Reservation (DELETE method)
 @bp.route('/reservations/<int:reservation_id>', methods=['DELETE'])
 def cancel_reservation(reservation_id):
-    reservation = Reservation.query.get(reservation_id)
+    reservation = db.session.get(Reservation, reservation_id)
     if not reservation:
         return jsonify({"error": "Reservation not found"}), 404
 
-    db.session.delete(reservation)
-    db.session.commit()
+    availability.cancel(reservation)
     return jsonify({"message": "Reservation canceled successfully"}), 200
 
 # View Reservations for a Customer (GET method)
 @bp.route('/reservations/<int:user_id>', methods=['GET'])
 def view_reservations(user_id):
-    reservations = Reservation.query.filter_by(user_id=user_id).all()
-    if not reservations:
+    rows = db.session.execute(
+        db.select(*RESERVATION.columns).where(Reservation.user_id == user_id).order_by(Reservation.id)
+    ).all()
+    if not rows:
         return jsonify({"message": "No reservations found"}), 404
 
-    return jsonify([
-        {"id": r.id, "user_id": r.user_id, "datetime": str(r.datetime), "status": r.status}
-        for r in reservations
-    ]), 200
+    return jsonify(RESERVATION.many(rows)), 200
 
 # Place Order (POST method)
 @bp.route('/order', methods=['POST'])
+@idempotent(skip=journaling)
 def create_order():
     data = request.json
+    line, error = check_order(data)
+    if error:
+        return jsonify({"error": error}), 400
+    if journaling():
+        return accept_order(line['user_id'], line['item_id'], line['quantity'])
 
-    # Ensure the item exists
-    menu_item = MenuItem.query.get(data['item_id'])
-    if not menu_item:
+    # Ensure the item exists and place the order at its current price
+    if not place_order(line['user_id'], line['item_id'], line['quantity']):
         return jsonify({"error": "Menu item not found"}), 404
 
-    new_order = Order(
-        user_id=data['user_id'],
-        item_id=data['item_id'],
-        quantity=data['quantity']
-    )
-    db.session.add(new_order)
-    db.session.commit()
-
     return jsonify({"message": "Order created successfully"}), 201
@@ -0,0 +1,80 @@
+import json
+import time
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from kitchen import FeedUnavailable, kitchen_feed, kitchen_streams
+
+bp = Blueprint('kitchen', __name__)
+
+
+def _since():
+    # EventSource sends Last-Event-ID when it reconnects
+    value = request.headers.get('Last-Event-ID') or request.args.get('since', 0)
+    return int(value)
+
+
+@bp.errorhandler(FeedUnavailable)
+def feed_unavailable(e):
+    return jsonify({"error": str(e)}), 501
+
+
+def _too_many_screens():
+    return jsonify({"error": "Too many kitchen screens connected; poll /kitchen/orders?timeout=0"}), 503, \
+        {"Retry-After": "5"}
+
+
+# Long-poll for orders placed after 'since'. A waiting poll holds a thread, so it
+# shares the SSE stream slots; timeout=0 answers at once and needs no slot.
+@bp.route('/orders', methods=['GET'])
+def poll_orders():
+    try:
+        since = _since()
+        timeout = min(float(request.args.get('timeout', current_app.config['KITCHEN_LONGPOLL_TIMEOUT'])),
+                      current_app.config['KITCHEN_LONGPOLL_TIMEOUT'])
+    except ValueError:
+        return jsonify({"error": "since and timeout must be numbers"}), 400
+    if timeout <= 0:
+        events = kitchen_feed.poll(since)
+    elif kitchen_streams.acquire():
+        try:
+            events = kitchen_feed.wait(since, timeout)
+        finally:
+            kitchen_streams.release()
+    else:
+        return _too_many_screens()
+    return jsonify({
+        "events": events,
+        "last_seq": events[-1]["seq"] if events else since
+    }), 200
+
+
+# Server-Sent Events stream of newly placed orders. Streams end after
+# KITCHEN_STREAM_DURATION; EventSource reconnects and resumes from Last-Event-ID.
+@bp.route('/stream', methods=['GET'])
+def stream_orders():
+    try:
+        since = _since()
+    except ValueError:
+        return jsonify({"error": "since must be a number"}), 400
+    kitchen_feed.check()
+    if not kitchen_streams.acquire():
+        return _too_many_screens()
+    heartbeat = current_app.config['KITCHEN_HEARTBEAT']
+    deadline = time.monotonic() + current_app.config['KITCHEN_STREAM_DURATION']
+
+    def generate(seq):
+        yield "retry: 2000\n\n"
+        while (remaining := deadline - time.monotonic()) > 0:
+            events = kitchen_feed.wait(seq, min(heartbeat, remaining))
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                seq = event["seq"]
+                yield f"id: {seq}\nevent: order\ndata: {json.dumps(event['order'])}\n\n"
+
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(kitchen_streams.release)
+    return response
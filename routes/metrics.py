@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from metrics import request_metrics
+
+bp = Blueprint('metrics', __name__)
+
+# Prometheus scrape target
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,65 @@
+import click
+from flask import Blueprint, jsonify, request, url_for
+from idempotency import idempotent
+from pagination import PaginationError, parse_int
+from payments import AlreadyBilled, NothingToPay, bill, checkout_status, open_checkout, settlement
+
+bp = Blueprint('payments', __name__, cli_group='payments')
+
+
+def _int_list(value, name):
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(v, int) and not isinstance(v, bool) for v in value):
+        raise PaginationError(f"{name} must be a list of integers")
+    return value
+
+# Current bill for a user's unpaid orders; repeat order_id to bill part of them (e.g. one table)
+@bp.route('/bill', methods=['GET'])
+def get_bill():
+    try:
+        user_id = parse_int(request.args, 'user_id')
+        order_ids = request.args.getlist('order_id', type=int) or None
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    if user_id is None:
+        return jsonify({"error": "user_id is required"}), 400
+    return jsonify(bill(user_id, order_ids)), 200
+
+# Start paying the bill; the gateway is charged in the background
+@bp.route('', methods=['POST'])
+@idempotent
+def create_checkout():
+    if settlement.gateway is None:
+        return jsonify({"error": "No payment gateway is configured"}), 503
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    if not isinstance(user_id, int) or isinstance(user_id, bool):
+        return jsonify({"error": "user_id must be an integer"}), 400
+    try:
+        order_ids = _int_list(data.get('order_ids'), 'order_ids')
+        checkout_id, amount, orders = open_checkout(user_id, order_ids)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except NothingToPay:
+        return jsonify({"error": "No unpaid orders to check out"}), 404
+    except AlreadyBilled:
+        return jsonify({"error": "Some of these orders are already being paid"}), 409
+
+    status = settlement.submit(checkout_id, amount)
+    return jsonify({"checkout_id": checkout_id, "status": status, "amount": amount, "orders": orders}), 202, \
+        {"Location": url_for('payments.get_checkout', checkout_id=checkout_id)}
+
+@bp.route('/<checkout_id>', methods=['GET'])
+def get_checkout(checkout_id):
+    status = checkout_status(checkout_id)
+    if status is None:
+        return jsonify({"error": "Checkout not found"}), 404
+    return jsonify(status), 200
+
+
+@bp.cli.command('settle-pending')
+@click.option('--older-than', default=300, show_default=True, help="Seconds a checkout must have been pending.")
+def settle_pending_command(older_than):
+    """Charge checkouts whose settlement never finished."""
+    click.echo(f"Retried {settlement.settle_pending(older_than)} checkouts.")
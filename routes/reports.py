@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, request, jsonify
+import analytics
+from pagination import PaginationError, parse_date, parse_int, parse_limit
+from sales import GRANULARITIES, rebuild_rollup, sales_report
+from tenancy import shards
+
+bp = Blueprint('reports', __name__, cli_group='reports')
+
+
+def date_range(args, days=7):
+    """``from``/``to`` query dates as ``[start, end)``; defaults to the last ``days`` days."""
+    start = parse_date(args, 'from')
+    end = parse_date(args, 'to')
+    # 'to' is an inclusive calendar day
+    end = (end or datetime.combine(datetime.now().date(), datetime.min.time())) + timedelta(days=1)
+    return start or end - timedelta(days=days), end
+
+
+def range_body(start, end, **body):
+    return dict({"from": str(start.date()), "to": str((end - timedelta(days=1)).date())}, **body)
+
+# Sales totals per hour or day, read from the precomputed rollup
+@bp.route('/sales', methods=['GET'])
+def get_sales():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity must be 'hour' or 'day'"}), 400
+    try:
+        start, end = date_range(request.args)
+        item_id = parse_int(request.args, 'item_id')
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    buckets = sales_report(start, end, granularity, item_id)
+    return jsonify(range_body(
+        start, end,
+        granularity=granularity,
+        buckets=buckets,
+        total_quantity=sum(b['quantity'] for b in buckets),
+        total_revenue=round(sum(b['revenue'] for b in buckets), 2),
+    )), 200
+
+# Sales of every tenant over the range, queried on all tenant databases at once
+@bp.route('/tenants/sales', methods=['GET'])
+def get_tenant_sales():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity must be 'hour' or 'day'"}), 400
+    try:
+        start, end = date_range(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results, errors = shards.fan_out(lambda: sales_report(start, end, granularity))
+    merged = {}
+    tenants = {}
+    for tenant, buckets in results.items():
+        tenants[tenant] = {"total_quantity": sum(b['quantity'] for b in buckets),
+                           "total_revenue": round(sum(b['revenue'] for b in buckets), 2)}
+        for b in buckets:
+            total = merged.setdefault(b['bucket'], {"bucket": b['bucket'], "quantity": 0, "revenue": 0, "orders": 0})
+            total['quantity'] += b['quantity']
+            total['revenue'] = round(total['revenue'] + b['revenue'], 2)
+            total['orders'] += b['orders']
+    return jsonify(range_body(
+        start, end,
+        granularity=granularity,
+        tenants=tenants,
+        buckets=[merged[bucket] for bucket in sorted(merged)],
+        total_quantity=sum(t['total_quantity'] for t in tenants.values()),
+        total_revenue=round(sum(t['total_revenue'] for t in tenants.values()), 2),
+        errors=errors,
+    )), 200
+
+# Best-selling items over the range, aggregated from order history with pandas
+@bp.route('/top-items', methods=['GET'])
+def get_top_items():
+    try:
+        start, end = date_range(request.args)
+        limit = parse_limit(request.args) if 'limit' in request.args else 10
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(range_body(start, end, items=analytics.top_items(start, end, limit))), 200
+
+# Covers per hour of day across the range
+@bp.route('/hourly-covers', methods=['GET'])
+def get_hourly_covers():
+    try:
+        start, end = date_range(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(range_body(start, end, hours=analytics.hourly_covers(start, end))), 200
+
+# Average covers and party size per weekday; defaults to the last 4 weeks
+@bp.route('/weekday-load', methods=['GET'])
+def get_weekday_load():
+    try:
+        start, end = date_range(request.args, days=28)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(range_body(start, end, weekdays=analytics.weekday_load(start, end))), 200
+
+# Daily no-show rates
+@bp.route('/no-shows', methods=['GET'])
+def get_no_shows():
+    try:
+        start, end = date_range(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(range_body(start, end, days=analytics.no_show_rates(start, end))), 200
+
+
+@bp.cli.command('rebuild-sales')
+def rebuild_sales_command():
+    """Recompute the sales rollup from the order table."""
+    click.echo(f"Rolled up {rebuild_rollup()} orders.")
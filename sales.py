@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from archive import archive
+from models import db, MenuItem, Order, SalesRollup
+
+GRANULARITIES = ('hour', 'day')
+
+
+def bucket_start(when, granularity):
+    if granularity == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    return datetime.combine(when.date(), datetime.min.time())
+
+
+def upsert_statement(dialect):
+    """``INSERT ... ON CONFLICT`` that adds rollup rows onto existing buckets."""
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    statement = insert(SalesRollup)
+    return statement.on_conflict_do_update(
+        index_elements=['granularity', 'bucket', 'item_id'],
+        set_={
+            'quantity': SalesRollup.quantity + statement.excluded.quantity,
+            'revenue': SalesRollup.revenue + statement.excluded.revenue,
+            'order_count': SalesRollup.order_count + statement.excluded.order_count,
+        },
+    )
+
+
+def rollup_rows(lines):
+    """Hourly and daily rollup rows for order lines.
+
+    ``lines`` are dicts with item_id, quantity, unit_price and created_at.
+    Lines sharing a bucket are summed first, so a batch costs one row per
+    (bucket, item) rather than one per line.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for line in lines:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(line['created_at'], granularity), line['item_id'])
+            total = totals[key]
+            total[0] += line['quantity']
+            total[1] += line['quantity'] * (line['unit_price'] or 0)
+            total[2] += 1
+    return [
+        {"granularity": g, "bucket": b, "item_id": i, "quantity": q, "revenue": r, "order_count": n}
+        for (g, b, i), (q, r, n) in totals.items()
+    ]
+
+
+def record_sales(lines):
+    """Add order lines to the hourly and daily rollup in the caller's transaction."""
+    rows = rollup_rows(lines)
+    if rows:
+        db.session.execute(upsert_statement(db.session.get_bind().dialect.name), rows)
+
+
+def rebuild_rollup(chunk_size=5000):
+    """Recompute the rollup from every order, hot or archived, e.g. after a migration or a repair."""
+    db.session.query(SalesRollup).delete()
+    orders = archive.history(Order)
+    # Older orders carry no price; fall back to the current menu price for them
+    price = func.coalesce(orders.c.unit_price, MenuItem.price, 0)
+    rows = db.session.execute(
+        select(orders.c.item_id, orders.c.quantity, price, orders.c.created_at)
+        .outerjoin(MenuItem, MenuItem.id == orders.c.item_id)
+        .execution_options(yield_per=chunk_size)
+    )
+    count = 0
+    for partition in rows.partitions():
+        record_sales([
+            {"item_id": item_id, "quantity": quantity, "unit_price": unit_price, "created_at": created_at}
+            for item_id, quantity, unit_price, created_at in partition
+        ])
+        count += len(partition)
+    db.session.commit()
+    return count
+
+
+def sales_report(start, end, granularity, item_id=None):
+    """Totals per bucket in ``[start, end)`` read from the rollup, O(buckets)."""
+    query = (
+        select(SalesRollup.bucket,
+               func.sum(SalesRollup.quantity),
+               func.sum(SalesRollup.revenue),
+               func.sum(SalesRollup.order_count))
+        .where(SalesRollup.granularity == granularity,
+               SalesRollup.bucket >= start,
+               SalesRollup.bucket < end)
+        .group_by(SalesRollup.bucket)
+        .order_by(SalesRollup.bucket)
+    )
+    if item_id is not None:
+        query = query.where(SalesRollup.item_id == item_id)
+    return [
+        {"bucket": str(bucket), "quantity": quantity, "revenue": round(revenue, 2), "orders": orders}
+        for bucket, quantity, revenue, orders in db.session.execute(query)
+    ]
@@ -0,0 +1,129 @@
+import difflib
+import re
+
+from sqlalchemy import DDL, and_, column, event, func, literal_column, or_, select, table
+
+from models import db, MenuItem
+from serializers import RowSerializer
+
+SEARCH_RESULT = RowSerializer(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.description, MenuItem.tags)
+
+# bm25 weights for the name, description and tags columns
+WEIGHTS = (10.0, 1.0, 4.0)
+FUZZY_CANDIDATES = 50  # Trigram matches re-ranked when a word has no exact or prefix match
+FUZZY_CUTOFF = 0.75  # Lowest similarity each query word needs to some name or tag word
+
+# FTS5 tables of the search index; each also owns shadow tables named <table>_*
+INDEX_TABLES = ('menu_item_fts', 'menu_item_trigram')
+
+# Both indexes use menu_item as external content, so they store no second copy
+# of the text. Triggers keep them in step with every insert, delete and text
+# update; a price-only UPDATE does not touch them.
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS menu_item_fts USING fts5("
+    "name, description, tags, content='menu_item', content_rowid='id', "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    # Every three-character substring, for typo-tolerant candidate lookup
+    "CREATE VIRTUAL TABLE IF NOT EXISTS menu_item_trigram USING fts5("
+    "name, tags, content='menu_item', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_search_insert AFTER INSERT ON menu_item BEGIN
+        INSERT INTO menu_item_fts(rowid, name, description, tags) VALUES (new.id, new.name, new.description, new.tags);
+        INSERT INTO menu_item_trigram(rowid, name, tags) VALUES (new.id, new.name, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_search_delete AFTER DELETE ON menu_item BEGIN
+        INSERT INTO menu_item_fts(menu_item_fts, rowid, name, description, tags)
+            VALUES ('delete', old.id, old.name, old.description, old.tags);
+        INSERT INTO menu_item_trigram(menu_item_trigram, rowid, name, tags) VALUES ('delete', old.id, old.name, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_search_update AFTER UPDATE OF name, description, tags ON menu_item BEGIN
+        INSERT INTO menu_item_fts(menu_item_fts, rowid, name, description, tags)
+            VALUES ('delete', old.id, old.name, old.description, old.tags);
+        INSERT INTO menu_item_trigram(menu_item_trigram, rowid, name, tags) VALUES ('delete', old.id, old.name, old.tags);
+        INSERT INTO menu_item_fts(rowid, name, description, tags) VALUES (new.id, new.name, new.description, new.tags);
+        INSERT INTO menu_item_trigram(rowid, name, tags) VALUES (new.id, new.name, new.tags);
+    END""",
+)
+
+# Just enough of each virtual table to join and MATCH on; the text lives in menu_item
+FTS_INDEX = table('menu_item_fts', column('rowid'))
+TRIGRAM_INDEX = table('menu_item_trigram', column('rowid'))
+
+for statement in FTS_DDL:
+    event.listen(MenuItem.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+# The triggers go with menu_item; the virtual tables have to be dropped by hand
+for index in (FTS_INDEX, TRIGRAM_INDEX):
+    event.listen(MenuItem.__table__, 'before_drop', DDL(f"DROP TABLE IF EXISTS {index.name}").execute_if(dialect='sqlite'))
+
+
+def query_words(q):
+    return re.findall(r'\w+', q.lower())
+
+
+def _match(index, match, weights=()):
+    # MATCH and bm25() take the virtual table's name, which FTS5 exposes as a hidden column
+    hidden = literal_column(index.name)
+    return (select(*SEARCH_RESULT.columns)
+            .select_from(index.join(MenuItem, MenuItem.id == index.c.rowid))
+            .where(hidden.op('MATCH')(match))
+            .order_by(func.bm25(hidden, *weights)))
+
+
+def _fts_search(words, limit):
+    # Every word must match, as a whole token or as the start of one
+    match = " AND ".join(f'"{word}"*' for word in words)
+    return db.session.execute(_match(FTS_INDEX, match, WEIGHTS).limit(limit)).all()
+
+
+def _similarities(words, row):
+    """For each query word, its closest match among the words of the name and tags."""
+    candidates = query_words(f"{row.name} {row.tags or ''}")
+    return [max(difflib.SequenceMatcher(None, word, other).ratio() for other in candidates) for word in words]
+
+
+def _fuzzy_search(words, limit, exclude):
+    trigrams = {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+    if not trigrams:
+        return []
+    match = " OR ".join(f'"{trigram}"' for trigram in sorted(trigrams))
+    rows = db.session.execute(_match(TRIGRAM_INDEX, match).limit(FUZZY_CANDIDATES)).all()
+    scored = []
+    for row in rows:
+        if row.id in exclude:
+            continue
+        similarities = _similarities(words, row)
+        # Every word has to be close to something; one exact word cannot carry a miss
+        if min(similarities) >= FUZZY_CUTOFF:
+            scored.append((sum(similarities) / len(similarities), row))
+    scored.sort(key=lambda pair: -pair[0])
+    return [row for _, row in scored[:limit]]
+
+
+def _like_search(words, limit):
+    # Databases without FTS5: every word must appear in the name, description or tags
+    fields = (MenuItem.name, MenuItem.description, MenuItem.tags)
+    return db.session.execute(
+        select(*SEARCH_RESULT.columns)
+        .where(and_(*(or_(*(field.ilike(f"%{word}%") for field in fields)) for word in words)))
+        .order_by(MenuItem.id)
+        .limit(limit)
+    ).all()
+
+
+def search_menu(q, limit=20):
+    """Menu items matching ``q``, best first.
+
+    Words match whole tokens or prefixes ("chick" finds "Chicken") in the
+    name, description or tags, ranked by bm25 with the name weighted highest.
+    If that leaves room under ``limit``, trigram lookups add close
+    misspellings of name and tag words ("biriyani" finds "Biryani") after the
+    exact hits.
+    """
+    words = query_words(q)
+    if not words:
+        return []
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return SEARCH_RESULT.many(_like_search(words, limit))
+    rows = _fts_search(words, limit)
+    if len(rows) < limit:
+        rows += _fuzzy_search(words, limit - len(rows), {row.id for row in rows})
+    return SEARCH_RESULT.many(rows)
@@ -0,0 +1,84 @@
+"""Row serializers for the read endpoints and an orjson-backed JSON provider.
+
+Read handlers select only the columns they return, so SQLAlchemy hands back
+plain row tuples with no identity map or attribute instrumentation. Each
+``RowSerializer`` holds the column list and key names for one payload,
+worked out once at import time, and turns rows into dicts with a single
+``zip`` per row.
+"""
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+from models import MenuItem, Order, Reservation, RestaurantDetail
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class RowSerializer:
+    def __init__(self, *columns):
+        self.columns = columns
+        self.keys = tuple(column.key for column in columns)
+        # Datetimes are rendered with str(), as the endpoints always have
+        self._dates = tuple(i for i, column in enumerate(columns)
+                            if column.type.python_type in (date, datetime))
+
+    def one(self, row):
+        if self._dates:
+            row = list(row)
+            for i in self._dates:
+                if row[i] is not None:
+                    row[i] = str(row[i])
+        return dict(zip(self.keys, row))
+
+    def many(self, rows):
+        if not self._dates:
+            keys = self.keys
+            return [dict(zip(keys, row)) for row in rows]
+        return [self.one(row) for row in rows]
+
+
+RESERVATION = RowSerializer(Reservation.id, Reservation.user_id, Reservation.datetime,
+                            Reservation.status, Reservation.party_size)
+MENU_ITEM = RowSerializer(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.description, MenuItem.tags)
+ORDER = RowSerializer(Order.id, Order.user_id, Order.item_id, Order.item_name,
+                      Order.quantity, Order.unit_price, Order.created_at, Order.status, Order.version)
+RESTAURANT = RowSerializer(RestaurantDetail.id, RestaurantDetail.name,
+                           RestaurantDetail.location, RestaurantDetail.contact)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's default JSON behaviour, encoded by orjson.
+
+    Datetimes and anything else orjson does not handle natively go through
+    ``DefaultJSONProvider.default``, so responses are byte-for-byte what the
+    stdlib provider would produce apart from whitespace.
+    """
+
+    def _options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def init_json(app):
+    if app.config['JSON_BACKEND'] == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
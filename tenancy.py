@@ -0,0 +1,267 @@
+"""Per-restaurant databases.
+
+Each tenant (one outlet) has its own database, so a write in one outlet never
+waits on another outlet's lock. A request picks its tenant with a
+``/t/<tenant>/...`` URL prefix or the ``X-Tenant`` header. Requests without
+one use the default database, as before. The tenant lives in a context
+variable, and ``RoutingSession`` hands ``db.session`` the tenant's engine.
+Engines are created on first use and at most ``TENANT_ENGINE_LIMIT`` are
+kept open. The least recently used one is disposed of when another is
+needed.
+
+This module does not import models.py, which builds ``db`` with
+``RoutingSession``.
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+from config import engine_options
+from database import apply_sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+PREFIX_ENVIRON_KEY = 'restaurant.tenant'
+TENANT_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+_current = ContextVar('tenant', default=None)
+
+
+def current_tenant():
+    """Tenant of the current request or ``use`` block; None for the default database."""
+    return _current.get()
+
+
+@contextmanager
+def use(tenant):
+    """Route ``db.session`` and the per-tenant caches to ``tenant`` inside the block."""
+    token = _current.set(tenant)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class TenantPrefix:
+    """WSGI middleware moving a ``/t/<tenant>`` path prefix into ``SCRIPT_NAME``.
+
+    The blueprints see their usual paths, and ``url_for`` keeps the prefix in
+    the URLs it builds, such as ``Location`` headers.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        parts = environ.get('PATH_INFO', '').split('/', 3)
+        if len(parts) >= 3 and parts[0] == '' and parts[1] == 't' and parts[2]:
+            environ[PREFIX_ENVIRON_KEY] = parts[2]
+            environ['SCRIPT_NAME'] = f"{environ.get('SCRIPT_NAME', '')}/t/{parts[2]}"
+            environ['PATH_INFO'] = '/' + (parts[3] if len(parts) > 3 else '')
+        return self.wsgi_app(environ, start_response)
+
+
+class ShardRouter:
+    """Finds, opens and caps the per-tenant database engines.
+
+    ``TENANTS`` lists the tenants served. ``TENANT_DATABASE_URL`` is a
+    template such as ``sqlite:///tenants/{tenant}.db``. Relative SQLite paths
+    resolve against the instance folder, as the default database's do. Each
+    engine gets the same pool options and SQLite pragmas as the default one,
+    plus whatever ``engine_hooks`` add.
+    """
+
+    def __init__(self):
+        self.tenants = ()
+        self.url_template = None
+        self.limit = 16
+        self.header = 'X-Tenant'
+        self.fanout_workers = 8
+        self.engine_hooks = {}  # name -> callable(engine), run on every new tenant engine
+        self._pragmas = None
+        self._instance_path = None
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        self.tenants = tuple(app.config['TENANTS'])
+        for tenant in self.tenants:
+            if not TENANT_ID.match(tenant):
+                raise ValueError(f"Invalid tenant id {tenant!r}")
+        self.url_template = app.config['TENANT_DATABASE_URL']
+        self.limit = app.config['TENANT_ENGINE_LIMIT']
+        self.header = app.config['TENANT_HEADER']
+        self.fanout_workers = app.config['TENANT_FANOUT_WORKERS']
+        self._pragmas = app.config.get('SQLITE_PRAGMAS')
+        self._instance_path = app.instance_path
+        self.dispose()
+        app.wsgi_app = TenantPrefix(app.wsgi_app)
+        app.before_request(self._select_tenant)
+        app.teardown_request(self._clear_tenant)
+        app.extensions['shards'] = self
+
+    def _select_tenant(self):
+        tenant = request.environ.get(PREFIX_ENVIRON_KEY) or request.headers.get(self.header)
+        if tenant is not None and tenant not in self.tenants:
+            return jsonify({"error": "Unknown tenant"}), 404
+        _current.set(tenant)
+
+    def _clear_tenant(self, exc):
+        _current.set(None)
+
+    def url(self, tenant):
+        url = make_url(self.url_template.format(tenant=tenant))
+        if url.drivername.startswith('sqlite') and url.database and url.database != ':memory:' \
+                and not os.path.isabs(url.database):
+            path = os.path.join(self._instance_path, url.database)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            url = url.set(database=path)
+        return url
+
+    def engine(self, tenant):
+        """The tenant's engine, created on first use; evicts the least recently used past the limit."""
+        with self._lock:
+            engine = self._engines.get(tenant)
+            if engine is not None:
+                self._engines.move_to_end(tenant)
+                return engine
+            url = self.url(tenant)
+            engine = create_engine(url, **engine_options(url.render_as_string(hide_password=False)))
+            apply_sqlite_pragmas(engine, self._pragmas)
+            for hook in self.engine_hooks.values():
+                hook(engine)
+            self._engines[tenant] = engine
+            if len(self._engines) > self.limit:
+                # Connections checked out by requests in flight are closed when they are returned
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+
+    def open_engines(self):
+        with self._lock:
+            return list(self._engines)
+
+    def dispose(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.fanout_workers, thread_name_prefix='fanout')
+        return self._executor
+
+    def fan_out(self, fn, tenants=None):
+        """Call ``fn()`` once per tenant, in parallel, each with its own app context and session.
+
+        Returns ``(results, errors)``: dicts keyed by tenant, holding what
+        ``fn`` returned or the message of what it raised.
+        """
+        app = current_app._get_current_object()
+
+        def run(tenant):
+            with app.app_context(), use(tenant):
+                return fn()
+
+        futures = {tenant: self._pool().submit(run, tenant) for tenant in (self.tenants if tenants is None else tenants)}
+        results, errors = {}, {}
+        for tenant, future in futures.items():
+            try:
+                results[tenant] = future.result()
+            except Exception as e:
+                logger.exception("Fan-out query failed for tenant %s", tenant)
+                errors[tenant] = str(e)
+        return results, errors
+
+
+shards = ShardRouter()
+
+
+class RoutingSession(Session):
+    """``db.session`` that talks to the current tenant's database, if there is one.
+
+    The tenant's engine is pinned in ``session.info`` until the session's
+    transaction ends. If the engine is evicted between two statements, the
+    second one still runs on the transaction's connection instead of opening
+    another on a new engine, which on SQLite could wait on its own write lock.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        tenant = _current.get()
+        if bind is None and tenant is not None:
+            pinned = self.info.get('tenant_engine')
+            if pinned is None or pinned[0] != tenant:
+                pinned = self.info['tenant_engine'] = (tenant, shards.engine(tenant))
+            return pinned[1]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _unpin_engine(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('tenant_engine', None)
+
+
+class PerTenant:
+    """Stands in for a per-process singleton, keeping one instance per tenant.
+
+    ``factory(tenant)`` builds an instance; ``tenant`` is None for the
+    default database. Attribute access goes to the current tenant's
+    instance, so callers keep using the singleton as before. ``init_app``
+    sets up the default instance and forgets the tenant ones. Each tenant
+    instance is set up from the same app the first time that tenant is seen.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_default', factory(None))
+        object.__setattr__(self, '_tenants', {})
+        object.__setattr__(self, '_app', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def init_app(self, app):
+        object.__setattr__(self, '_app', app)
+        self._tenants.clear()
+        self._default.init_app(app)
+        self._register(app, self._default)
+
+    def _register(self, app, instance):
+        # Keep app.extensions pointing at the proxy, not at whichever instance was set up last
+        for key, value in list(app.extensions.items()):
+            if value is instance:
+                app.extensions[key] = self
+
+    def _current(self):
+        tenant = _current.get()
+        if tenant is None:
+            return self._default
+        instance = self._tenants.get(tenant)
+        if instance is None:
+            with self._lock:
+                instance = self._tenants.get(tenant)
+                if instance is None:
+                    instance = self._factory(tenant)
+                    instance.init_app(self._app)
+                    self._register(self._app, instance)
+                    self._tenants[tenant] = instance
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._current(), name, value)
@@ -1,21 +1,55 @@
+import fcntl
+import hashlib
+import json
+import threading
+import time
 import unittest
-from app import app, db, Reservation
-from datetime import datetime
+from app import create_app
+from models import db, IdempotencyKey, MenuItem, Order, Payment, Reservation, SalesRollup, User
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from cache import LocalBackend, MenuCache, menu_cache
+from config import Config, ProductionConfig, TestingConfig, database_url
+from database import apply_sqlite_pragmas
+from hashing import HasherBusy, PasswordHasher, password_hasher
+from availability import availability
+from kitchen import kitchen_feed, kitchen_streams
+from sales import rebuild_rollup
+from serializers import RESERVATION, OrjsonProvider
+from metrics import request_metrics
+from idempotency import idempotency
+from journal import order_journal
+from payments import FakeGateway, settlement
+from archive import archive
+from tenancy import shards, use
+from flask import jsonify
+from flask.json.provider import DefaultJSONProvider
+from asgi import create_asgi_app
+from starlette.testclient import TestClient
+import bcrypt
+import os
+import tempfile
 
-class ReservationTestCase(unittest.TestCase):
+app = create_app('testing')  # In-memory SQLite database
+
+class AppTestCase(unittest.TestCase):
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # In-memory SQLite database
         self.app = app.test_client()
         self.ctx = app.app_context()
         self.ctx.push()
-        # db.create_all()  # Create all tables before each test
+        db.create_all()  # Create all tables before each test
+        menu_cache.invalidate()
+        availability.reset()
+        kitchen_feed.reset()
 
     def tearDown(self):
         db.session.remove()
-        # db.drop_all()  # Drop all tables after each test
+        db.drop_all()  # Drop all tables after each test
         self.ctx.pop()  # Pop the context after each test
 
+class ReservationTestCase(AppTestCase):
+
     def test_create_reservation(self):
         reservation_data = {
             "user_id": 1,
@@ -75,5 +109,1281 @@ class ReservationTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn('Reservation not found', response.json['message'])
 
+class ListingPaginationTestCase(AppTestCase):
+    def test_reservations_keyset_pagination(self):
+        user_id = 424242
+        for day in ("2024-11-26", "2024-11-27", "2024-11-28"):
+            self.app.post('/reservations', json={"user_id": user_id, "datetime": day})
+
+        first = self.app.get(f'/reservations?user_id={user_id}&limit=2').json
+        self.assertEqual(len(first['items']), 2)
+        self.assertIsNotNone(first['next_cursor'])
+
+        second = self.app.get(f'/reservations?user_id={user_id}&limit=2&after={first["next_cursor"]}').json
+        self.assertEqual(len(second['items']), 1)
+        self.assertIsNone(second['next_cursor'])
+        ids = [r['id'] for r in first['items'] + second['items']]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_reservations_date_range_filter(self):
+        user_id = 434343
+        for day in ("2024-11-26", "2024-11-27", "2024-11-28"):
+            self.app.post('/reservations', json={"user_id": user_id, "datetime": day})
+
+        response = self.app.get(f'/reservations?user_id={user_id}&from=2024-11-27&to=2024-11-27')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['datetime'] for r in response.json['items']], ["2024-11-27 00:00:00"])
+
+    def test_listing_rejects_bad_parameters(self):
+        self.assertEqual(self.app.get('/reservations?limit=abc').status_code, 400)
+        self.assertEqual(self.app.get('/reservations?from=2024-13-01').status_code, 400)
+        self.assertEqual(self.app.get('/order/view?after=x').status_code, 400)
+
+class StreamingExportTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in ("2024-11-26", "2024-11-27"):
+            self.app.post('/reservations', json={"user_id": 454545, "datetime": day})
+
+    def test_reservations_ndjson(self):
+        response = self.app.get('/reservations?user_id=454545&format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([r['datetime'] for r in rows], ["2024-11-26 00:00:00", "2024-11-27 00:00:00"])
+
+    def test_reservations_csv(self):
+        response = self.app.get('/reservations?user_id=454545&format=csv')
+        self.assertEqual(response.mimetype, 'text/csv')
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[0], 'id,user_id,datetime,status,party_size')
+        self.assertEqual(len(lines), 3)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.app.get('/menu?format=xml').status_code, 400)
+
+class MenuCacheTestCase(AppTestCase):
+
+    def test_if_none_match_skips_database(self):
+        etag = self.app.get('/menu').headers['ETag']
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.app.get('/menu', headers={'If-None-Match': etag})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(statements, [])
+
+    def test_menu_write_invalidates_cache(self):
+        before = self.app.get('/menu')
+        db.session.add(MenuItem(name='Cache Test Soup', price=120.0))
+        db.session.commit()
+        after = self.app.get('/menu')
+        self.assertNotEqual(before.headers['ETag'], after.headers['ETag'])
+        self.assertIn('Cache Test Soup', [m['name'] for m in after.json])
+
+    def test_shared_backend_invalidation_reaches_every_worker(self):
+        backend = LocalBackend()
+        worker_a, worker_b = MenuCache(backend=backend), MenuCache(backend=backend)
+        self.assertEqual(worker_a.get(lambda: '[1]'), worker_b.get(lambda: '[2]'))
+        worker_a.invalidate()
+        self.assertEqual(worker_b.get(lambda: '[2]')[1], b'[2]')
+
+    def test_invalidation_during_rebuild_is_not_lost(self):
+        for cache in (MenuCache(), MenuCache(backend=LocalBackend())):
+            def stale_loader():
+                # Rows read, then a menu write commits before the body is stored
+                cache.invalidate()
+                return '[old]'
+            self.assertEqual(cache.get(stale_loader)[1], b'[old]')
+            self.assertEqual(cache.get(lambda: '[new]')[1], b'[new]')
+
+class OrderBatchTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = MenuItem(name='Batch Test Curry', price=250.0)
+        db.session.add(self.item)
+        db.session.commit()
+
+    def test_single_orders_are_validated_like_batch_lines(self):
+        for path in ('/order', '/customers/order'):
+            for quantity in ("2", -3, 0, None):
+                response = self.app.post(path, json={"user_id": 1, "item_id": self.item.id, "quantity": quantity})
+                self.assertEqual(response.status_code, 400, (path, quantity))
+        self.assertEqual(Order.query.count(), 0)
+        self.assertEqual(SalesRollup.query.count(), 0)
+
+    def test_batch_commits_once_with_per_line_results(self):
+        commits = []
+        listener = lambda conn: commits.append(conn)
+        event.listen(db.engine, 'commit', listener)
+        try:
+            response = self.app.post('/order/batch', json={"user_id": 464646, "items": [
+                {"item_id": self.item.id, "quantity": 2},
+                {"item_id": 987654, "quantity": 1},
+                {"item_id": self.item.id, "quantity": 0},
+                {"item_id": self.item.id},
+            ]})
+        finally:
+            event.remove(db.engine, 'commit', listener)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(commits), 1)
+        statuses = [r['status'] for r in response.json['results']]
+        self.assertEqual(statuses, ['created', 'rejected', 'rejected', 'created'])
+        self.assertEqual(response.json['results'][1]['error'], 'Menu item not found')
+        orders = Order.query.filter_by(user_id=464646).order_by(Order.id).all()
+        self.assertEqual([o.id for o in orders], [r['order_id'] for r in response.json['results'] if 'order_id' in r])
+        self.assertEqual({o.item_name for o in orders}, {'Batch Test Curry'})
+
+    def test_batch_with_no_valid_lines(self):
+        response = self.app.post('/order/batch', json={"user_id": 464646, "items": [{"item_id": 987654}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.post('/order/batch', json={"items": []}).status_code, 400)
+
+class EngineProfileTestCase(unittest.TestCase):
+    def test_sqlite_pragmas_applied_on_connect(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'profile.db')}")
+            apply_sqlite_pragmas(engine, Config.SQLITE_PRAGMAS)
+            with engine.connect() as conn:
+                self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), 'wal')
+                self.assertEqual(conn.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+                self.assertEqual(conn.execute(text("PRAGMA busy_timeout")).scalar(),
+                                 Config.SQLITE_PRAGMAS['busy_timeout'])
+            engine.dispose()
+
+    def test_database_url_from_environment(self):
+        old = os.environ.get('DATABASE_URL')
+        os.environ['DATABASE_URL'] = 'postgres://user:pw@db.example.com/restaurant'
+        try:
+            self.assertEqual(database_url(), 'postgresql://user:pw@db.example.com/restaurant')
+        finally:
+            if old is None:
+                del os.environ['DATABASE_URL']
+            else:
+                os.environ['DATABASE_URL'] = old
+
+class PasswordHashingTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hasher = PasswordHasher()
+        self.hasher.rounds, self.hasher.workers, self.hasher.queue_limit = 4, 1, 0
+        self.hasher._slots = threading.BoundedSemaphore(1)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+        super().tearDown()
+
+    def test_pool_hash_verifies(self):
+        hashed = self.hasher.hash('s3cret')
+        self.assertTrue(bcrypt.checkpw(b's3cret', hashed.encode()))
+        self.assertTrue(hashed.startswith('$2b$04$'))
+
+    def test_timed_out_hash_keeps_its_slot_until_done(self):
+        self.hasher.rounds, self.hasher.timeout = 12, 0.01
+        with self.assertRaises(HasherBusy):
+            self.hasher.hash('s3cret')
+        # The first hash is still running in the pool
+        with self.assertRaises(HasherBusy):
+            self.hasher.hash('s3cret')
+        self.hasher.shutdown()
+
+    def test_saturated_pool_rejects_immediately(self):
+        self.hasher._slots.acquire()
+        try:
+            with self.assertRaises(HasherBusy):
+                self.hasher.hash('s3cret')
+        finally:
+            self.hasher._slots.release()
+
+    def test_create_user_returns_429_when_saturated(self):
+        slots = password_hasher.workers + password_hasher.queue_limit
+        for _ in range(slots):
+            password_hasher._slots.acquire()
+        try:
+            response = self.app.post('/users', json={"username": "hashing-test-user", "password": "pw"})
+        finally:
+            for _ in range(slots):
+                password_hasher._slots.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertIsNone(User.query.filter_by(username='hashing-test-user').first())
+
+class AvailabilityTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved = (availability.slot_minutes, availability.opening, availability.closing, availability.capacity)
+        availability.slot_minutes, availability.opening, availability.closing = 120, 18 * 60, 22 * 60
+        availability.capacity = 6
+
+    def tearDown(self):
+        availability.slot_minutes, availability.opening, availability.closing, availability.capacity = self.saved
+        super().tearDown()
+
+    def book(self, when, party_size):
+        return self.app.post('/reservations', json={"user_id": 1, "datetime": when, "party_size": party_size})
+
+    def slots(self, day="2024-11-26"):
+        return {s['start'][11:16]: s['available']
+                for s in self.app.get(f'/reservations/availability?date={day}').json['slots']}
+
+    def test_availability_tracks_bookings(self):
+        self.assertEqual(self.slots(), {"18:00": 6, "20:00": 6})
+        self.assertEqual(self.book("2024-11-26 18:30", 4).status_code, 201)
+        self.assertEqual(self.slots(), {"18:00": 2, "20:00": 6})
+
+    def test_full_slot_rejects_booking(self):
+        self.book("2024-11-26 18:00", 4)
+        response = self.book("2024-11-26 19:00", 3)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Reservation.query.count(), 1)
+
+    def test_outside_service_hours(self):
+        self.assertEqual(self.book("2024-11-26 12:00", 2).status_code, 400)
+
+    def test_modify_and_cancel_release_covers(self):
+        reservation_id = self.book("2024-11-26 18:00", 4).json['reservation_id']
+        self.app.put(f'/reservations/{reservation_id}', json={"datetime": "2024-11-26 20:00"})
+        self.assertEqual(self.slots(), {"18:00": 6, "20:00": 2})
+        self.app.put(f'/reservations/{reservation_id}', json={"status": "canceled"})
+        self.assertEqual(self.slots(), {"18:00": 6, "20:00": 6})
+        self.app.put(f'/reservations/{reservation_id}', json={"status": "confirmed"})
+        self.app.delete(f'/reservations/{reservation_id}')
+        self.assertEqual(self.slots(), {"18:00": 6, "20:00": 6})
+
+    def test_party_size_must_be_a_positive_integer(self):
+        for path in ('/reservations', '/customers/reservations'):
+            for party_size in (-500, 0, "many", 2.5):
+                response = self.app.post(path, json={"user_id": 1, "datetime": "2024-11-26 18:00",
+                                                     "party_size": party_size})
+                self.assertEqual(response.status_code, 400, (path, party_size))
+        self.assertEqual(Reservation.query.count(), 0)
+
+        # PUT accepts and rejects the same values as POST
+        reservation_id = self.book("2024-11-26 18:00", 2).json['reservation_id']
+        self.assertEqual(self.app.put(f'/reservations/{reservation_id}', json={"party_size": True}).status_code, 400)
+        self.assertEqual(self.app.put(f'/reservations/{reservation_id}', json={"party_size": "3"}).status_code, 200)
+        self.assertEqual(db.session.get(Reservation, reservation_id).party_size, 3)
+
+    def test_rows_outside_service_hours_can_be_moved_and_canceled(self):
+        # Date-only bookings made before service hours were configured
+        legacy = [Reservation(user_id=1, datetime=datetime(2024, 11, 26), status='confirmed', party_size=2)
+                  for _ in range(2)]
+        db.session.add_all(legacy)
+        db.session.commit()
+        self.assertEqual(self.slots(), {"18:00": 6, "20:00": 6})
+        response = self.app.put(f'/customers/reservations/{legacy[0].id}', json={"datetime": "2024-11-26 18:00"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.app.delete(f'/customers/reservations/{legacy[1].id}').status_code, 200)
+        self.assertEqual(self.slots(), {"18:00": 4, "20:00": 6})
+
+    def test_index_rebuilt_from_table(self):
+        db.session.add(Reservation(user_id=1, datetime=datetime(2024, 11, 26, 20, 15),
+                                   status='confirmed', party_size=5))
+        db.session.commit()
+        availability.reset()
+        self.assertEqual(self.slots(), {"18:00": 6, "20:00": 1})
+        self.assertEqual(self.book("2024-11-26 21:00", 2).status_code, 409)
+
+    def test_status_and_size_edits_of_rows_outside_service_hours(self):
+        legacy = Reservation(user_id=1, datetime=datetime(2024, 11, 26), status='confirmed', party_size=2)
+        db.session.add(legacy)
+        db.session.commit()
+        for change in ({"status": "pending"}, {"party_size": 3}):
+            self.assertEqual(self.app.put(f'/reservations/{legacy.id}', json=change).status_code, 200, change)
+        self.assertEqual((legacy.status, legacy.party_size), ('pending', 3))
+
+    def test_concurrent_bookings_cannot_overbook(self):
+        # A file database, so each thread books on its own connection and only the
+        # guarded INSERT, not the in-process index lock, stands between them
+        with tempfile.TemporaryDirectory() as tmp:
+            class FileConfig(TestingConfig):
+                SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bookings.db')}"
+
+            file_app = create_app(FileConfig)
+            try:
+                with file_app.app_context():
+                    db.create_all()
+                availability.capacity = 6
+                start = threading.Barrier(8)
+
+                def attempt():
+                    with file_app.app_context():
+                        start.wait()
+                        codes.append(file_app.test_client().post('/reservations', json={
+                            "user_id": 1, "datetime": "2024-11-26 18:00", "party_size": 2}).status_code)
+
+                codes = []
+                threads = [threading.Thread(target=attempt) for _ in range(8)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                with file_app.app_context():
+                    covers = db.session.scalar(select(func.sum(Reservation.party_size)))
+                    db.engine.dispose()
+            finally:
+                availability.init_app(app)
+        self.assertEqual(codes.count(201), 3)
+        self.assertEqual(codes.count(409), 5)
+        self.assertEqual(covers, 6)
+
+class KitchenFeedTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = MenuItem(name='Kitchen Test Dal', price=150.0)
+        db.session.add(self.item)
+        db.session.commit()
+
+    def place(self, quantity=1):
+        return self.app.post('/order', json={"user_id": 7, "item_id": self.item.id,
+                                             "item_name": self.item.name, "quantity": quantity})
+
+    def test_long_poll_returns_only_new_orders(self):
+        self.place()
+        first = self.app.get('/kitchen/orders?since=0&timeout=0').json
+        self.assertEqual(len(first['events']), 1)
+        self.place(quantity=3)
+        second = self.app.get(f'/kitchen/orders?since={first["last_seq"]}&timeout=0').json
+        self.assertEqual([e['order']['quantity'] for e in second['events']], [3])
+
+    def test_long_poll_wakes_on_new_order(self):
+        last_seq = self.app.get('/kitchen/orders?since=0&timeout=0').json['last_seq']
+
+        def place_later():
+            time.sleep(0.1)
+            with app.app_context():
+                self.place(quantity=2)
+
+        writer = threading.Thread(target=place_later)
+        writer.start()
+        start = time.monotonic()
+        response = self.app.get(f'/kitchen/orders?since={last_seq}&timeout=5').json
+        writer.join()
+        self.assertEqual(len(response['events']), 1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_orders_from_other_workers_are_picked_up(self):
+        self.app.get('/kitchen/orders?since=0&timeout=0')
+        # Inserted without notify(), as another worker process would
+        db.session.add(Order(user_id=8, item_id=self.item.id, item_name=self.item.name, quantity=1))
+        db.session.commit()
+        events = self.app.get('/kitchen/orders?since=0&timeout=2').json['events']
+        self.assertEqual([e['order']['user_id'] for e in events], [8])
+
+    def test_sse_stream_resumes_from_last_event_id(self):
+        self.place()
+        self.place(quantity=4)
+        first_seq = Order.query.order_by(Order.id).first().id
+        response = self.app.get('/kitchen/stream', headers={'Last-Event-ID': str(first_seq)})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = response.iter_encoded()
+        body = ''
+        while 'data:' not in body:
+            body += next(chunks).decode()
+        response.close()
+        self.assertIn(f"id: {first_seq + 1}", body)
+        self.assertIn('"quantity": 4', body)
+
+    def test_failed_notify_does_not_fail_a_committed_order(self):
+        self.app.get('/kitchen/orders?since=0&timeout=0')
+        feed = kitchen_feed._current()
+
+        def locked():
+            raise OperationalError("SELECT", {}, Exception("database is locked"))
+
+        feed.sync = locked
+        try:
+            headers = {"Idempotency-Key": "notify-fails"}
+            first = self.app.post('/order', headers=headers, json={"user_id": 7, "item_id": self.item.id, "quantity": 1})
+            retry = self.app.post('/order', headers=headers, json={"user_id": 7, "item_id": self.item.id, "quantity": 1})
+        finally:
+            del feed.sync
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(Order.query.count(), 1)
+
+    def test_feed_is_refused_outside_sqlite(self):
+        # PostgreSQL ids are not handed out in commit order, so the feed could skip orders
+        dialect = db.engine.dialect
+        dialect.name = 'postgresql'
+        try:
+            self.assertEqual(self.app.get('/kitchen/orders?since=0&timeout=0').status_code, 501)
+            self.assertEqual(self.app.get('/kitchen/stream').status_code, 501)
+        finally:
+            del dialect.name
+
+    def test_sse_streams_are_capped_and_end(self):
+        self.place()
+        app.config['KITCHEN_STREAM_DURATION'] = 0
+        try:
+            for _ in range(kitchen_streams.limit):
+                self.assertTrue(kitchen_streams.acquire())
+            self.assertEqual(self.app.get('/kitchen/stream').status_code, 503)
+            # A waiting long-poll needs a slot too; a non-blocking poll does not
+            full = self.app.get('/kitchen/orders?since=0&timeout=1')
+            self.assertEqual((full.status_code, full.headers['Retry-After']), (503, '5'))
+            self.assertEqual(len(self.app.get('/kitchen/orders?since=0&timeout=0').json['events']), 1)
+            kitchen_streams.release()
+            # Ends at once with no events; the screen reconnects with Last-Event-ID
+            response = self.app.get('/kitchen/stream?since=0')
+            self.assertEqual(response.get_data(as_text=True), "retry: 2000\n\n")
+            response.close()
+            self.assertTrue(kitchen_streams.acquire())
+        finally:
+            app.config['KITCHEN_STREAM_DURATION'] = TestingConfig.KITCHEN_STREAM_DURATION
+            kitchen_streams.init_app(app)
+
+class SalesRollupTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.naan = MenuItem(name='Naan', price=40.0)
+        self.thali = MenuItem(name='Thali', price=300.0)
+        db.session.add_all([self.naan, self.thali])
+        db.session.commit()
+
+    def report(self, **params):
+        query = '&'.join(f"{k}={v}" for k, v in params.items())
+        return self.app.get(f'/reports/sales?{query}')
+
+    def test_orders_update_rollup_in_same_transaction(self):
+        self.app.post('/order', json={"user_id": 1, "item_id": self.naan.id, "quantity": 3})
+        self.app.post('/order/batch', json={"user_id": 2, "items": [
+            {"item_id": self.naan.id, "quantity": 1}, {"item_id": self.thali.id, "quantity": 2}]})
+        today = str(datetime.now().date())
+
+        body = self.report(**{"from": today, "to": today}).json
+        self.assertEqual(len(body['buckets']), 1)
+        self.assertEqual(body['total_quantity'], 6)
+        self.assertEqual(body['total_revenue'], 4 * 40.0 + 2 * 300.0)
+
+        hourly = self.report(**{"from": today, "to": today, "granularity": "hour", "item_id": self.naan.id}).json
+        self.assertEqual(sum(b['quantity'] for b in hourly['buckets']), 4)
+
+    def test_price_is_captured_at_order_time(self):
+        self.app.post('/order', json={"user_id": 1, "item_id": self.thali.id, "quantity": 1})
+        self.thali.price = 350.0
+        db.session.commit()
+        self.app.post('/order', json={"user_id": 1, "item_id": self.thali.id, "quantity": 1})
+        self.assertEqual(sorted(o.unit_price for o in Order.query.all()), [300.0, 350.0])
+        today = str(datetime.now().date())
+        self.assertEqual(self.report(**{"from": today, "to": today}).json['total_revenue'], 650.0)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.app.post('/order', json={"user_id": 1, "item_id": self.naan.id, "quantity": 2})
+        self.app.post('/order', json={"user_id": 1, "item_id": self.thali.id, "quantity": 1})
+        snapshot = lambda: sorted((r.granularity, r.bucket, r.item_id, r.quantity, r.revenue, r.order_count)
+                                  for r in SalesRollup.query.all())
+        incremental = snapshot()
+        self.assertEqual(rebuild_rollup(), 2)
+        self.assertEqual(snapshot(), incremental)
+
+    def test_bad_granularity(self):
+        self.assertEqual(self.report(granularity='week').status_code, 400)
+        self.assertEqual(self.app.post('/order', json={"user_id": 1, "item_id": 999, "quantity": 1}).status_code, 404)
+
+class AnalyticsReportTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        naan = MenuItem(name='Naan', price=40.0)
+        thali = MenuItem(name='Thali', price=300.0)
+        db.session.add_all([naan, thali])
+        db.session.commit()
+        self.app.post('/order/batch', json={"user_id": 1, "items": [
+            {"item_id": naan.id, "quantity": 5}, {"item_id": thali.id, "quantity": 1},
+            {"item_id": thali.id, "quantity": 2}]})
+        # Monday 2024-01-01 and Monday 2024-01-08
+        db.session.add_all([
+            Reservation(user_id=1, datetime=datetime(2024, 1, 1, 19, 0), party_size=4, status='confirmed'),
+            Reservation(user_id=2, datetime=datetime(2024, 1, 1, 19, 30), party_size=2, status='no_show'),
+            Reservation(user_id=3, datetime=datetime(2024, 1, 1, 20, 0), party_size=6, status='canceled'),
+            Reservation(user_id=4, datetime=datetime(2024, 1, 8, 12, 0), party_size=2, status='confirmed'),
+        ])
+        db.session.commit()
+        self.range = 'from=2024-01-01&to=2024-01-08'
+
+    def test_top_items(self):
+        today = str(datetime.now().date())
+        items = self.app.get(f'/reports/top-items?from={today}&to={today}&limit=1').json['items']
+        self.assertEqual(items, [{"item_id": 1, "name": "Naan", "quantity": 5, "revenue": 200.0, "orders": 1}])
+
+    def test_hourly_covers_skip_canceled(self):
+        hours = self.app.get(f'/reports/hourly-covers?{self.range}').json['hours']
+        self.assertEqual(hours, [{"hour": 12, "covers": 2, "reservations": 1},
+                                 {"hour": 19, "covers": 6, "reservations": 2}])
+
+    def test_weekday_load_and_no_shows(self):
+        weekdays = self.app.get(f'/reports/weekday-load?{self.range}').json['weekdays']
+        self.assertEqual(weekdays, [{"weekday": "Monday", "avg_covers": 4.0, "avg_party_size": 2.67, "days": 2}])
+        days = self.app.get(f'/reports/no-shows?{self.range}').json['days']
+        self.assertEqual(days[0], {"date": "2024-01-01", "reservations": 2, "no_shows": 1, "rate": 0.5})
+
+    def test_empty_range(self):
+        response = self.app.get('/reports/hourly-covers?from=2020-01-01&to=2020-01-02')
+        self.assertEqual(response.json['hours'], [])
+        self.assertEqual(self.app.get('/reports/no-shows?from=nope').status_code, 400)
+
+class SerializationTestCase(AppTestCase):
+    def tearDown(self):
+        app.json = OrjsonProvider(app)
+        super().tearDown()
+
+    def test_orjson_provider_is_installed(self):
+        self.assertIsInstance(app.json, OrjsonProvider)
+
+    def test_matches_stdlib_provider(self):
+        db.session.add(MenuItem(name='Dosa', price=80.0))
+        db.session.add(Reservation(user_id=1, datetime=datetime(2024, 5, 1, 19, 30), party_size=3, status='confirmed'))
+        db.session.commit()
+        payload = {"at": datetime(2024, 5, 1, 19, 30), "nested": [1.5, None, True]}
+
+        fast = self.app.get('/reservations').json, self.app.get('/menu').json, app.json.dumps(payload)
+        app.json = DefaultJSONProvider(app)
+        menu_cache.invalidate()
+        slow = self.app.get('/reservations').json, self.app.get('/menu').json, app.json.dumps(payload)
+        self.assertEqual(fast[:2], slow[:2])
+        self.assertEqual(json.loads(fast[2]), json.loads(slow[2]))
+        self.assertEqual(fast[0]['items'][0]['datetime'], '2024-05-01 19:30:00')
+
+    def test_row_serializer(self):
+        row = (1, 2, datetime(2024, 5, 1, 19, 30), 'confirmed', 4)
+        self.assertEqual(RESERVATION.many([row]), [{"id": 1, "user_id": 2, "datetime": "2024-05-01 19:30:00",
+                                                    "status": "confirmed", "party_size": 4}])
+
+class MetricsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        request_metrics.reset()
+
+    def tearDown(self):
+        request_metrics.sample_rate = app.config['METRICS_SQL_SAMPLE_RATE']
+        request_metrics.n_plus_one_threshold = app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+        super().tearDown()
+
+    def scrape(self):
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return response.get_data(as_text=True)
+
+    def test_latency_and_sql_per_endpoint(self):
+        request_metrics.sample_rate = 0
+        self.app.get('/menu')
+        self.app.get('/menu')
+        self.app.get('/customers/reservations/1')
+        body = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{endpoint="api.get_menu",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="api.get_menu",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_responses_total{endpoint="customers.view_reservations",method="GET",status="404"} 1', body)
+        # The menu is cached after the first request, so two requests run one query
+        self.assertIn('sql_statements_total{endpoint="api.get_menu"} 1', body)
+        self.assertIn('sql_sampled_requests_total 0', body)
+        self.assertNotIn('sql_statement_calls_total{', body)
+
+    def test_failed_statement_leaves_no_start_time(self):
+        with app.test_request_context('/menu'):
+            request_metrics._start()
+            with db.engine.connect() as conn:
+                for _ in range(3):
+                    with self.assertRaises(OperationalError):
+                        conn.execute(text("SELECT * FROM no_such_table"))
+                    conn.rollback()
+                self.assertEqual(conn.info.get('metrics_start'), [])
+            request_metrics._clear()
+
+    def test_off_by_default_in_production(self):
+        self.assertTrue(Config.METRICS_ENABLED)
+        self.assertFalse(ProductionConfig.METRICS_ENABLED)
+
+    def test_sampled_capture(self):
+        request_metrics.sample_rate = 1
+        request_metrics.n_plus_one_threshold = 2
+        db.session.add_all([MenuItem(name='Idli', price=30.0), MenuItem(name='Vada', price=35.0)])
+        db.session.commit()
+        self.app.post('/order/batch', json={"user_id": 1, "items": [{"item_id": 1}, {"item_id": 2}]})
+        for item_id in (1, 2):
+            self.app.post('/order', json={"user_id": 1, "item_id": item_id, "quantity": 1})
+        self.app.put('/reservations/1', json={"status": "confirmed"})
+        body = self.scrape()
+        self.assertIn('sql_sampled_requests_total 4', body)
+        # The two single-order lookups load the same columns and share one label
+        self.assertRegex(body, r'sql_statement_calls_total\{statement="SELECT menu_item.id AS menu_item_id, '
+                               r'menu_item.name AS menu_item_name, menu_item.price AS menu_item_price, menu_item.des.*"\} 2')
+        # The batch inserts every line with one statement, so nothing repeats
+        self.assertNotIn('sql_n_plus_one_total{', body)
+
+    def test_n_plus_one_flagged(self):
+        request_metrics.n_plus_one_threshold = 1
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            self.app.get('/order/view')
+        self.assertIn('Possible N+1 in api.view_order', logs.output[0])
+        self.assertRegex(self.scrape(), r'sql_n_plus_one_total\{endpoint="api.view_order",statement="SELECT .*"\} 1')
+
+class IdempotencyTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add(MenuItem(name='Biryani', price=250.0))
+        db.session.commit()
+        self.order = {"user_id": 1, "item_id": 1, "quantity": 2}
+
+    def tearDown(self):
+        idempotency.ttl = app.config['IDEMPOTENCY_TTL']
+        super().tearDown()
+
+    def post(self, path, body, key):
+        return self.app.post(path, json=body, headers={"Idempotency-Key": key})
+
+    def test_retry_replays_without_second_order(self):
+        first = self.post('/order', self.order, 'order-1')
+        retry = self.post('/order', self.order, 'order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json), (201, first.json))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.query.count(), 1)
+        self.assertEqual(SalesRollup.query.filter_by(granularity='day').one().quantity, 2)
+
+    def test_reservation_and_batch_retries(self):
+        booking = {"user_id": 1, "datetime": "2024-12-24 19:00", "party_size": 4}
+        first = self.post('/reservations', booking, 'booking-1')
+        self.assertEqual(self.post('/reservations', booking, 'booking-1').json['reservation_id'],
+                         first.json['reservation_id'])
+        self.assertEqual(Reservation.query.count(), 1)
+
+        batch = {"user_id": 1, "items": [{"item_id": 1}, {"item_id": 1}]}
+        self.post('/order/batch', batch, 'batch-1')
+        self.post('/order/batch', batch, 'batch-1')
+        self.assertEqual(Order.query.count(), 2)
+
+    def test_rejected_requests_are_replayed_too(self):
+        availability.capacity = 2
+        try:
+            booking = {"user_id": 1, "datetime": "2024-12-24 19:00", "party_size": 4}
+            self.assertEqual(self.post('/reservations', booking, 'too-big').status_code, 409)
+            self.assertEqual(self.post('/reservations', booking, 'too-big').headers['Idempotent-Replayed'], 'true')
+        finally:
+            availability.capacity = app.config['RESERVATION_SLOT_CAPACITY']
+
+    def test_key_reuse_and_in_progress(self):
+        self.post('/order', self.order, 'order-2')
+        self.assertEqual(self.post('/order', dict(self.order, quantity=3), 'order-2').status_code, 422)
+        self.assertEqual(self.post('/customers/order', self.order, 'order-2').status_code, 422)
+
+        # A claimed key with no stored response belongs to a request that is still running
+        raw = json.dumps(self.order).encode()
+        db.session.add(IdempotencyKey(key='running', fingerprint=hashlib.sha256(b"POST /order\n" + raw).hexdigest()))
+        db.session.commit()
+        response = self.app.post('/order', data=raw, content_type='application/json',
+                                 headers={"Idempotency-Key": 'running'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.query.count(), 1)
+
+    def handle(self, view, key):
+        with app.test_request_context('/order', method='POST', json=self.order, headers={"Idempotency-Key": key}):
+            return idempotency.handle(view, (), {})
+
+    def test_failure_after_commit_keeps_the_key(self):
+        def commits_then_fails():
+            db.session.add(Order(user_id=1, item_id=1, item_name='Biryani', quantity=2))
+            db.session.commit()
+            raise RuntimeError("lost the response")
+
+        def fails_before_commit():
+            db.session.add(Order(user_id=1, item_id=1, item_name='Biryani', quantity=2))
+            db.session.flush()
+            return jsonify({"error": "down"}), 503
+
+        with self.assertRaises(RuntimeError):
+            self.handle(commits_then_fails, 'saved')
+        # The order was saved, so a retry is refused rather than placing it again
+        retry = self.post('/order', self.order, 'saved')
+        self.assertEqual((retry.status_code, retry.headers['Idempotent-Replayed']), (409, 'true'))
+        self.assertEqual(Order.query.count(), 1)
+
+        # Nothing was saved, so the key is free and the retry goes through
+        self.assertEqual(self.handle(fails_before_commit, 'unsaved').status_code, 503)
+        self.assertEqual(self.post('/order', self.order, 'unsaved').status_code, 201)
+        self.assertEqual(Order.query.count(), 2)
+
+    def test_abandoned_claim_is_taken_over(self):
+        raw = json.dumps(self.order).encode()
+        db.session.add(IdempotencyKey(key='abandoned', fingerprint=hashlib.sha256(b"POST /order\n" + raw).hexdigest(),
+                                      created_at=datetime.now() - timedelta(hours=1)))
+        db.session.commit()
+        response = self.app.post('/order', data=raw, content_type='application/json',
+                                 headers={"Idempotency-Key": 'abandoned'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(db.session.get(IdempotencyKey, 'abandoned').status_code, 201)
+
+    def test_expired_keys_and_no_header(self):
+        self.post('/order', self.order, 'order-3')
+        idempotency.ttl = -1
+        self.post('/order', self.order, 'order-3')
+        self.app.post('/order', json=self.order)
+        self.app.post('/order', json=self.order)
+        self.assertEqual(Order.query.count(), 4)
+        self.assertEqual(IdempotencyKey.query.count(), 1)
+
+class AsgiTestCase(unittest.TestCase):
+    # The async and sync engines must see one database, so this uses a file
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+        class AsgiConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp.name, 'asgi.db')}"
+
+        asgi_app = create_asgi_app(AsgiConfig)
+        self.flask_app = asgi_app.state.flask
+        with self.flask_app.app_context():
+            db.create_all()
+            db.session.add(MenuItem(name='Biryani', price=250.0))
+            db.session.commit()
+        menu_cache.invalidate()
+        availability.reset()
+        kitchen_feed.reset()
+        self.client = TestClient(asgi_app).__enter__()
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        with self.flask_app.app_context():
+            db.engine.dispose()
+        availability.init_app(app)
+        self.tmp.cleanup()
+
+    def test_menu_etag(self):
+        response = self.client.get('/menu')
+        self.assertEqual(response.json()[0]['name'], 'Biryani')
+        cached = self.client.get('/menu', headers={"If-None-Match": response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_kitchen_stream_is_served_natively(self):
+        self.client.post('/order', json={"user_id": 1, "item_id": 1, "quantity": 2})
+        self.flask_app.config['KITCHEN_STREAM_DURATION'] = 0.2
+        body = self.client.get('/kitchen/stream?since=0').text
+        self.assertTrue(body.startswith("retry: 2000\n\n"))
+        self.assertIn('id: 1\nevent: order\n', body)
+        self.assertEqual(self.client.app.state.kitchen_streams, 0)
+
+    def test_order_and_listings(self):
+        response = self.client.post('/order', json={"user_id": 1, "item_id": 1, "quantity": 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post('/order', json={"user_id": 1, "item_id": 9, "quantity": 1}).status_code, 404)
+        self.assertEqual(self.client.post('/order', json={"user_id": 1, "item_id": 1, "quantity": -1}).status_code, 400)
+        items = self.client.get('/order/view?user_id=1').json()['items']
+        self.assertEqual([(o['item_name'], o['quantity']) for o in items], [('Biryani', 2)])
+        events = self.client.get('/kitchen/orders?since=0&timeout=0').json()['events']
+        self.assertEqual(len(events), 1)
+        # Reports are not served async; they fall through to Flask
+        sales = self.client.get('/reports/sales?start=2000-01-01&end=2100-01-01')
+        self.assertEqual(sales.json()['total_quantity'], 2)
+
+    def test_reservations_respect_capacity(self):
+        availability.capacity = 4
+        booking = {"user_id": 1, "datetime": "2024-12-24 19:00", "party_size": 3}
+        self.assertEqual(self.client.post('/reservations', json=booking).status_code, 201)
+        self.assertEqual(self.client.post('/reservations', json=booking).status_code, 409)
+        self.assertEqual(len(self.client.get('/reservations?user_id=1').json()['items']), 1)
+        self.assertEqual(self.client.get('/reservations?limit=0').status_code, 400)
+
+    def test_bad_bodies_are_400_in_both_modes(self):
+        flask_client = self.flask_app.test_client()
+        malformed = b'{"user_id": '
+        for path in ('/order', '/reservations'):
+            response = self.client.post(path, content=malformed, headers={"Content-Type": "application/json"})
+            self.assertEqual((response.status_code, response.json()), (400, {"error": "Request body must be valid JSON"}))
+            self.assertEqual(flask_client.post(path, data=malformed, content_type='application/json').status_code, 400)
+        for booking in ({"user_id": 1}, {"datetime": "2024-12-24 19:00"}, [1]):
+            self.assertEqual(self.client.post('/reservations', json=booking).status_code, 400, booking)
+            self.assertEqual(flask_client.post('/reservations', json=booking).status_code, 400, booking)
+
+    def test_flask_handles_keyed_posts_and_exports(self):
+        order = {"user_id": 1, "item_id": 1, "quantity": 1}
+        first = self.client.post('/order', json=order, headers={"Idempotency-Key": 'asgi-1'})
+        retry = self.client.post('/order', json=order, headers={"Idempotency-Key": 'asgi-1'})
+        self.assertEqual((first.status_code, retry.headers['Idempotent-Replayed']), (201, 'true'))
+        export = self.client.get('/order/view?format=csv')
+        self.assertTrue(export.headers['Content-Type'].startswith('text/csv'))
+        # PUT has no async route, so the Flask view answers
+        response = self.client.put('/restaurant_details', json={"name": "Dhaba"})
+        self.assertEqual((response.status_code, response.json()), (404, {"message": "Restaurant details not found"}))
+
+class MenuBulkTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([MenuItem(name='Biryani', price=250.0), MenuItem(name='Lassi', price=80.0)])
+        db.session.commit()
+
+    def prices(self):
+        return {item.name: item.price for item in MenuItem.query.order_by(MenuItem.id)}
+
+    def test_json_import_upserts_by_id_and_name(self):
+        etag = self.app.get('/menu').headers['ETag']
+        items = [{"id": 1, "name": "Chicken Biryani", "price": 270}, {"name": "Lassi", "price": 90},
+                 {"name": "Naan", "price": "40"}, {"name": "Naan", "price": 45}]
+        response = self.app.post('/menu/bulk', json={"items": items})
+        self.assertEqual(response.json, {"created": 1, "updated": 2})
+        self.assertEqual(self.prices(), {'Chicken Biryani': 270.0, 'Lassi': 90.0, 'Naan': 45.0})
+        self.assertNotEqual(self.app.get('/menu', headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_csv_round_trip(self):
+        exported = self.app.get('/menu?format=csv').get_data(as_text=True)
+        self.app.post('/menu/bulk', data=exported.replace('250.0', '260.0') + ",Kulfi,60\n",
+                      content_type='text/csv')
+        self.assertEqual(self.prices(), {'Biryani': 260.0, 'Lassi': 80.0, 'Kulfi': 60.0})
+
+    def test_invalid_import_writes_nothing(self):
+        response = self.app.post('/menu/bulk', json=[{"name": "Naan", "price": 40}, {"name": "", "price": 1},
+                                                     {"id": 99, "name": "Ghost", "price": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.json['items']], [1])
+        response = self.app.post('/menu/bulk', json=[{"id": 99, "name": "Ghost", "price": 1}])
+        self.assertEqual(response.json['items'], [{"index": 0, "error": "Menu item not found"}])
+        self.assertEqual(self.app.post('/menu/bulk', data="a,b\n1,2\n", content_type='text/csv').status_code, 400)
+        self.assertEqual(MenuItem.query.count(), 2)
+
+    def test_reprice(self):
+        self.app.get('/menu')
+        self.assertEqual(self.app.patch('/menu/prices', json={"percent": 10}).json, {"updated": 2})
+        self.assertEqual(self.app.get('/menu').json[0]['price'], 275.0)
+        self.app.patch('/menu/prices', json={"amount": -100, "item_ids": [2]})
+        self.assertEqual(self.prices(), {'Biryani': 275.0, 'Lassi': 0.0})
+        for body in ({}, {"percent": 5, "amount": 1}, {"percent": -100}, {"amount": "5"}, {"percent": 1, "item_ids": 1}):
+            self.assertEqual(self.app.patch('/menu/prices', json=body).status_code, 400)
+
+class OrderJournalTestCase(unittest.TestCase):
+    # The writer thread needs its own connection to the same database, so this uses a file
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+        class JournalConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp.name, 'orders.db')}"
+            ORDER_INGEST_MODE = 'journal'
+            ORDER_JOURNAL_DIR = os.path.join(self.tmp.name, 'journal')
+
+        self.journal_app = create_app(JournalConfig)
+        self.client = self.journal_app.test_client()
+        with self.journal_app.app_context():
+            db.create_all()
+            db.session.add(MenuItem(name='Biryani', price=250.0))
+            db.session.commit()
+        kitchen_feed.reset()
+
+    def tearDown(self):
+        order_journal.close()
+        with self.journal_app.app_context():
+            db.engine.dispose()
+        order_journal.init_app(app)
+        kitchen_feed.init_app(app)
+        self.tmp.cleanup()
+
+    def orders(self):
+        with self.journal_app.app_context():
+            return [(o.ticket, o.quantity) for o in Order.query.order_by(Order.id)]
+
+    def test_orders_are_acknowledged_then_group_committed(self):
+        tickets = []
+        for quantity in (1, 2, 3):
+            response = self.client.post('/order', json={"user_id": 1, "item_id": 1, "quantity": quantity})
+            self.assertEqual(response.status_code, 202)
+            self.assertTrue(response.headers['Location'].endswith(f"/order/status/{response.json['ticket']}"))
+            tickets.append(response.json['ticket'])
+        tickets.append(self.client.post('/customers/order', json={"user_id": 1, "item_id": 1, "quantity": 4}).json['ticket'])
+        self.assertEqual(self.client.post('/order', json={"user_id": 1, "item_id": 9, "quantity": 1}).status_code, 404)
+
+        self.assertTrue(order_journal.drain(5))
+        self.assertEqual(self.orders(), list(zip(tickets, (1, 2, 3, 4))))
+        status = self.client.get(f'/order/status/{tickets[0]}').json
+        self.assertEqual((status['status'], status['order_id']), ('persisted', 1))
+        self.assertEqual(self.client.get(f'/order/status/{"0" * 32}').json['status'], 'pending')
+        self.assertEqual(self.client.get('/order/status/nope').status_code, 404)
+        with self.journal_app.app_context():
+            self.assertEqual(SalesRollup.query.filter_by(granularity='day').one().quantity, 10)
+        # Written segments are deleted; only the live segment and lock file remain
+        self.assertEqual(len(os.listdir(order_journal.directory)), 2)
+
+    def test_keyed_retries_share_a_ticket_without_key_rows(self):
+        order = {"user_id": 1, "item_id": 1, "quantity": 2}
+        headers = {"Idempotency-Key": "journal-retry"}
+        tickets = [self.client.post('/order', json=order, headers=headers).json['ticket'] for _ in range(2)]
+        self.assertTrue(order_journal.drain(5))
+        # A retry after the order was written is acknowledged again and skipped again
+        tickets.append(self.client.post('/customers/order', json=order, headers=headers).json['ticket'])
+        self.assertTrue(order_journal.drain(5))
+        self.assertEqual(len(set(tickets)), 1)
+        self.assertEqual(self.orders(), [(tickets[0], 2)])
+        with self.journal_app.app_context():
+            self.assertEqual(SalesRollup.query.filter_by(granularity='day').one().quantity, 2)
+            self.assertEqual(IdempotencyKey.query.count(), 0)
+
+    def test_dead_worker_journal_is_replayed_once(self):
+        directory = order_journal.directory
+        os.makedirs(directory)
+        created_at = datetime(2024, 12, 24, 19, 30)
+        lines = [json.dumps({"user_id": 1, "item_id": 1, "item_name": "Biryani", "quantity": 2, "unit_price": 250.0,
+                             "ticket": f"{n:032x}", "created_at": str(created_at)}) for n in (1, 2)]
+        open(os.path.join(directory, 'dead.lock'), 'w').close()
+        with open(os.path.join(directory, 'dead.0.log'), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        with open(os.path.join(directory, 'dead.1.log'), 'w') as f:
+            # The first segment was committed but not deleted; the crash cut the last line short
+            f.write(lines[1] + "\n" + lines[0][:20])
+
+        order_journal.recover()
+        self.assertEqual(self.orders(), [(f"{1:032x}", 2), (f"{2:032x}", 2)])
+        self.assertEqual(os.listdir(directory), [])
+        with self.journal_app.app_context():
+            self.assertEqual(SalesRollup.query.filter_by(granularity='day').one().quantity, 4)
+
+    def test_live_worker_journal_is_left_alone(self):
+        self.client.post('/order', json={"user_id": 1, "item_id": 1, "quantity": 1})
+        order_journal.drain(5)
+        # The lock file is only published once it is locked
+        lock_path = order_journal._path('lock')
+        with open(lock_path, 'a') as lock_file, self.assertRaises(BlockingIOError):
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # A worker that is still starting locks under a name recovery skips
+        open(os.path.join(order_journal.directory, 'starting.locking'), 'w').close()
+        live = sorted(os.listdir(order_journal.directory))
+        order_journal.recover()
+        self.assertEqual(sorted(os.listdir(order_journal.directory)), live)
+
+class CheckoutTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([MenuItem(name='Biryani', price=250.0), MenuItem(name='Lassi', price=80.0)])
+        db.session.commit()
+        for item_id, quantity in ((1, 2), (2, 1), (1, 1)):
+            self.app.post('/order', json={"user_id": 1, "item_id": item_id, "quantity": quantity})
+        self.app.post('/order', json={"user_id": 2, "item_id": 2, "quantity": 5})
+        # Old orders from before unit_price was stored are billed at the menu price
+        db.session.add(Order(user_id=1, item_id=2, item_name='Lassi', quantity=1))
+        db.session.commit()
+
+    def tearDown(self):
+        settlement.gateway = FakeGateway(app.config)
+        super().tearDown()
+
+    def test_bill_totals_unpaid_orders_per_item(self):
+        response = self.app.get('/checkout/bill?user_id=1')
+        self.assertEqual(response.json['total'], 910.0)
+        self.assertEqual(response.json['orders'], 4)
+        self.assertEqual([(l['item_name'], l['quantity'], l['amount']) for l in response.json['lines']],
+                         [('Biryani', 3, 750.0), ('Lassi', 2, 160.0)])
+        table = self.app.get('/checkout/bill?user_id=1&order_id=1&order_id=2').json
+        self.assertEqual((table['orders'], table['total']), (2, 580.0))
+        self.assertEqual(self.app.get('/checkout/bill').status_code, 400)
+
+    def test_checkout_settles_and_clears_the_bill(self):
+        response = self.app.post('/checkout', json={"user_id": 1, "order_ids": [1, 2]})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.json['amount'], response.json['orders']), (580.0, 2))
+        status = self.app.get(response.headers['Location']).json
+        self.assertEqual(status['status'], 'settled')
+        self.assertTrue(status['gateway_ref'].startswith('fake_'))
+        self.assertEqual(self.app.get('/checkout/bill?user_id=1').json['total'], 330.0)
+        self.assertEqual(self.app.post('/checkout', json={"user_id": 1, "order_ids": [1]}).status_code, 404)
+        self.assertEqual(self.app.post('/checkout', json={"user_id": 1}).json['amount'], 330.0)
+        self.assertEqual(self.app.post('/checkout', json={"user_id": 3}).status_code, 404)
+        self.assertEqual(self.app.get('/checkout/unknown').status_code, 404)
+
+    def test_declined_orders_can_be_billed_again(self):
+        settlement.gateway.decline_over = 500
+        declined = self.app.post('/checkout', json={"user_id": 1}).json
+        self.assertEqual(declined['status'], 'failed')
+        self.assertEqual(self.app.get('/checkout/bill?user_id=1').json['total'], 910.0)
+        settlement.gateway.decline_over = None
+        self.assertEqual(self.app.post('/checkout', json={"user_id": 1}).json['status'], 'settled')
+        self.assertEqual(Payment.query.filter_by(status='failed').count(), 4)
+
+    def test_orders_are_billed_once(self):
+        db.session.add(Payment(order_id=1, amount=500.0, status='pending', checkout_id='other'))
+        db.session.commit()
+        self.assertEqual(self.app.get('/checkout/bill?user_id=1').json['orders'], 3)
+        # A checkout racing the pending one trips the partial unique index
+        with self.assertRaises(IntegrityError):
+            db.session.add(Payment(order_id=1, amount=500.0, status='pending', checkout_id='racer'))
+            db.session.commit()
+        db.session.rollback()
+
+    def test_gateway_errors_leave_checkout_pending(self):
+        class Unreachable(FakeGateway):
+            def charge(self, reference, amount):
+                raise ConnectionError("gateway timed out")
+
+        settlement.gateway = Unreachable(app.config)
+        with self.assertLogs('payments', 'ERROR'):
+            response = self.app.post('/checkout', json={"user_id": 2})
+        self.assertEqual(response.json['status'], 'pending')
+        settlement.gateway = FakeGateway(app.config)
+        self.assertEqual(settlement.settle_pending(older_than=-1), 1)
+        self.assertEqual(self.app.get(response.headers['Location']).json['status'], 'settled')
+
+class MenuSearchTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.post('/menu/bulk', json=[
+            {"name": "Chicken Biryani", "price": 270, "description": "Basmati rice slow cooked with spiced chicken",
+             "tags": "rice,spicy"},
+            {"name": "Paneer Tikka", "price": 220, "description": "Char-grilled cottage cheese", "tags": "vegetarian"},
+            {"name": "Chicken Tikka Masala", "price": 300, "description": "Creamy tomato gravy"},
+            {"name": "Mango Lassi", "price": 80, "description": "Sweet yoghurt drink with mango", "tags": "drink"},
+        ])
+
+    def search(self, q, **args):
+        return [item['name'] for item in self.app.get('/menu/search', query_string=dict(args, q=q)).json['items']]
+
+    def test_prefix_and_ranking(self):
+        self.assertEqual(self.search('chick tikka'), ['Chicken Tikka Masala'])
+        # A name hit outranks a description hit
+        self.assertEqual(self.search('mango'), ['Mango Lassi'])
+        self.assertCountEqual(self.search('chicken')[:2], ['Chicken Biryani', 'Chicken Tikka Masala'])
+        self.assertEqual(self.search('vegetarian'), ['Paneer Tikka'])
+        self.assertEqual(self.search('rice', limit=1), ['Chicken Biryani'])
+
+    def test_typos(self):
+        self.assertEqual(self.search('biriyani'), ['Chicken Biryani'])
+        self.assertEqual(self.search('panner tika'), ['Paneer Tikka'])
+        self.assertEqual(self.search('xyzzy'), [])
+
+    def test_index_follows_writes(self):
+        item = MenuItem.query.filter_by(name='Mango Lassi').one()
+        item.name = 'Salted Lassi'
+        db.session.commit()
+        self.assertEqual(self.search('salted'), ['Salted Lassi'])
+        self.assertEqual(self.search('mango'), ['Salted Lassi'])  # Still in the description
+        self.app.patch('/menu/prices', json={"percent": 10})
+        db.session.delete(item)
+        db.session.commit()
+        self.assertEqual(self.search('lassi'), [])
+        self.assertEqual(self.app.get('/menu/search?q=%20').status_code, 400)
+
+class OrderTransitionTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add(MenuItem(name='Dosa', price=120.0))
+        db.session.commit()
+        self.app.post('/order', json={"user_id": 1, "item_id": 1, "quantity": 2})
+        self.order_id = Order.query.one().id
+
+    def transition(self, status, version=None):
+        return self.app.post(f'/order/{self.order_id}/transition', json={"status": status, "version": version})
+
+    def test_order_moves_one_step_at_a_time(self):
+        order = self.app.get('/order/view').json['items'][0]
+        self.assertEqual((order['status'], order['version']), ('placed', 1))
+        response = self.transition('cooking', 1)
+        self.assertEqual(response.json, {"id": self.order_id, "status": "cooking", "version": 2})
+        self.assertEqual(self.transition('ready').json['version'], 3)  # Without a version only the status is checked
+
+        response = self.transition('paid')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json['status'], response.json['version']), ('ready', 3))
+        self.assertEqual(self.transition('cooking').status_code, 409)
+        self.assertEqual(self.transition('eaten').status_code, 400)
+        self.assertEqual(self.transition('served', '3').status_code, 400)
+        self.assertEqual(self.app.post('/order/999/transition', json={"status": "cooking"}).status_code, 404)
+        self.assertEqual([o['id'] for o in self.app.get('/order/view?status=ready').json['items']], [self.order_id])
+        self.assertEqual(self.app.get('/order/view?status=placed').json['items'], [])
+
+    def test_stale_version_is_a_conflict_not_a_lost_update(self):
+        # Two terminals read version 1; the kitchen starts cooking first
+        self.assertEqual(self.transition('cooking', 1).status_code, 200)
+        response = self.transition('cooking', 1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json['status'], response.json['version']), ('cooking', 2))
+        # Retrying from the state in the conflict response goes through
+        self.assertEqual(self.transition('ready', response.json['version']).json['version'], 3)
+        order = db.session.get(Order, self.order_id)
+        db.session.refresh(order)
+        self.assertEqual((order.status, order.version), ('ready', 3))
+
+class ArchiveTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        db.session.add(MenuItem(name='Dosa', price=100.0))
+        db.session.add_all([
+            Order(user_id=1, item_id=1, item_name='Dosa', quantity=2, unit_price=100.0,
+                  created_at=datetime(2024, 3, 1, 13, 0), status='paid'),
+            Order(user_id=2, item_id=1, item_name='Dosa', quantity=1, unit_price=100.0,
+                  created_at=datetime(2025, 3, 1, 13, 0), status='served'),  # Not closed: stays hot
+            Order(user_id=3, item_id=1, item_name='Dosa', quantity=3, unit_price=90.0,
+                  created_at=datetime(2025, 6, 1, 13, 0)),
+            Order(user_id=4, item_id=1, item_name='Dosa', quantity=1, unit_price=100.0, status='paid'),
+            Reservation(user_id=1, datetime=datetime(2024, 3, 1, 19, 0), status='confirmed', party_size=4),
+            Reservation(user_id=2, datetime=datetime(2025, 3, 1, 20, 0), status='confirmed', party_size=2),
+            Reservation(user_id=3, datetime=datetime(2025, 4, 1, 20, 0), status='confirmed', party_size=3),
+        ])
+        db.session.add(Payment(order_id=3, amount=270.0, status='settled'))
+        db.session.commit()
+
+    def tearDown(self):
+        for model in (Order, Reservation):
+            for year in archive.partitions(model):
+                db.session.execute(text(f"DROP TABLE archive.{model.__table__.name}_{year}"))
+        db.session.commit()
+        super().tearDown()
+
+    def test_run_moves_closed_history_out_of_hot_tables(self):
+        self.assertEqual(self.app.get('/admin/archive').json['orders']['due'], 2)
+        response = self.app.post('/admin/archive')
+        self.assertEqual(response.json['moved'], {"orders": 2, "reservations": 2})
+        self.assertEqual(response.json['status']['orders']['archived'], {"2024": 1, "2025": 1})
+        self.assertEqual(sorted(o.user_id for o in Order.query), [2, 4])
+        # The newest reservation is old too, but keeps its id from being handed out again
+        self.assertEqual([r.user_id for r in Reservation.query], [3])
+        self.assertEqual(self.app.post('/admin/archive').json['moved'], {"orders": 0, "reservations": 0})
+
+    def test_reports_span_hot_and_archive(self):
+        archive.run()
+        items = self.app.get('/reports/top-items?from=2024-01-01&to=2030-12-31').json['items']
+        self.assertEqual((items[0]['quantity'], items[0]['orders'], items[0]['revenue']), (7, 4, 670.0))
+        hours = self.app.get('/reports/hourly-covers?from=2024-01-01&to=2025-03-31').json['hours']
+        self.assertEqual(hours, [{"hour": 19, "covers": 4, "reservations": 1}, {"hour": 20, "covers": 2, "reservations": 1}])
+        # Only the hot table and the 2025 partition fall in this range
+        self.assertEqual(self.app.get('/reports/top-items?from=2025-01-01&to=2025-12-31').json['items'][0]['orders'], 2)
+        self.assertEqual(rebuild_rollup(), 4)
+
+class TenancyTestCase(unittest.TestCase):
+    # Two outlets with a database file each, next to a default database of their own
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+        class TenantConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp.name, 'default.db')}"
+            TENANTS = ['north', 'south']
+            TENANT_DATABASE_URL = f"sqlite:///{os.path.join(self.tmp.name, '{tenant}.db')}"
+
+        self.tenant_app = create_app(TenantConfig)
+        self.client = self.tenant_app.test_client()
+        with self.tenant_app.app_context():
+            db.create_all()
+        for tenant, dish in (('north', 'Chole Bhature'), ('south', 'Dosa')):
+            db.metadata.create_all(shards.engine(tenant))
+            self.client.post('/menu/bulk', json=[{"name": dish, "price": 100.0}], headers={"X-Tenant": tenant})
+
+    def tearDown(self):
+        shards.dispose()
+        with self.tenant_app.app_context():
+            db.engine.dispose()
+        for extension in (menu_cache, availability, kitchen_feed, idempotency, archive):
+            extension.init_app(app)
+        self.tmp.cleanup()
+
+    def test_tenants_are_isolated(self):
+        self.assertEqual([i['name'] for i in self.client.get('/t/north/menu').json], ['Chole Bhature'])
+        self.assertEqual([i['name'] for i in self.client.get('/menu', headers={"X-Tenant": "south"}).json], ['Dosa'])
+        self.assertEqual(self.client.get('/menu').json, [])
+        self.client.post('/t/north/order', json={"user_id": 1, "item_id": 1, "quantity": 2})
+        self.client.post('/order', json={"user_id": 1, "item_id": 1, "quantity": 1}, headers={"X-Tenant": "south"})
+        self.assertEqual([o['item_name'] for o in self.client.get('/t/north/order/view?user_id=1').json['items']],
+                         ['Chole Bhature'])
+        self.assertEqual([o['item_name'] for o in self.client.get('/t/south/order/view?user_id=1').json['items']],
+                         ['Dosa'])
+        self.assertEqual(self.client.get('/t/east/menu').status_code, 404)
+        self.assertEqual(self.client.get('/menu', headers={"X-Tenant": "east"}).json, {"error": "Unknown tenant"})
+
+    def test_prefixed_urls_stay_with_the_tenant(self):
+        self.client.post('/t/north/order', json={"user_id": 1, "item_id": 1, "quantity": 2})
+        response = self.client.post('/t/north/checkout', json={"user_id": 1})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.headers['Location'].startswith('/t/north/checkout/'))
+        self.assertEqual(self.client.get(response.headers['Location']).json['status'], 'settled')
+        self.assertEqual(self.client.post('/t/south/checkout', json={"user_id": 1}).status_code, 404)
+
+    def test_least_recently_used_engine_is_closed(self):
+        shards.dispose()
+        shards.limit = 1
+        north = shards.engine('north')
+        self.assertIs(shards.engine('north'), north)
+        shards.engine('south')
+        self.assertEqual(shards.open_engines(), ['south'])
+        self.assertEqual(north.pool.checkedin(), 0)
+        self.assertEqual([i['name'] for i in self.client.get('/t/north/menu').json], ['Chole Bhature'])
+        self.assertIsNot(shards.engine('north'), north)
+
+    def test_engine_is_pinned_for_the_transaction(self):
+        shards.dispose()
+        shards.limit = 1
+        with self.tenant_app.app_context(), use('north'):
+            db.session.add(MenuItem(name='Kulcha', price=60.0))
+            db.session.flush()
+            north = db.session.get_bind()
+            shards.engine('south')  # Evicts north mid-transaction, as a fan-out would
+            # The rest of the transaction stays on its connection instead of locking itself out
+            self.assertIs(db.session.get_bind(), north)
+            self.assertEqual(db.session.scalar(select(func.count()).select_from(MenuItem)), 2)
+            db.session.commit()
+            self.assertIsNot(db.session.get_bind(), north)
+            self.assertEqual(db.session.scalar(select(func.count()).select_from(MenuItem)), 2)
+
+    def test_sales_report_spans_all_tenants(self):
+        today = datetime.now().date()
+        self.client.post('/t/north/order', json={"user_id": 1, "item_id": 1, "quantity": 2})
+        self.client.post('/t/south/order', json={"user_id": 1, "item_id": 1, "quantity": 3})
+        report = self.client.get(f'/reports/tenants/sales?from={today}&to={today}').json
+        self.assertEqual(report['tenants'], {"north": {"total_quantity": 2, "total_revenue": 200.0},
+                                             "south": {"total_quantity": 3, "total_revenue": 300.0}})
+        self.assertEqual([(b['bucket'], b['quantity'], b['orders']) for b in report['buckets']],
+                         [(f"{today} 00:00:00", 5, 2)])
+        self.assertEqual((report['total_quantity'], report['total_revenue'], report['errors']), (5, 500.0, {}))
+
+class StartupTestCase(unittest.TestCase):
+    def test_create_app_does_no_database_work(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'startup.db')
+
+            class StartupConfig(Config):
+                SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+
+            create_app(StartupConfig)
+            self.assertFalse(os.path.exists(path))
+
+class QueryPlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        db.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def query_plan(self, statement):
+        compiled = statement.compile(self.engine, compile_kwargs={"literal_binds": True})
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+        return " | ".join(row[-1] for row in rows)
+
+    def assertUsesIndex(self, statement, index_name):
+        plan = self.query_plan(statement)
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r"\bSCAN\b(?! USING)")
+
+    def test_reservations_by_user(self):
+        self.assertUsesIndex(
+            select(Reservation).where(Reservation.user_id == 1),
+            'ix_reservation_user_id_datetime')
+
+    def test_reservations_by_user_and_date(self):
+        self.assertUsesIndex(
+            select(Reservation).where(Reservation.user_id == 1,
+                                      Reservation.datetime >= datetime(2024, 11, 1)),
+            'ix_reservation_user_id_datetime')
+
+    def test_reservations_by_status_and_date(self):
+        self.assertUsesIndex(
+            select(Reservation).where(Reservation.status == 'confirmed',
+                                      Reservation.datetime < datetime(2024, 12, 1)),
+            'ix_reservation_status_datetime')
+
+    def test_reservations_by_date_range(self):
+        self.assertUsesIndex(
+            select(Reservation).where(Reservation.datetime.between(datetime(2024, 11, 1),
+                                                                   datetime(2024, 11, 30))),
+            'ix_reservation_datetime')
+
+    def test_orders_by_user_and_item(self):
+        self.assertUsesIndex(select(Order).where(Order.user_id == 1), 'ix_order_user_id')
+        self.assertUsesIndex(select(Order).where(Order.item_id == 1), 'ix_order_item_id')
+
 if __name__ == '__main__':
     unittest.main()